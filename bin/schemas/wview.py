@@ -68,3 +68,17 @@ schema = [('dateTime',             'INTEGER NOT NULL UNIQUE PRIMARY KEY'),
           ('rainBatteryStatus',    'REAL'),
           ('outTempBatteryStatus', 'REAL'),
           ('inTempBatteryStatus',  'REAL')]
+
+# =============================================================================
+# The observation types to be given a covering index when the archive table is
+# initialized. Each index is on (dateTime, type, usUnits), so queries over a
+# span of time that only need that type, such as its sum or maximum, can be
+# answered without reading the records themselves. To use it, set option
+# 'indexes = schemas.wview.indexes' in the data binding. For example:
+#
+#   indexes = ['rain', 'outTemp']
+#
+# Indexes can be added to an existing table with wee_config_database. Each one
+# costs space, and time when adding records, so stick to the busy types.
+# =============================================================================
+indexes = []
@@ -92,6 +92,16 @@ class Connection(object):
         """Returns an appropriate database cursor."""
         raise NotImplementedError
 
+    def streaming_cursor(self):
+        """Returns a cursor for reading a result set that may be too big to
+        hold in memory. The rows are fetched from the database as they are
+        needed. Other statements can still be run on the connection while it
+        is being read. It must be closed when done.
+        
+        This version returns an ordinary cursor, which is right for databases
+        that do not read ahead, such as sqlite."""
+        return self.cursor()
+
     def execute(self, sql_string, sql_tuple=()):
         """Execute a sql statement. This version does not return a cursor,
         so it can only be used for statements that do not return a result set."""
@@ -107,6 +117,11 @@ class Connection(object):
         Returns an empty list if the database has no tables in it."""
         raise NotImplementedError
 
+    def views(self):
+        """Returns a list of the views in the database.
+        Returns an empty list if the database has no views in it."""
+        raise NotImplementedError
+
     def genSchemaOf(self, table):
         """Generator function that returns a summary of the table's schema.
         It returns a 6-way tuple:
@@ -121,6 +136,11 @@ class Connection(object):
         should raise an exception of type weedb.ProgrammingError if the table does not exist."""
         raise NotImplementedError
 
+    def indexesOf(self, table):
+        """Returns a list of the names of the indexes on the specified table,
+        other than the one on its primary key."""
+        raise NotImplementedError
+
     def begin(self):
         raise NotImplementedError
 
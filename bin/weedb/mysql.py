@@ -8,6 +8,7 @@
 import decimal
 
 import MySQLdb
+import MySQLdb.cursors
 import _mysql_exceptions
 
 from weeutil.weeutil import to_bool
@@ -91,18 +92,24 @@ class Connection(weedb.Connection):
             
         If the operation fails, an exception of type weedb.OperationalError will be raised.
         """
+        # Keep the arguments, for opening the connections of streaming cursors:
+        self._connect_args = dict(kwargs, host=host, user=user, passwd=password, db=database_name)
+        weedb.Connection.__init__(self, self._connect(), database_name, 'mysql')
+        # Connections for streaming cursors, not in use at the moment:
+        self._idle_stream_connections = []
+
+    def _connect(self):
         try:
-            connection = MySQLdb.connect(host=host, user=user, passwd=password, db=database_name, **kwargs)
+            connection = MySQLdb.connect(**self._connect_args)
         except _mysql_exceptions.OperationalError, e:
             # The MySQL driver does not include the database in the
             # exception information. Tack it on, in case it might be useful.
-            raise weedb.OperationalError(str(e) + " while opening database '%s'" % (database_name,))
-
-        weedb.Connection.__init__(self, connection, database_name, 'mysql')
+            raise weedb.OperationalError(str(e) + " while opening database '%s'" % (self._connect_args['db'],))
 
         # Allowing threads other than the main thread to see any transactions
         # seems to require an isolation level of READ UNCOMMITTED.
-        self.connection.query("SET TRANSACTION ISOLATION LEVEL READ UNCOMMITTED")
+        connection.query("SET TRANSACTION ISOLATION LEVEL READ UNCOMMITTED")
+        return connection
 
     def cursor(self):
         """Return a cursor object."""
@@ -110,15 +117,51 @@ class Connection(weedb.Connection):
         # obliged to include a wrapper around it:
         return Cursor(self)
 
+    @guard
+    def streaming_cursor(self):
+        """Return a cursor that leaves the result set on the server, and
+        fetches the rows one at a time, as they are needed.
+        
+        MySQL does not allow anything else to be run on a connection until
+        such a result set has been read, so the cursor gets a connection of
+        its own. It is handed back for reuse when the cursor is closed."""
+        try:
+            _connection = self._idle_stream_connections.pop()
+        except IndexError:
+            _connection = self._connect()
+        return StreamingCursor(self, _connection)
+
+    def close(self):
+        for _connection in self._idle_stream_connections:
+            try:
+                _connection.close()
+            except _mysql_exceptions.Error:
+                pass
+        self._idle_stream_connections = []
+        weedb.Connection.close(self)
+
     @guard
     def tables(self):
         """Returns a list of tables in the database."""
 
+        return self._listTables('BASE TABLE')
+
+    @guard
+    def views(self):
+        """Returns a list of views in the database."""
+
+        return self._listTables('VIEW')
+
+    def _listTables(self, table_type):
+        """Returns a list of the tables of a MySQL table type, such as
+        'BASE TABLE' or 'VIEW', in the database."""
+
         table_list = list()
         # Get a cursor directly from MySQL
         cursor = self.connection.cursor()
         try:
-            cursor.execute("""SHOW TABLES;""")
+            # Unlike SHOW TABLES, this does not mix the views in with the tables:
+            cursor.execute("""SHOW FULL TABLES WHERE Table_type = '%s';""" % table_type)
             while True:
                 row = cursor.fetchone()
                 if row is None: break
@@ -169,6 +212,24 @@ class Connection(weedb.Connection):
         column_list = [row[1] for row in self.genSchemaOf(table)]
         return column_list
 
+    @guard
+    def indexesOf(self, table):
+        """Return a list of the names of the indexes on the specified table,
+        other than its primary key."""
+        index_list = list()
+        # Get a cursor directly from MySQL:
+        cursor = self.connection.cursor()
+        try:
+            # There is a row for each column of each index. The name of the
+            # index is in the third column:
+            cursor.execute("""SHOW INDEX FROM %s;""" % table)
+            for row in cursor.fetchall():
+                if row[2] != 'PRIMARY' and str(row[2]) not in index_list:
+                    index_list.append(str(row[2]))
+        finally:
+            cursor.close()
+        return index_list
+
     @guard
     def begin(self):
         """Begin a transaction."""
@@ -186,6 +247,9 @@ class Connection(weedb.Connection):
 class Cursor(object):
     """A wrapper around the MySQLdb cursor object"""
 
+    # The largest number of rows that executemany() puts in one statement:
+    max_batch = 1000
+
     def __init__(self, connection):
         """Initialize a Cursor from a connection.
         
@@ -203,13 +267,36 @@ class Cursor(object):
         
         sql_tuple: A tuple with the values to be used in the placeholders."""
 
-        # MySQL uses '%s' as placeholders, so replace the ?'s with %s
-        mysql_string = sql_string.replace('?', '%s')
-
         # Convert sql_tuple to a plain old tuple, just in case it actually
         # derives from tuple, but overrides the string conversion (as is the
         # case with a TimeSpan object):
-        self.cursor.execute(mysql_string, tuple(sql_tuple))
+        self.cursor.execute(mysql_statement(sql_string), tuple(sql_tuple))
+
+        return self
+
+    @guard
+    def executemany(self, sql_string, sql_tuple_seq):
+        """Execute a SQL statement once for each tuple in a sequence.
+        
+        sql_string: A SQL statement to be executed. It should use ? as
+        a placeholder.
+        
+        sql_tuple_seq: A sequence of tuples with the values to be used in the
+        placeholders."""
+
+        mysql_string = mysql_statement(sql_string)
+
+        # For an INSERT statement, MySQLdb will combine all the tuples into
+        # a single multi-row statement. Do them a batch at a time, so that
+        # the statement stays well under the server's max_allowed_packet:
+        _batch = []
+        for sql_tuple in sql_tuple_seq:
+            _batch.append(tuple(sql_tuple))
+            if len(_batch) >= Cursor.max_batch:
+                self.cursor.executemany(mysql_string, _batch)
+                _batch = []
+        if _batch:
+            self.cursor.executemany(mysql_string, _batch)
 
         return self
 
@@ -238,6 +325,58 @@ class Cursor(object):
         return result
 
 
+class StreamingCursor(Cursor):
+    """A wrapper around the MySQLdb SSCursor object, which fetches the rows of
+    a result set from the server as they are needed. It runs on a connection
+    of its own. See Connection.streaming_cursor()."""
+
+    def __init__(self, connection, stream_connection):
+        """Initialize a StreamingCursor.
+        
+        connection: An instance of weedb.mysql.Connection.
+        
+        stream_connection: The MySQLdb connection to run on. It is handed
+        back to connection when the cursor is closed."""
+        self.connection = connection
+        self.stream_connection = stream_connection
+        self.cursor = stream_connection.cursor(MySQLdb.cursors.SSCursor)
+
+    def close(self):
+        if not hasattr(self, 'stream_connection'):
+            return
+        try:
+            # This reads whatever is left of the result set, so that the
+            # connection can be used again:
+            self.cursor.close()
+            del self.cursor
+            # End the transaction the SELECT started. Otherwise it would hold
+            # on to the metadata locks of the tables it read, and any DDL
+            # on them, such as DROP TABLE, would have to wait for it:
+            self.stream_connection.rollback()
+        except:
+            # Do not reuse a connection in an unknown state:
+            self.stream_connection.close()
+        else:
+            self.connection._idle_stream_connections.append(self.stream_connection)
+        del self.stream_connection
+
+# MySQL statements, keyed by the weedb statements they were made from:
+_mysql_statements = {}
+
+def mysql_statement(sql_string):
+    """Returns the MySQL version of a SQL statement."""
+    try:
+        return _mysql_statements[sql_string]
+    except KeyError:
+        # MySQL uses '%s' as placeholders, so replace the ?'s with %s. Any
+        # literal '%' (such as the modulo operator) must be escaped first.
+        mysql_string = sql_string.replace('%', '%%').replace('?', '%s')
+        # Keep only statements with placeholders, which get reused. The rest
+        # have their values written into them, so are rarely seen again:
+        if '?' in sql_string and len(_mysql_statements) < 1000:
+            _mysql_statements[sql_string] = mysql_string
+        return mysql_string
+
 #
 # This is a utility function for converting a result set that might contain
 # longs or decimal.Decimals (which MySQLdb uses) to something containing just ints.
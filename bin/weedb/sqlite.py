@@ -67,6 +67,10 @@ def drop(database_name='', root='', driver='', **argv):
         os.remove(file_path)
     except OSError:
         raise weedb.NoDatabase("""Attempt to drop non-existent database %s""" % (file_path,))
+    # In WAL mode, the log and its index are kept in files of their own:
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(file_path + suffix):
+            os.remove(file_path + suffix)
 
 
 class Connection(weedb.Connection):
@@ -85,6 +89,20 @@ class Connection(weedb.Connection):
               Optional. Default is 5.
             isolation_level: The type of isolation level to use. One of None, 
               DEFERRED, IMMEDIATE, or EXCLUSIVE. Default is None (autocommit mode).
+            check_same_thread: Set to False to allow the connection to be used by
+              threads other than the one that opened it, one at a time. Default is True.
+            journal_mode: The journal mode of the database. Set to WAL (write-ahead
+              logging) so that readers and a writer do not block each other. The mode
+              is kept in the database file, so it applies to all connections from
+              then on. Optional. Default is to leave the mode as it is.
+            synchronous: How hard sqlite works to make sure a commit is on disk.
+              One of OFF, NORMAL, or FULL. Default is NORMAL in WAL mode, which
+              is safe in that mode, otherwise sqlite's own default.
+            wal_autocheckpoint: In WAL mode, how many pages can build up in the
+              log before they are written back to the database at the next commit.
+              Default is 1000.
+            read_only: Set to True for a connection that can only read the database.
+              Default is False.
             
         If the operation fails, an exception of type weedb.OperationalError will be raised.
         """
@@ -94,13 +112,32 @@ class Connection(weedb.Connection):
             raise weedb.OperationalError("Attempt to open a non-existent database %s" % self.file_path)
         timeout = to_int(argv.get('timeout', 5))
         isolation_level = argv.get('isolation_level')
+        check_same_thread = to_bool(argv.get('check_same_thread', True))
         try:
-            connection = sqlite3.connect(self.file_path, timeout=timeout, isolation_level=isolation_level)
+            connection = sqlite3.connect(self.file_path, timeout=timeout, isolation_level=isolation_level,
+                                         check_same_thread=check_same_thread)
         except sqlite3.OperationalError:
             # The Pysqlite driver does not include the database file path.
             # Include it in case it might be useful.
             raise weedb.OperationalError("Unable to open database '%s'" % (self.file_path,))
 
+        try:
+            if to_bool(argv.get('read_only', False)):
+                # The sqlite3 module of Python 2 cannot open a database with
+                # mode=ro, so turn writing off instead:
+                connection.execute("PRAGMA query_only=ON;")
+            elif 'journal_mode' in argv:
+                connection.execute("PRAGMA journal_mode=%s;" % argv['journal_mode'])
+            self.journal_mode = str(connection.execute("PRAGMA journal_mode;").fetchone()[0]).lower()
+            if self.journal_mode == 'wal':
+                connection.execute("PRAGMA synchronous=%s;" % argv.get('synchronous', 'NORMAL'))
+                connection.execute("PRAGMA wal_autocheckpoint=%d;" % to_int(argv.get('wal_autocheckpoint', 1000)))
+            elif 'synchronous' in argv:
+                connection.execute("PRAGMA synchronous=%s;" % argv['synchronous'])
+        except sqlite3.OperationalError, e:
+            connection.close()
+            raise weedb.OperationalError("Unable to set up database '%s': %s" % (self.file_path, e))
+
         if pragmas is not None:
             for pragma in pragmas:
                 connection.execute("PRAGMA %s=%s;" % (pragma, pragmas[pragma]))
@@ -130,6 +167,12 @@ class Connection(weedb.Connection):
             table_list.append(str(row[0]))
         return table_list
 
+    @guard
+    def views(self):
+        """Returns a list of views in the database."""
+
+        return [str(row[0]) for row in self.connection.execute("""SELECT tbl_name FROM sqlite_master WHERE type='view';""")]
+
     @guard
     def genSchemaOf(self, table):
         """Return a summary of the schema of the specified table.
@@ -153,6 +196,14 @@ class Connection(weedb.Connection):
             raise weedb.ProgrammingError("No such table %s" % table)
         return column_list
 
+    @guard
+    def indexesOf(self, table):
+        """Return a list of the names of the indexes on the specified table.
+        The ones sqlite makes for itself, such as for the primary key, are
+        left out."""
+        return [str(row[1]) for row in self.connection.execute("""PRAGMA index_list(%s);""" % table)
+                if not str(row[1]).startswith('sqlite_autoindex_')]
+
     @guard
     def begin(self):
         self.connection.execute("BEGIN TRANSACTION")
@@ -182,6 +233,10 @@ class Cursor(sqlite3.Cursor):
     def execute(self, *args, **kwargs):
         return sqlite3.Cursor.execute(self, *args, **kwargs)
 
+    @guard
+    def executemany(self, *args, **kwargs):
+        return sqlite3.Cursor.executemany(self, *args, **kwargs)
+
     @guard
     def fetchone(self):
         return sqlite3.Cursor.fetchone(self)
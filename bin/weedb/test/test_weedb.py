@@ -92,6 +92,33 @@ class Common(unittest.TestCase):
         self.assertRaises(weedb.ProgrammingError, _connect.columnsOf, 'foo')
         _connect.close()
         
+    def test_views(self):
+        self.populate_db()
+        _connect = weedb.connect(self.db_dict)
+        self.assertEqual(_connect.views(), [])
+        with weedb.Transaction(_connect) as _cursor:
+            _cursor.execute("CREATE VIEW test3 AS SELECT dateTime, min FROM test1 WHERE mintime < 10")
+        # Views are kept apart from the tables:
+        self.assertEqual(_connect.views(), ['test3'])
+        self.assertItemsEqual(_connect.tables(), ['test1', 'test2'])
+        self.assertEqual(_connect.columnsOf('test3'), ['dateTime', 'min'])
+        _cursor = _connect.cursor()
+        _cursor.execute("SELECT COUNT(*), MAX(min) FROM test3")
+        self.assertEqual(_cursor.fetchone(), (10, 90))
+        _cursor.close()
+        _connect.close()
+        
+    def test_indexes(self):
+        self.populate_db()
+        _connect = weedb.connect(self.db_dict)
+        # The index on the primary key is not included:
+        self.assertEqual(_connect.indexesOf('test1'), [])
+        with weedb.Transaction(_connect) as _cursor:
+            _cursor.execute("CREATE INDEX test1_min ON test1 (dateTime, min, mintime)")
+        self.assertEqual(_connect.indexesOf('test1'), ['test1_min'])
+        self.assertEqual(_connect.indexesOf('test2'), [])
+        _connect.close()
+
     def test_select(self):
         self.populate_db()
         _connect = weedb.connect(self.db_dict)
@@ -119,6 +146,32 @@ class Common(unittest.TestCase):
         _cursor.close()
         _connect.close()
         
+    def test_streaming(self):
+        self.populate_db()
+        _connect = weedb.connect(self.db_dict)
+        _cursor = _connect.streaming_cursor()
+        nrows = 0
+        for _row in _cursor.execute("SELECT dateTime, min FROM test1 ORDER BY dateTime"):
+            self.assertEqual(_row[1], 10*_row[0])
+            # Other statements can be run while the result set is being read:
+            _connect.execute("INSERT INTO test2 (dateTime, min) VALUES (?, ?)", _row)
+            nrows += 1
+        _cursor.close()
+        self.assertEqual(nrows, 20)
+        self.assertEqual(_connect.cursor().execute("SELECT COUNT(*) FROM test2").fetchone()[0], 20)
+        # A cursor closed before its result set has been read leaves the connection usable:
+        _cursor = _connect.streaming_cursor()
+        _cursor.execute("SELECT dateTime FROM test1").fetchone()
+        _cursor.close()
+        # Big batches get split up:
+        with weedb.Transaction(_connect) as _cursor:
+            _cursor.executemany("INSERT INTO test2 (dateTime, min) VALUES (?, ?)", 
+                                ((irec, 10*irec) for irec in range(20, 2520)))
+        _cursor = _connect.streaming_cursor()
+        self.assertEqual(list(_cursor.execute("SELECT COUNT(*), MAX(min) FROM test2").fetchone()), [2520, 25190])
+        _cursor.close()
+        _connect.close()
+
     def test_bad_select(self):
         self.populate_db()
         _connect = weedb.connect(self.db_dict)
@@ -196,6 +249,30 @@ class TestSqlite(Common):
     def __init__(self, *args, **kwargs):
         self.db_dict = sqlite_db_dict
         super(TestSqlite, self).__init__(*args, **kwargs)
+
+    def test_wal(self):
+        self.populate_db()
+        _writer = weedb.connect(dict(self.db_dict, journal_mode='WAL'))
+        self.assertEqual(_writer.journal_mode, 'wal')
+        _reader = weedb.connect(dict(self.db_dict, read_only=True))
+        # The mode is kept in the database:
+        self.assertEqual(_reader.journal_mode, 'wal')
+        self.assertRaises(weedb.OperationalError, _reader.execute, "DELETE FROM test1")
+        # A reader in the middle of a transaction does not block the writer,
+        # nor see what it writes until the transaction is over:
+        _reader.begin()
+        _cursor = _reader.cursor()
+        _cursor.execute("SELECT COUNT(*) FROM test1")
+        self.assertEqual(_cursor.fetchone()[0], 20)
+        _writer.execute("INSERT INTO test1 (dateTime, min, mintime) VALUES (?, ?, ?)", (20, 200, 20))
+        _cursor.execute("SELECT COUNT(*) FROM test1")
+        self.assertEqual(_cursor.fetchone()[0], 20)
+        _reader.commit()
+        _cursor.execute("SELECT COUNT(*) FROM test1")
+        self.assertEqual(_cursor.fetchone()[0], 21)
+        _cursor.close()
+        _reader.close()
+        _writer.close()
         
 class TestMySQL(Common):
     
@@ -206,9 +283,9 @@ class TestMySQL(Common):
     
 def suite():
     tests = ['test_drop', 'test_double_create', 'test_no_db', 'test_no_tables', 
-             'test_create', 'test_bad_table', 'test_select', 'test_bad_select',
+             'test_create', 'test_bad_table', 'test_views', 'test_indexes', 'test_select', 'test_streaming', 'test_bad_select',
              'test_rollback', 'test_transaction']
-    return unittest.TestSuite(map(TestSqlite, tests) + map(TestMySQL, tests))
+    return unittest.TestSuite(map(TestSqlite, tests + ['test_wal']) + map(TestMySQL, tests))
 
 if __name__ == '__main__':
     unittest.TextTestRunner(verbosity=2).run(suite())
@@ -285,6 +285,10 @@ class TimeSpan(tuple):
             raise ValueError("start time (%d) is greater than stop time (%d)" % (args[0], args[1])) 
         return tuple.__new__(cls, args)
 
+    def __getnewargs__(self):
+        # So a TimeSpan can be pickled, such as when it is passed between processes:
+        return tuple(self)
+
     @property
     def start(self):
         return self[0]
@@ -1046,6 +1050,17 @@ def max_with_none(x_seq):
         elif x is not None:
             xmax = max(x, xmax)
     return xmax
+
+def sum_with_none(x_seq):
+    """Find the sum of a (possibly empty) sequence, ignoring Nones. If there
+    is nothing to sum, return None"""
+    xsum = None
+    for x in x_seq:
+        if xsum is None:
+            xsum = x
+        elif x is not None:
+            xsum += x
+    return xsum
         
 def read_config(config_fn, args=None, msg_to_stderr=True, exit_on_fail=True):
     """Read the specified configuration file, return a dictionary of the
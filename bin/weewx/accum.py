@@ -22,7 +22,10 @@ class ScalarStats(object):
     """Accumulates statistics (min, max, average, etc.) for a scalar value.
     
     Property 'last' is the last non-None value seen. Property 'lasttime' is
-    the time it was seen. """
+    the time it was seen. 
+    
+    Property 'dirty' is True if the stats-tuple has changed since it was
+    last set by setStats(), or if it has never been set. """
     
     default_init = (None, None, None, None, 0.0, 0, 0.0, 0)
     
@@ -36,6 +39,7 @@ class ScalarStats(object):
          self.max, self.maxtime,
          self.sum, self.count,
          self.wsum,self.sumtime) = stats_tuple if stats_tuple else ScalarStats.default_init
+        self.dirty = not stats_tuple
          
     def getStatsTuple(self):
         """Return a stats-tuple. That is, a tuple containing the gathered statistics.
@@ -49,10 +53,12 @@ class ScalarStats(object):
             if self.min is None or x_stats.min < self.min:
                 self.min     = x_stats.min
                 self.mintime = x_stats.mintime
+                self.dirty   = True
         if x_stats.max is not None:
             if self.max is None or x_stats.max > self.max:
                 self.max     = x_stats.max
                 self.maxtime = x_stats.maxtime
+                self.dirty   = True
         if x_stats.lasttime is not None:
             if self.lasttime is None or x_stats.lasttime >= self.lasttime:
                 self.lasttime = x_stats.lasttime
@@ -64,6 +70,7 @@ class ScalarStats(object):
         self.count   += x_stats.count
         self.wsum    += x_stats.wsum
         self.sumtime += x_stats.sumtime
+        self.dirty   = True
 
     def addHiLo(self, val, ts):
         """Include a scalar value in my highs and lows.
@@ -74,9 +81,11 @@ class ScalarStats(object):
             if self.min is None or val < self.min:
                 self.min     = val
                 self.mintime = ts
+                self.dirty   = True
             if self.max is None or val > self.max:
                 self.max     = val
                 self.maxtime = ts
+                self.dirty   = True
             if self.lasttime is None or ts >= self.lasttime:
                 self.last    = val
                 self.lasttime= ts
@@ -88,6 +97,7 @@ class ScalarStats(object):
             self.count   += 1
             self.wsum    += val * weight
             self.sumtime += weight
+            self.dirty   = True
         
     @property
     def avg(self):
@@ -97,7 +107,10 @@ class VecStats(object):
     """Accumulates statistics for a vector value.
      
     Property 'last' is the last non-None value seen. It is a two-way tuple (mag, dir).
-    Property 'lasttime' is the time it was seen. """
+    Property 'lasttime' is the time it was seen. 
+    
+    Property 'dirty' is True if the stats-tuple has changed since it was
+    last set by setStats(), or if it has never been set. """
 
     default_init = (None, None, None, None, 
                     0.0, 0, 0.0, 0, None, 0.0, 0.0, 0, 0.0, 0.0)
@@ -114,6 +127,7 @@ class VecStats(object):
          self.wsum,self.sumtime,
          self.max_dir, self.xsum, self.ysum, 
          self.dirsumtime, self.squaresum, self.wsquaresum) = stats_tuple if stats_tuple else VecStats.default_init
+        self.dirty = not stats_tuple
         
     def getStatsTuple(self):
         """Return a stats-tuple. That is, a tuple containing the gathered statistics."""
@@ -130,11 +144,13 @@ class VecStats(object):
             if self.min is None or x_stats.min < self.min:
                 self.min     = x_stats.min
                 self.mintime = x_stats.mintime
+                self.dirty   = True
         if x_stats.max is not None:
             if self.max is None or x_stats.max > self.max:
                 self.max     = x_stats.max
                 self.maxtime = x_stats.maxtime
                 self.max_dir = x_stats.max_dir
+                self.dirty   = True
         if x_stats.lasttime is not None:
             if self.lasttime is None or x_stats.lasttime >= self.lasttime:
                 self.lasttime = x_stats.lasttime
@@ -151,6 +167,7 @@ class VecStats(object):
         self.dirsumtime += x_stats.dirsumtime
         self.squaresum  += x_stats.squaresum
         self.wsquaresum += x_stats.wsquaresum
+        self.dirty      = True
          
     def addHiLo(self, val, ts):
         """Include a vector value in my highs and lows.
@@ -162,10 +179,12 @@ class VecStats(object):
             if self.min is None or speed < self.min:
                 self.min = speed
                 self.mintime = ts
+                self.dirty = True
             if self.max is None or speed > self.max:
                 self.max = speed
                 self.maxtime = ts
                 self.max_dir = dirN
+                self.dirty = True
             if self.lasttime is None or ts >= self.lasttime:
                 self.last    = (speed, dirN)
                 self.lasttime= ts
@@ -182,6 +201,7 @@ class VecStats(object):
             self.sumtime     += weight
             self.squaresum   += speed**2
             self.wsquaresum  += weight * speed**2
+            self.dirty        = True
             if dirN is not None :
                 self.xsum += weight * speed * math.cos(math.radians(90.0 - dirN))
                 self.ysum += weight * speed * math.sin(math.radians(90.0 - dirN))
@@ -7,6 +7,8 @@
 """Main engine for the weewx weather system."""
 
 # Python imports
+import __builtin__
+import ast
 import gc
 import os.path
 import platform
@@ -24,6 +26,7 @@ import daemon
 import weedb
 import weewx.accum
 import weewx.manager
+import weewx.recent
 import weewx.station
 import weewx.reportengine
 import weeutil.weeutil
@@ -110,6 +113,12 @@ class StdEngine(object):
     def preLoadServices(self, config_dict):
         
         self.stn_info = weewx.station.StationInfo(self.console, **config_dict['Station'])
+        # If asked, pool the database managers, so the services, report
+        # generators, and uploaders can reuse them:
+        pool_size = to_int(config_dict['Engine'].get('pool_size', 0))
+        if pool_size > 0:
+            weewx.manager.set_manager_pool(
+                weewx.manager.ManagerPool(pool_size, to_int(config_dict['Engine'].get('pool_max_idle', 900))))
         self.db_binder = weewx.manager.DBBinder(config_dict['DataBindings'],
                                                 config_dict['Databases'])
         
@@ -254,6 +263,11 @@ class StdEngine(object):
         except:
             pass
 
+        pool = weewx.manager.set_manager_pool(None)
+        if pool is not None:
+            syslog.syslog(syslog.LOG_INFO, "engine: Manager pool: %s" % pool)
+            pool.close()
+
     def _get_console_time(self):
         try:
             return self.console.getTime()
@@ -350,41 +364,103 @@ class StdCalibrate(StdService):
         # is missing, a KeyError exception will get thrown:
         try:
             correction_dict = config_dict['StdCalibrate']['Corrections']
-            self.corrections = {}
-
-            # For each correction, compile it, then save in a dictionary of
-            # corrections to be applied:
-            for obs_type in correction_dict.scalars:
-                self.corrections[obs_type] = compile(correction_dict[obs_type], 
-                                                     'StdCalibrate', 'eval')
-            
-            self.bind(weewx.NEW_LOOP_PACKET, self.new_loop_packet)
-            self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
         except KeyError:
             syslog.syslog(syslog.LOG_NOTICE, "engine: No calibration information in config file. Ignored.")
+            return
+
+        # Compile all the corrections, in the order given, into a single
+        # function that applies them to a packet:
+        self.apply_corrections = compile_corrections([(obs_type, correction_dict[obs_type])
+                                                      for obs_type in correction_dict.scalars])
+
+        self.bind(weewx.NEW_LOOP_PACKET, self.new_loop_packet)
+        self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
             
     def new_loop_packet(self, event):
         """Apply a calibration correction to a LOOP packet"""
-        for obs_type in self.corrections:
-            try:
-                event.packet[obs_type] = eval(self.corrections[obs_type], None, event.packet)
-            except (TypeError, NameError):
-                pass
-            except ValueError, e:
-                syslog.syslog(syslog.LOG_ERR, "engine: StdCalibration loop error %s" % e)
+        self.apply_corrections(event.packet, 'loop')
 
     def new_archive_record(self, event):
         """Apply a calibration correction to an archive packet"""
         # If the record was software generated, then any corrections have
         # already been applied in the LOOP packet.
         if event.origin != 'software':
-            for obs_type in self.corrections:
-                try:
-                    event.record[obs_type] = eval(self.corrections[obs_type], None, event.record)
-                except (TypeError, NameError):
-                    pass
-                except ValueError, e:
-                    syslog.syslog(syslog.LOG_ERR, "engine: StdCalibration archive error %s" % e)
+            self.apply_corrections(event.record, 'archive')
+
+def compile_corrections(corrections):
+    """Compile calibration expressions into a single function.
+    
+    corrections: A list of 2-way tuples (obs_type, expression), such as
+    ('outTemp', 'outTemp - 0.2'). The corrections are applied in this order, so
+    an expression sees the corrected value of any type before it.
+    
+    returns: A function f(packet, origin), which applies the corrections to a
+    packet (or record) in place. Origin is used only in the log, and is
+    something like 'loop' or 'archive'.
+    
+    The names in each expression are found when it is compiled. As before, a
+    name is looked up in the packet first, then in the globals of this module
+    and the builtins. A correction is skipped if the packet lacks a name that
+    is not found in either place, or if it raises a TypeError (for example,
+    because an input is None). A ValueError is logged."""
+
+    # Names that an expression can use without them being in the packet:
+    namespace = dict(globals())
+    known_names = set(namespace) | set(dir(__builtin__))
+
+    lines = ["def _apply_corrections(__packet, __origin):"]
+    for (obs_type, expression) in corrections:
+        # Raise a SyntaxError now, rather than when the function is compiled:
+        compile(expression, 'StdCalibrate', 'eval')
+        lines.append("    # %s = %s" % (obs_type, expression.replace('\n', ' ')))
+        (expression, names) = _bind_free_names(expression, '__v_')
+        inputs = [name for name in names if name not in known_names]
+        if inputs:
+            lines.append("    if %s:" % " and ".join(["%r in __packet" % name for name in inputs]))
+        else:
+            lines.append("    if True:")
+        for name in names:
+            if name in known_names:
+                lines.append("        __v_%s = __packet[%r] if %r in __packet else %s" % (name, name, name, name))
+            else:
+                lines.append("        __v_%s = __packet[%r]" % (name, name))
+        lines.extend(["        try:",
+                      "            __packet[%r] = (" % obs_type,
+                      "                %s" % expression,
+                      "                )",
+                      "        except (TypeError, NameError):",
+                      "            pass",
+                      "        except ValueError, __e:",
+                      "            syslog.syslog(syslog.LOG_ERR, \"engine: StdCalibration %s error %s\" % (__origin, __e))"])
+    lines.append("    pass")
+
+    exec compile("\n".join(lines) + "\n", 'StdCalibrate', 'exec') in namespace
+    return namespace['_apply_corrections']
+
+def _bind_free_names(expression, prefix):
+    """Rename the names an expression reads, but does not bind itself (as the
+    arguments of a lambda, or the variables of a list comprehension, are
+    bound), by putting a prefix in front of them.
+    
+    returns: A 2-way tuple (expression, names), with the new expression and a
+    sorted list of the names that were renamed."""
+    loaded = []
+    bound = set()
+    for node in ast.walk(ast.parse(expression, mode='eval')):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                loaded.append(node)
+            else:
+                bound.add(node.id)
+    free = [node for node in loaded if node.id not in bound]
+    # Rename them where they stand, from the last to the first, so the
+    # positions of those still to be renamed do not change:
+    lines = expression.split('\n')
+    for node in sorted(free, key=lambda node: (node.lineno, node.col_offset), reverse=True):
+        line = lines[node.lineno - 1]
+        assert line[node.col_offset:node.col_offset + len(node.id)] == node.id
+        lines[node.lineno - 1] = line[:node.col_offset] + prefix + line[node.col_offset:]
+    return ('\n'.join(lines), sorted(set(node.id for node in free)))
 
 #==============================================================================
 #                    Class StdQC
@@ -466,12 +542,22 @@ class StdArchive(StdService):
             self.archive_delay = to_int(config_dict['StdArchive'].get('archive_delay', 15))
             software_interval  = to_int(config_dict['StdArchive'].get('archive_interval', 300))
             self.loop_hilo     = to_bool(config_dict['StdArchive'].get('loop_hilo', True))
+            self.write_behind  = to_bool(config_dict['StdArchive'].get('write_behind', False))
+            self.write_queue_size = to_int(config_dict['StdArchive'].get('write_queue_size', 20))
+            self.tiers         = weeutil.weeutil.option_as_list(config_dict['StdArchive'].get('tiers', []))
+            self.retain_days   = to_int(config_dict['StdArchive'].get('retain_days', 0))
+            self.recent_hours  = to_int(config_dict['StdArchive'].get('recent_hours', 25))
         else:
             self.data_binding = 'wx_binding'
             self.record_generation = 'hardware'
             self.archive_delay = 15
             software_interval = 300
             self.loop_hilo = True
+            self.write_behind = False
+            self.write_queue_size = 20
+            self.tiers = []
+            self.retain_days = 0
+            self.recent_hours = 25
             
         syslog.syslog(syslog.LOG_INFO, "engine: Archive will use data binding %s" % self.data_binding)
         
@@ -568,9 +654,8 @@ class StdArchive(StdService):
         # If we happen to startup in the small time interval between the end of
         # the archive interval and the end of the archive delay period, then
         # there will be no old accumulator.
-        dbmanager = self.engine.db_binder.get_manager(self.data_binding)
         if hasattr(self, 'old_accumulator'):
-            dbmanager.updateHiLo(self.old_accumulator)
+            self._writer().updateHiLo(self.old_accumulator)
             # If the user has requested software generation, then do that:
             if self.record_generation == 'software':
                 self._software_catchup()
@@ -585,14 +670,20 @@ class StdArchive(StdService):
             else:
                 raise ValueError("Unknown station record generation value %s" % self.record_generation)
 
+            if self.archive_writer:
+                syslog.syslog(syslog.LOG_DEBUG, "engine: Archive writer %s" % self.archive_writer)
+
         # Set the time of the next break loop:
         self.end_archive_delay_ts = self.end_archive_period_ts + self.archive_delay
         
     def new_archive_record(self, event):
         """Called when a new archive record has arrived. 
         Put it in the archive database."""
-        dbmanager = self.engine.db_binder.get_manager(self.data_binding)
-        dbmanager.addRecord(event.record)
+        self._writer().addRecord(event.record)
+        if self.recent_records is not None:
+            self.recent_records.addRecord(event.record)
+        if self.tiers:
+            self._update_tiers(event.record['dateTime'])
 
     def setup_database(self, config_dict):
         """Setup the main database archive"""
@@ -613,7 +704,85 @@ class StdArchive(StdService):
         else:
             syslog.syslog(syslog.LOG_INFO,
                           "engine: Daily summaries up to date.")
-    
+
+        # If requested, write to the database in a thread of its own. Anyone
+        # getting a manager of the table will still see the records queued
+        # so far.
+        if self.write_behind:
+            manager_dict = weewx.manager.get_manager_dict(config_dict['DataBindings'],
+                                                          config_dict['Databases'],
+                                                          self.data_binding)
+            self.archive_writer = weewx.manager.ArchiveWriter(manager_dict, self.write_queue_size)
+            self.archive_writer.start()
+            syslog.syslog(syslog.LOG_INFO, "engine: Archive writes will be queued (queue size %d)" % self.write_queue_size)
+        else:
+            self.archive_writer = None
+
+        # If requested, keep the records downsampled into tiers of hours or
+        # days, and expire the old ones:
+        if self.tiers:
+            _added = dbmanager.add_tiers(self.tiers)
+            if _added:
+                syslog.syslog(syslog.LOG_INFO, "engine: Added tiers %s of downsampled records" % ', '.join(_added))
+            if self.retain_days:
+                syslog.syslog(syslog.LOG_INFO, "engine: Records will be kept for %d days" % self.retain_days)
+        elif self.retain_days:
+            syslog.syslog(syslog.LOG_ERR, "engine: Option retain_days requires option tiers. Records will not be expired.")
+        self.tiers_hour = None
+
+        # Keep the last recent_hours of records in memory, for the services,
+        # uploaders and reports to read, rather than the database:
+        if self.recent_hours:
+            self.recent_records = weewx.recent.RecentRecords(dbmanager.sqlkeys, self.recent_hours, self.archive_interval)
+            self.recent_records.prime(dbmanager)
+            self.recent_key = dbmanager.table_key
+            weewx.recent.set_recent_records(self.recent_key, self.recent_records)
+            syslog.syslog(syslog.LOG_INFO, "engine: Holding the last %d hours of records in memory (%s)" %
+                          (self.recent_hours, self.recent_records))
+        else:
+            self.recent_records = None
+
+    def shutDown(self):
+        """Write anything still queued for the archive, withdraw the records
+        held in memory, and suggest any covering indexes that would have sped
+        up the queries on it."""
+        if getattr(self, 'archive_writer', None):
+            self.archive_writer.close()
+            self.archive_writer = None
+        if getattr(self, 'recent_records', None) is not None:
+            weewx.recent.set_recent_records(self.recent_key, None)
+            self.recent_records = None
+        try:
+            _suggested = self.engine.db_binder.get_manager(self.data_binding).suggest_indexes()
+        except (weedb.DatabaseError, AttributeError):
+            return
+        if _suggested:
+            syslog.syslog(syslog.LOG_INFO, "engine: Queries over the archive would be faster with covering indexes for: %s" %
+                          ', '.join(_suggested))
+            syslog.syslog(syslog.LOG_INFO, "engine: To add them, use 'wee_config_database --add-indexes=%s'" %
+                          ','.join(_suggested))
+
+    def _update_tiers(self, timestamp):
+        """Once an hour, roll the records of the hours (and days) that have
+        ended into the tiers of downsampled records, then expire the records
+        older than retain_days."""
+        _hour = weeutil.weeutil.startOfInterval(timestamp - 1, 3600)
+        if _hour == self.tiers_hour:
+            return
+        self.tiers_hour = _hour
+        try:
+            dbmanager = self.engine.db_binder.get_manager(self.data_binding)
+            dbmanager.update_tiers()
+            if self.retain_days:
+                dbmanager.expire_records(timestamp - self.retain_days * 24 * 3600)
+        except weedb.DatabaseError, e:
+            syslog.syslog(syslog.LOG_ERR, "engine: Unable to update the tiers of downsampled records: %s" % e)
+
+    def _writer(self):
+        """Returns the object that archive records and high/lows are written
+        with: either the archive writer, or the database manager itself."""
+        return self.archive_writer or self.engine.db_binder.get_manager(self.data_binding)
+
 
     def _catchup(self, generator):
         """Pull any unarchived records off the console and archive them.
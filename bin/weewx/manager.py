@@ -5,16 +5,161 @@
 #
 """Classes and functions for interfacing with a weewx archive."""
 from __future__ import with_statement
+import bisect
+import collections
+import contextlib
+import itertools
 import math
+import multiprocessing
+import os.path
+import Queue
+import re
 import syslog
 import sys
+import threading
+import time
 
 import weewx.accum
+import weewx.recent
 from weewx.units import ValueTuple
 import weewx.units
 import weeutil.weeutil
 import weedb
 
+#==============================================================================
+#                         class AggregateCache
+#==============================================================================
+
+class AggregateCache(object):
+    """A bounded, least-recently-used memo of the results of aggregate queries.
+
+    One instance can be shared by many managers, possibly bound to different
+    databases. For example, the report engine shares one with all the
+    generators of a report cycle, so a query asked by more than one template
+    or plot hits the database only once. See function cache_aggregates() for
+    how the managers use it.
+
+    Results are keyed on the table they came from. See Manager.table_key.
+    All those from a table are forgotten as soon as the timestamp of its last
+    record changes, or a record is added to it by a manager that shares the
+    cache.
+
+    USEFUL ATTRIBUTES
+
+    max_entries: The largest number of results held at one time.
+
+    hits: The number of queries answered from the cache.
+
+    misses: The number of queries that had to go to the database."""
+
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # The cached results, in order of use. The key is a tuple whose first
+        # element is the table key of the table it came from. The value
+        # is a 2-way tuple (result, pinned). See cache_aggregates() for pinned.
+        self._entries = collections.OrderedDict()
+        # The last timestamp of each table, as of when its results were cached:
+        self._last_timestamps = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "%d hits, %d misses, %d entries" % (self.hits, self.misses, len(self._entries))
+
+    def get(self, key, last_timestamp):
+        """Look up a result.
+
+        key: The key of the result. Its first element is the table key of
+        the table that was queried. See Manager.table_key.
+
+        last_timestamp: The timestamp of the last record in that table, as it
+        is known to the caller. If it is not the same as when the cached
+        results from the table were calculated, then they are all discarded.
+
+        returns: The result, or None if it is not in the cache."""
+        if self._last_timestamps.get(key[0], last_timestamp) != last_timestamp:
+            self.invalidate(key[0])
+        self._last_timestamps[key[0]] = last_timestamp
+        try:
+            _entry = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        # Put it back in, to mark it as the most recently used:
+        self._entries[key] = _entry
+        self.hits += 1
+        return _entry[0]
+
+    def put(self, key, result, pinned=()):
+        """Cache a result, discarding the least recently used one if full.
+
+        pinned: Objects to be kept alive for as long as the result is cached."""
+        self._entries[key] = (result, pinned)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, table_key=None):
+        """Discard cached results.
+
+        table_key: The table key of the table whose results are to be
+        discarded. Default is None, which discards everything."""
+        if table_key is None:
+            self._entries.clear()
+            self._last_timestamps.clear()
+        else:
+            for _key in [_key for _key in self._entries if _key[0] == table_key]:
+                del self._entries[_key]
+            self._last_timestamps.pop(table_key, None)
+
+def cache_aggregates(fn):
+    """Decorator function that memoizes a query method of a manager in its
+    aggregate cache, if it has one.
+
+    The key is the name of the method, together with its arguments. Values
+    that cannot be hashed, such as a skin dictionary, go into the key by
+    their identity, and are pinned for as long as the result is cached, so
+    the identity cannot be reused. Queries that a cached method makes
+    along the way are not cached themselves. Results are shared, so they
+    must not be modified."""
+
+    def cached_fn(self, *args, **kwargs):
+        if self.aggregate_cache is None or self._in_cached_query:
+            return fn(self, *args, **kwargs)
+
+        (_key, _pinned) = _aggregate_key(self, fn.__name__, args, kwargs)
+        _result = self.aggregate_cache.get(_key, self.last_timestamp)
+        if _result is None:
+            self._in_cached_query = True
+            try:
+                _result = fn(self, *args, **kwargs)
+            finally:
+                self._in_cached_query = False
+            self.aggregate_cache.put(_key, _result, _pinned)
+        return _result
+
+    cached_fn.__name__ = fn.__name__
+    cached_fn.__doc__  = fn.__doc__
+    return cached_fn
+
+def _aggregate_key(manager, fn_name, args, kwargs):
+    """Returns the key of a call to a query method in the aggregate cache,
+    and a tuple of the values to be pinned with it. See cache_aggregates()."""
+    _pinned = []
+    def _hashable(x):
+        try:
+            hash(x)
+        except TypeError:
+            _pinned.append(x)
+            return ('id', id(x))
+        return x
+    _key = (manager.table_key, fn_name) \
+        + tuple(_hashable(_arg) for _arg in args) \
+        + tuple((_name, _hashable(kwargs[_name])) for _name in sorted(kwargs))
+    return (_key, tuple(_pinned))
+
 #==============================================================================
 #                         class Manager
 #==============================================================================
@@ -45,7 +190,23 @@ class Manager(object):
     
     first_timestamp: The timestamp of the earliest record in the table.
     
-    last_timestamp: The timestamp of the last record in the table."""
+    last_timestamp: The timestamp of the last record in the table.
+    
+    partition_period: If the records are kept in a table for each year or
+    month, 'year' or 'month'. Otherwise, None. See partition().
+    
+    partitions: The periods of those tables, such as '2014', in order.
+    
+    tiers: The tiers the records are downsampled into, finest first, such as
+    ['hour', 'day']. See add_tiers().
+    
+    aggregate_cache: An instance of AggregateCache, which will be used to
+    memoize the results of aggregate queries, or None to not memoize them.
+    Default is None.
+    
+    table_key: A tuple that identifies the table among those of every
+    database, including databases of the same name on other servers, or
+    under other roots. See table_key()."""
     
     def __init__(self, connection, table_name='archive', schema=None):
         """Initialize an object of type Manager.
@@ -63,6 +224,16 @@ class Manager(object):
 
         self.connection = connection
         self.table_name = table_name
+        # Set by open() and open_with_create(), which know where the database is:
+        self.table_key = (connection.dbtype, connection.database_name, table_name)
+        # Cache of SQL insert statements, keyed by the table, then the inserted keys:
+        self._insert_stmts = {}
+        self.aggregate_cache = None
+        self._in_cached_query = False
+        # Records recently returned by getRecord(), keyed by its arguments.
+        # They are forgotten whenever records are added or changed:
+        self._record_cache = collections.OrderedDict()
+        self._record_cache_stamp = None
 
         # Now get the SQL types. 
         try:
@@ -99,6 +270,7 @@ class Manager(object):
 
         # Create an instance of the right class and return it:
         dbmanager = cls(connection, table_name)
+        dbmanager.table_key = table_key(database_dict, table_name)
         return dbmanager
     
     @classmethod
@@ -135,6 +307,7 @@ class Manager(object):
 
         # Create an instance of the right class and return it:
         dbmanager = cls(connection, table_name=table_name, schema=schema)
+        dbmanager.table_key = table_key(database_dict, table_name)
         return dbmanager
     
     @property
@@ -165,10 +338,7 @@ class Manager(object):
         schema: The schema to be used
         """
     
-        # List comprehension of the types, joined together with commas. Put
-        # the SQL type in backquotes, because at least one of them ('interval')
-        # is a MySQL reserved word
-        _sqltypestr = ', '.join(["`%s` %s" % _type for _type in schema])
+        _sqltypestr = _column_defs(schema)
 
         try:
             with weedb.Transaction(self.connection) as _cursor:
@@ -181,35 +351,460 @@ class Manager(object):
         syslog.syslog(syslog.LOG_NOTICE, "manager: Created and initialized table '%s' in database '%s'" % 
                       (self.table_name, self.database_name))
 
+    def getIndexes(self):
+        """Returns the list of observation types that have a covering index.
+        See add_indexes()."""
+        _table = self._tables()[-1]
+        _prefix = '%s_dateTime_' % _table
+        return [_index[len(_prefix):] for _index in self.connection.indexesOf(_table)
+                if _index.startswith(_prefix)]
+
+    def add_indexes(self, obs_types):
+        """Add a covering index on (dateTime, obs_type, usUnits) for each of
+        the observation types that does not already have one. Queries over a
+        span of time that need just the one type, such as its sum or maximum,
+        can then be answered from the index, without reading the records.
+        Each index adds to the size of the table, and the time taken to add a
+        record, so they are best kept to the types queried the most. See
+        suggest_indexes().
+        
+        returns: The list of types that were added."""
+        
+        _existing = self.getIndexes()
+        _new_types = []
+        for _obs_type in obs_types:
+            if _obs_type not in self.sqlkeys or _obs_type in ['dateTime', 'usUnits']:
+                syslog.syslog(syslog.LOG_ERR, "manager: Cannot index unknown type '%s' in table '%s'" % 
+                              (_obs_type, self.table_name))
+            elif _obs_type not in _existing and _obs_type not in _new_types:
+                _new_types.append(_obs_type)
+        if not _new_types:
+            return []
+        with weedb.Transaction(self.connection) as _cursor:
+            for _table in self._tables():
+                for _obs_type in _new_types:
+                    _cursor.execute(Manager.index_create_str % {'table' : _table, 'obs_type' : _obs_type})
+        syslog.syslog(syslog.LOG_NOTICE, "manager: Added covering indexes for %s to table '%s' in database '%s'" % 
+                      (', '.join(_new_types), self.table_name, self.database_name))
+        return _new_types
+
+    def drop_indexes(self, obs_types=None):
+        """Drop the covering indexes of some observation types, or of them
+        all if obs_types is None.
+        
+        returns: The list of types that were dropped."""
+        
+        _dropped = [_obs_type for _obs_type in self.getIndexes() if obs_types is None or _obs_type in obs_types]
+        with weedb.Transaction(self.connection) as _cursor:
+            for _table in self._tables():
+                for _obs_type in _dropped:
+                    if self.connection.dbtype == 'mysql':
+                        _cursor.execute("DROP INDEX %s_dateTime_%s ON %s;" % (_table, _obs_type, _table))
+                    else:
+                        _cursor.execute("DROP INDEX %s_dateTime_%s;" % (_table, _obs_type))
+        return _dropped
+
+    index_create_str = "CREATE INDEX %(table)s_dateTime_%(obs_type)s ON %(table)s (dateTime, `%(obs_type)s`, usUnits);"
+
+    def suggest_indexes(self, min_time=1.0):
+        """Suggest observation types that would be worth a covering index,
+        from the queries made over the table so far by this process. See
+        get_scan_stats().
+        
+        min_time: The least time, in seconds, that queries over a type must
+        have taken between them for it to be suggested. Default is 1.0.
+        
+        returns: A list of the types without an index, busiest first."""
+        
+        _stats = get_scan_stats(self.database_name, self.table_name)
+        _indexed = self.getIndexes()
+        _busiest = sorted(_stats, key=lambda _obs_type: _stats[_obs_type][1], reverse=True)
+        return [_obs_type for _obs_type in _busiest 
+                if _stats[_obs_type][1] >= min_time and _obs_type not in _indexed]
+
+    def partition(self, period='year'):
+        """Move the records into a table for each year, or for each month,
+        named after the archive table and the period, such as 'archive_2014'
+        or 'archive_201403'. The archive table is replaced by a view of the
+        same name, of all of them, so the records can still be read as
+        before. But queries over a span of time that falls within a single
+        period only need to look at its table, and the tables of old periods
+        can be detached. See detach_partition(). The tables of new periods are
+        added as they are needed.
+        
+        period: Either 'year' or 'month'. Default is 'year'.
+        
+        returns: True if the records were moved, False if they were already
+        partitioned."""
+
+        if self.partition_period:
+            return False
+        if period not in Manager.partition_formats:
+            raise weewx.ViolatedPrecondition("Invalid partition period '%s'" % period)
+        _schema = _archive_schema(self.connection, self.table_name)
+        _indexes = self.getIndexes()
+        # Only the periods with records get a table, unless there are none at all:
+        _suffixes = [_suffix for _suffix in _partitions_between(self.first_timestamp, self.last_timestamp, period)
+                     if self.getSql("SELECT dateTime FROM %s WHERE dateTime > ? AND dateTime <= ? LIMIT 1" % 
+                                    self.table_name, _partition_span(_suffix))] \
+                    if self.first_timestamp is not None else []
+        _suffixes = _suffixes or [_partition_of(time.time(), period)]
+        with weedb.Transaction(self.connection) as _cursor:
+            for _suffix in _suffixes:
+                self._create_partition(_suffix, _schema, _indexes, _cursor)
+                _cursor.execute("INSERT INTO %s_%s SELECT * FROM %s WHERE dateTime > ? AND dateTime <= ?" % 
+                                (self.table_name, _suffix, self.table_name), _partition_span(_suffix))
+            _cursor.execute("DROP TABLE %s" % self.table_name)
+            self.partitions = _suffixes
+            self.partition_period = period
+            self._create_partition_view(_cursor)
+        syslog.syslog(syslog.LOG_NOTICE, "manager: Moved the records of table '%s' in database '%s' into %d tables, one for each %s" %
+                      (self.table_name, self.database_name, len(_suffixes), period))
+        self._invalidate_aggregates()
+        return True
+
+    def unpartition(self):
+        """Move the records back into a single archive table. This undoes
+        partition().
+        
+        returns: True if the records were moved, False if they were not
+        partitioned."""
+
+        if not self.partition_period:
+            return False
+        _tables = self._tables()
+        _schema = _archive_schema(self.connection, _tables[-1])
+        _indexes = self.getIndexes()
+        with weedb.Transaction(self.connection) as _cursor:
+            _cursor.execute("DROP VIEW %s" % self.table_name)
+            _cursor.execute("CREATE TABLE %s (%s);" % (self.table_name, _column_defs(_schema)))
+            for _table in _tables:
+                _cursor.execute("INSERT INTO %s SELECT * FROM %s" % (self.table_name, _table))
+                _cursor.execute("DROP TABLE %s" % _table)
+            for _obs_type in _indexes:
+                _cursor.execute(Manager.index_create_str % {'table' : self.table_name, 'obs_type' : _obs_type})
+        self.partitions = []
+        self.partition_period = None
+        syslog.syslog(syslog.LOG_NOTICE, "manager: Moved the records of %d tables back into table '%s' in database '%s'" %
+                      (len(_tables), self.table_name, self.database_name))
+        self._invalidate_aggregates()
+        return True
+
+    def detach_partition(self, suffix, database_dict):
+        """Move the records of one period out to a database of their own,
+        such as a separate sqlite file, so they can be archived. They are then
+        no longer part of the archive table, although any daily summaries
+        made from them remain.
+        
+        suffix: The period to be detached, such as '2014'.
+        
+        database_dict: The database the records are to be moved to. It is
+        created, with a table of the same name and schema as the archive.
+        
+        returns: The number of records moved."""
+
+        if suffix not in self.partitions:
+            raise weewx.ViolatedPrecondition("No partition '%s' of table '%s'" % (suffix, self.table_name))
+        if len(self.partitions) == 1:
+            raise weewx.ViolatedPrecondition("Cannot detach the only partition of table '%s'" % self.table_name)
+        _table = "%s_%s" % (self.table_name, suffix)
+        _span = _partition_span(suffix)
+        _count = self.getSql("SELECT COUNT(*) FROM %s" % _table)[0]
+        weedb.create(database_dict)
+        with Manager.open_with_create(database_dict, self.table_name, _archive_schema(self.connection, _table)) as _detached:
+            _detached.addRecord(self.genBatchRecords(_span.start, _span.stop), log_level=None)
+            _moved = _detached.getSql("SELECT COUNT(*) FROM %s" % self.table_name)[0]
+        if _moved != _count:
+            raise weedb.OperationalError("Only %d of %d records of partition '%s' could be moved" % (_moved, _count, suffix))
+        with weedb.Transaction(self.connection) as _cursor:
+            self.partitions.remove(suffix)
+            self._create_partition_view(_cursor)
+            _cursor.execute("DROP TABLE %s" % _table)
+        syslog.syslog(syslog.LOG_NOTICE, "manager: Moved %d records of table '%s' to database '%s'" %
+                      (_moved, _table, database_dict['database_name']))
+        self._sync()
+        self._invalidate_aggregates()
+        return _moved
+
+    # The format of the period of a partition, for each length of period:
+    partition_formats = {'year' : '%Y', 'month' : '%Y%m'}
+
+    def _find_partitions(self, all_tables=None):
+        """Look for the tables of a partitioned archive. See partition()."""
+        _pattern = re.compile(r'^%s_(\d{4}|\d{6})$' % re.escape(self.table_name))
+        _suffixes = sorted(_match.group(1) for _match in [_pattern.match(_table) 
+                                                          for _table in (all_tables or self.connection.tables())]
+                           if _match)
+        if _suffixes and self.table_name in self.connection.views():
+            self.partitions = _suffixes
+            self.partition_period = 'year' if len(_suffixes[0]) == 4 else 'month'
+        else:
+            self.partitions = []
+            self.partition_period = None
+
+    def _tables(self):
+        """Returns the names of the tables that hold the records, in order."""
+        return ["%s_%s" % (self.table_name, _suffix) for _suffix in self.partitions] or [self.table_name]
+
+    def _tableOf(self, start, stop):
+        """Returns the table to be queried for the records with start <
+        dateTime <= stop. If the archive is partitioned, and they all fall in
+        the same period, that is the table of the period. Otherwise, it is the
+        archive table itself (or view, as it may be)."""
+        if self.partition_period:
+            _suffix = _partition_of(start + 1, self.partition_period)
+            if _suffix == _partition_of(stop, self.partition_period) and _suffix in self.partitions:
+                return "%s_%s" % (self.table_name, _suffix)
+        return self.table_name
+
+    def _insertTableOf(self, timestamp):
+        """Returns the table a record with the given timestamp is to be added
+        to. If the archive is partitioned, that is the table of its period.
+        See _add_partitions()."""
+        if not self.partition_period:
+            return self.table_name
+        return "%s_%s" % (self.table_name, _partition_of(timestamp, self.partition_period))
+
+    def _add_partitions(self, batch, cursor):
+        """If the archive is partitioned, create the tables of the periods of
+        a batch of records that do not have one yet. This is done before the
+        batch gets its savepoint, so rolling the savepoint back leaves the
+        tables in place (and the implicit commit MySQL does on DDL cannot
+        release it)."""
+        if not self.partition_period:
+            return
+        _suffixes = set(_partition_of(record['dateTime'], self.partition_period) 
+                        for record in batch if record['dateTime'] is not None) - set(self.partitions)
+        if not _suffixes:
+            return
+        _all_tables = self.connection.tables()
+        _schema = _archive_schema(self.connection, self._tables()[-1])
+        _indexes = self.getIndexes()
+        for _suffix in sorted(_suffixes):
+            if "%s_%s" % (self.table_name, _suffix) not in _all_tables:
+                self._create_partition(_suffix, _schema, _indexes, cursor)
+        self.partitions = sorted(set(self.partitions) | _suffixes)
+        self._create_partition_view(cursor)
+
+    def _create_partition(self, suffix, schema, indexes, cursor):
+        _table = "%s_%s" % (self.table_name, suffix)
+        cursor.execute("CREATE TABLE %s (%s);" % (_table, _column_defs(schema)))
+        for _obs_type in indexes:
+            cursor.execute(Manager.index_create_str % {'table' : _table, 'obs_type' : _obs_type})
+
+    def _create_partition_view(self, cursor):
+        cursor.execute("DROP VIEW IF EXISTS %s" % self.table_name)
+        cursor.execute("CREATE VIEW %s AS %s" % (self.table_name, 
+                                                 ' UNION ALL '.join(["SELECT * FROM %s" % _table for _table in self._tables()])))
+
+    def add_tiers(self, tiers):
+        """Keep the records downsampled into tiers of coarser resolution: a
+        row for each hour, or for each day, in a table named after the archive
+        table and the tier, such as 'archive_tier_hour'. Each row holds the
+        values weewx.accum would give for a record of the whole hour or day
+        (sums for rain, vector averages for wind), along with the minimum,
+        maximum, sum and count of each type, so that aggregates over spans
+        made of whole hours or days can be calculated from the tier exactly.
+        getSqlVectors() reads the coarsest tier that it can. Once the records
+        have been rolled up into every tier, they can be expired from the
+        archive table. See expire_records().
+        
+        tiers: A list of tiers, each either 'hour' or 'day'.
+        
+        returns: A list of the tiers that were added, and filled from the
+        records already in the archive."""
+
+        _added = []
+        for _tier in tiers:
+            if _tier not in Manager.tier_lengths:
+                raise weewx.ViolatedPrecondition("Invalid tier '%s'" % _tier)
+            if _tier in self.tiers:
+                continue
+            _columns = [('dateTime', 'INTEGER NOT NULL UNIQUE PRIMARY KEY'),
+                        ('usUnits',  'INTEGER NOT NULL'),
+                        ('interval', 'INTEGER NOT NULL')]
+            for _obs_type in self.obskeys:
+                _columns += [(_obs_type, 'REAL')] + [("%s_%s" % (_obs_type, _stat), 'INTEGER' if _stat == 'count' else 'REAL')
+                                                     for _stat in Manager.tier_stats]
+            with weedb.Transaction(self.connection) as _cursor:
+                _cursor.execute("CREATE TABLE %s_tier_%s (%s);" % (self.table_name, _tier, _column_defs(_columns)))
+            self.tiers = [_t for _t in Manager.tier_order if _t in self.tiers + [_tier]]
+            _added.append(_tier)
+        if _added:
+            self.update_tiers()
+        return _added
+
+    def drop_tiers(self, tiers=None):
+        """Drop tiers of downsampled records. See add_tiers().
+        
+        tiers: A list of the tiers to be dropped. Default is all of them.
+        
+        returns: A list of the tiers that were dropped."""
+
+        _dropped = [_tier for _tier in self.tiers if tiers is None or _tier in tiers]
+        with weedb.Transaction(self.connection) as _cursor:
+            for _tier in _dropped:
+                _cursor.execute("DROP TABLE %s_tier_%s" % (self.table_name, _tier))
+        self.tiers = [_tier for _tier in self.tiers if _tier not in _dropped]
+        self._tier_types = {}
+        self._invalidate_aggregates()
+        return _dropped
+
+    def update_tiers(self):
+        """Roll up the records of every hour, or day, that has ended since the
+        tiers were last brought up to date. See add_tiers(). Records added
+        later for an hour or day that has already been rolled up are not
+        reflected in the tiers.
+        
+        returns: The number of rows added, over all the tiers."""
+
+        _last_ts = self.lastGoodStamp()
+        _added = 0
+        for _tier in self.tiers:
+            _table = "%s_tier_%s" % (self.table_name, _tier)
+            _obs_types = self._tierTypesOf(_tier)
+            _start = self.getSql("SELECT MAX(dateTime) FROM %s" % _table)[0]
+            if _last_ts is None or (_start is not None and _start >= _last_ts):
+                continue
+            # Only buckets that have ended are rolled up:
+            _last_span = _tier_span(_tier, _last_ts)
+            _stop = _last_span.stop if _last_ts == _last_span.stop else _last_span.start
+            _sql_str = "INSERT INTO %s (dateTime, usUnits, `interval`, %s) VALUES (%s)" % \
+                (_table, ', '.join(["`%s`" % _column for _obs_type in _obs_types for _column in _tier_columns(_obs_type)]),
+                 ', '.join(['?'] * (3 + len(_obs_types) * (1 + len(Manager.tier_stats)))))
+            with weedb.Transaction(self.connection) as _cursor:
+                for (_span, _records) in itertools.groupby(self.genBatchRecords(_start, _stop), 
+                                                           lambda _record: _tier_span(_tier, _record['dateTime'])):
+                    _cursor.execute(_sql_str, _tier_row(_span, _records, _obs_types))
+                    _added += 1
+        if _added:
+            self._invalidate_aggregates()
+        return _added
+
+    def expire_records(self, cutoff_ts):
+        """Delete the records stamped at or before a time, but only those that
+        have been rolled up into every tier of downsampled records. See
+        add_tiers(). If the archive is partitioned, the tables of periods
+        that have expired altogether are dropped, except the newest.
+        
+        cutoff_ts: The time up to which records are to be deleted.
+        
+        returns: The number of records deleted."""
+
+        if not self.tiers:
+            raise weewx.ViolatedPrecondition("Table '%s' has no tiers that its records could be expired into" % self.table_name)
+        _tier_lasts = [self.getSql("SELECT MAX(dateTime) FROM %s_tier_%s" % (self.table_name, _tier))[0]
+                       for _tier in self.tiers]
+        if None in _tier_lasts or self.first_timestamp is None:
+            return 0
+        cutoff_ts = min([cutoff_ts] + _tier_lasts)
+        if cutoff_ts < self.first_timestamp:
+            return 0
+        _count = self.getSql("SELECT COUNT(*) FROM %s WHERE dateTime <= ?" % self.table_name, (cutoff_ts,))[0]
+        with weedb.Transaction(self.connection) as _cursor:
+            _expired = [_suffix for _suffix in self.partitions[:-1] if _partition_span(_suffix).stop <= cutoff_ts]
+            if _expired:
+                self.partitions = [_suffix for _suffix in self.partitions if _suffix not in _expired]
+                self._create_partition_view(_cursor)
+                for _suffix in _expired:
+                    _cursor.execute("DROP TABLE %s_%s" % (self.table_name, _suffix))
+            for _table in self._tables():
+                _cursor.execute("DELETE FROM %s WHERE dateTime <= ?" % _table, (cutoff_ts,))
+        if _count:
+            syslog.syslog(syslog.LOG_INFO, "manager: Expired %d records of table '%s' in database '%s'" %
+                          (_count, self.table_name, self.database_name))
+        self._sync()
+        self._invalidate_aggregates()
+        return _count
+
+    # The tiers of downsampled records, finest first, and the length of their buckets:
+    tier_order   = ['hour', 'day']
+    tier_lengths = {'hour' : 3600, 'day' : 86400}
+    
+    # The statistics kept in a tier for each type, besides its value:
+    tier_stats = ['min', 'max', 'sum', 'count']
+
+    # How aggregates over spans of whole buckets are calculated from a tier:
+    tier_sql = {'sum'   : "SUM(`%(obs_type)s_sum`)",
+                'count' : "COALESCE(SUM(`%(obs_type)s_count`), 0)",
+                'avg'   : "SUM(`%(obs_type)s_sum`) / SUM(`%(obs_type)s_count`)",
+                'min'   : "MIN(`%(obs_type)s_min`)",
+                'max'   : "MAX(`%(obs_type)s_max`)"}
+
+    def _find_tiers(self, all_tables):
+        """Look for the tables of downsampled records. See add_tiers()."""
+        self.tiers = [_tier for _tier in Manager.tier_order if "%s_tier_%s" % (self.table_name, _tier) in all_tables]
+        self._tier_types = {}
+
+    def _tierTypesOf(self, tier):
+        """Returns the observation types kept in a tier."""
+        if tier not in self._tier_types:
+            self._tier_types[tier] = [_column[:-6] for _column in self.connection.columnsOf("%s_tier_%s" % (self.table_name, tier))
+                                      if _column.endswith('_count')]
+        return self._tier_types[tier]
+
+    def _tierFor(self, spans, sql_type, aggregate_type):
+        """Returns the coarsest tier from which an aggregate over a list of
+        contiguous spans can be calculated, along with the number of leading
+        spans it holds the records of. The boundaries of the spans must all
+        fall on boundaries of its buckets. Returns (None, 0) if there is no
+        such tier."""
+        if not self.tiers or not spans or aggregate_type.lower() not in Manager.tier_sql:
+            return (None, 0)
+        _stamps = [_span.start for _span in spans] + [spans[-1].stop]
+        for _tier in reversed(self.tiers):
+            if sql_type not in self._tierTypesOf(_tier) or \
+                    not all(_tier_span(_tier, _stamp).stop == _stamp for _stamp in _stamps):
+                continue
+            _tier_last = self.getSql("SELECT MAX(dateTime) FROM %s_tier_%s" % (self.table_name, _tier))[0]
+            if _tier_last is not None:
+                return (_tier, bisect.bisect_right(_stamps[1:], _tier_last))
+        return (None, 0)
+
     def _sync(self):
         """Resynch the internal caches."""
         # Fetch the first row in the database to determine the unit system in
         # use. If the database has never been used, then the unit system is
         # still indeterminate --- set it to 'None'.
+        _all_tables = self.connection.tables()
+        self._find_partitions(_all_tables)
+        self._find_tiers(_all_tables)
         _row = self.getSql("SELECT usUnits FROM %s LIMIT 1;" % self.table_name)
         self.std_unit_system = _row[0] if _row is not None else None
         
         # Cache the first and last timestamps
         self.first_timestamp = self.firstGoodStamp()
         self.last_timestamp  = self.lastGoodStamp()
+        self._record_cache.clear()
 
     def lastGoodStamp(self):
         """Retrieves the epoch time of the last good archive record.
         
         returns: Time of the last good archive record as an epoch time, or
         None if there are no records."""
-        _row = self.getSql("SELECT MAX(dateTime) FROM %s" % self.table_name)
-        return _row[0] if _row else None
+        # If partitioned, look in the newest table with something in it,
+        # rather than through all of them:
+        for _table in reversed(self._tables()):
+            _row = self.getSql("SELECT MAX(dateTime) FROM %s" % _table)
+            if _row and _row[0] is not None:
+                return _row[0]
+        return None
     
     def firstGoodStamp(self):
         """Retrieves earliest timestamp in the archive.
         
         returns: Time of the first good archive record as an epoch time, or
         None if there are no records."""
-        _row = self.getSql("SELECT MIN(dateTime) FROM %s" % self.table_name)
-        return _row[0] if _row else None
+        for _table in self._tables():
+            _row = self.getSql("SELECT MIN(dateTime) FROM %s" % _table)
+            if _row and _row[0] is not None:
+                return _row[0]
+        return None
 
-    def addRecord(self, record_obj, log_level=syslog.LOG_NOTICE):
+    # The largest number of records that will be inserted with a single executemany:
+    max_batch_size = 1000
+
+    def addRecord(self, record_obj, log_level=syslog.LOG_NOTICE, quiet=False):
         """Commit a single record or a collection of records to the archive.
         
         record_obj: Either a data record, or an iterable that can return data
@@ -218,6 +813,9 @@ class Manager(object):
         database.
         
         log_level: What syslog level to use for any logging. Default is syslog.LOG_NOTICE.
+        
+        quiet: If True, do not log each record as it is added. Instead, log a
+        summary when done. Useful for bulk loads. Default is False.
         """
         
         # Determine if record_obj is just a single dictionary instance
@@ -226,28 +824,140 @@ class Manager(object):
         record_list = [record_obj] if hasattr(record_obj, 'keys') else record_obj
         
         min_ts = None
-        max_ts = 0
-        with weedb.Transaction(self.connection) as cursor:
+        max_ts = None
+        nrecs = 0
+        try:
+            with weedb.Transaction(self.connection) as cursor:
+
+                # Records that share the same set of keys can be inserted together
+                for batch in self._genBatches(record_list):
+                    for record in self._addRecordBatch(batch, cursor, None if quiet else log_level):
+                        min_ts = min(min_ts, record['dateTime']) if min_ts is not None else record['dateTime']
+                        max_ts = max(max_ts, record['dateTime'])
+                        nrecs += 1
+        except Exception:
+            # Any tables of new periods were rolled back along with the
+            # transaction, so find out which ones are left:
+            if self.partition_period:
+                self._find_partitions()
+            raise
 
-            for record in record_list:
-                try:
-                    self._addSingleRecord(record, cursor, log_level)
-                    min_ts = min(min_ts, record['dateTime']) if min_ts is not None else record['dateTime']
-                    max_ts = max(max_ts, record['dateTime'])
-                except (weedb.IntegrityError, weedb.OperationalError), e:
-                    syslog.syslog(syslog.LOG_ERR, "manager: unable to add record %s to database '%s': %s" %
-                                  (weeutil.weeutil.timestamp_to_string(record['dateTime']), 
-                                   self.database_name,
-                                   e))
+        if quiet and nrecs:
+            syslog.syslog(log_level, "manager: added %d records from %s to %s to database '%s'" %
+                          (nrecs, weeutil.weeutil.timestamp_to_string(min_ts),
+                           weeutil.weeutil.timestamp_to_string(max_ts), self.database_name))
 
         # Update the cached timestamps. This has to sit outside the
         # transaction context, in case an exception occurs.
-        self.first_timestamp = min(min_ts, self.first_timestamp)
-        self.last_timestamp  = max(max_ts, self.last_timestamp)
+        self.first_timestamp = weeutil.weeutil.min_with_none((min_ts, self.first_timestamp))
+        self.last_timestamp  = weeutil.weeutil.max_with_none((max_ts, self.last_timestamp))
+        self._record_cache.clear()
+        self._invalidate_aggregates()
+        
+    def _genBatches(self, record_list):
+        """Generator function that breaks a sequence of records into batches
+        of consecutive records that will insert the same set of keys.
+        
+        yields: A 2-way tuple (key_list, batch). The key_list is the list of
+        keys to be inserted, the batch a list of records."""
+        
+        _key_list = None
+        _batch = []
+        for record in record_list:
+            # Only data types that appear in the database schema can be
+            # inserted. To find them, form the intersection between the
+            # set of all record keys and the set of all sql keys
+            _keys = [k for k in self.sqlkeys if k in record]
+            if _batch and (_keys != _key_list or len(_batch) >= Manager.max_batch_size):
+                yield (_key_list, _batch)
+                _batch = []
+            _key_list = _keys
+            _batch.append(record)
+        if _batch:
+            yield (_key_list, _batch)
+
+    def _addRecordBatch(self, key_batch, cursor, log_level):
+        """Internal function for adding a batch of records that share the same
+        set of keys. 
+        
+        A batch holding more than one record is inserted with a single call
+        to executemany. If that fails (for example, because one of the records
+        is a duplicate), the batch is rolled back and the records added one at
+        a time, so the offending records can be identified and skipped.
+        
+        key_batch: A 2-way tuple (key_list, batch), as returned by _genBatches.
+
+        log_level: What syslog level to use for logging each record, or None
+        to log nothing.
+
+        returns: A list of the records that were successfully added."""
+        
+        key_list, batch = key_batch
+        
+        self._add_partitions(batch, cursor)
+
+        if len(batch) > 1:
+            cursor.execute("SAVEPOINT weewx_batch")
+            try:
+                self._insertBatch(key_list, batch, cursor, log_level)
+            except (weedb.IntegrityError, weedb.OperationalError):
+                # Undo any partial work, then fall through to the one-at-a-time path
+                cursor.execute("ROLLBACK TO SAVEPOINT weewx_batch")
+                cursor.execute("RELEASE SAVEPOINT weewx_batch")
+            else:
+                cursor.execute("RELEASE SAVEPOINT weewx_batch")
+                return batch
         
+        added = []
+        for record in batch:
+            try:
+                self._addSingleRecord(record, cursor, log_level)
+                added.append(record)
+            except (weedb.IntegrityError, weedb.OperationalError), e:
+                syslog.syslog(syslog.LOG_ERR, "manager: unable to add record %s to database '%s': %s" %
+                              (weeutil.weeutil.timestamp_to_string(record['dateTime']), 
+                               self.database_name,
+                               e))
+        return added
+
+    def _insertBatch(self, key_list, batch, cursor, log_level):
+        """Internal function for inserting a batch of records with a single
+        call to executemany. Subclasses can specialize it to do any additional
+        processing of the records."""
+
+        for record in batch:
+            self._check_record(record)
+
+        # If the archive is partitioned, the batch may fall in more than one period:
+        for (_table, _records) in itertools.groupby(batch, lambda record: self._insertTableOf(record['dateTime'])):
+            cursor.executemany(self._get_insert_stmt(key_list, _table), [[record[k] for k in key_list] for record in _records])
+
+        if log_level is not None:
+            for record in batch:
+                syslog.syslog(log_level, "manager: added record %s to database '%s'" % 
+                              (weeutil.weeutil.timestamp_to_string(record['dateTime']),
+                               self.database_name))
+
     def _addSingleRecord(self, record, cursor, log_level):
         """Internal function for adding a single record to the database."""
         
+        self._check_record(record)
+
+        # Only data types that appear in the database schema can be
+        # inserted. Get them in the same order as the schema:
+        key_list = [k for k in self.sqlkeys if k in record]
+        # Get the values in the same order:
+        value_list = [record[k] for k in key_list]
+        
+        cursor.execute(self._get_insert_stmt(key_list, self._insertTableOf(record['dateTime'])), value_list)
+        if log_level is not None:
+            syslog.syslog(log_level, "manager: added record %s to database '%s'" % 
+                          (weeutil.weeutil.timestamp_to_string(record['dateTime']),
+                           self.database_name))
+
+    def _check_record(self, record):
+        """Check that a record can be added to the database."""
+
         if record['dateTime'] is None:
             syslog.syslog(syslog.LOG_ERR, "manager: archive record with null time encountered")
             raise weewx.ViolatedPrecondition("Manager record with null time encountered.")
@@ -256,16 +966,15 @@ class Manager(object):
         # system as the records already in the database:
         self._check_unit_system(record['usUnits'])
 
-        # Only data types that appear in the database schema can be
-        # inserted. To find them, form the intersection between the
-        # set of all record keys and the set of all sql keys
-        record_key_set = set(record.keys())
-        insert_key_set = record_key_set.intersection(self.sqlkeys)
-        # Convert to an ordered list:
-        key_list = list(insert_key_set)
-        # Get the values in the same order:
-        value_list = [record[k] for k in key_list]
-        
+    def _get_insert_stmt(self, key_list, table_name):
+        """Return the SQL insert statement for a list of keys into a table.
+        The statements are cached, so they need only be formed once."""
+
+        key_tuple = (table_name,) + tuple(key_list)
+        try:
+            return self._insert_stmts[key_tuple]
+        except KeyError:
+            pass
         # This will a string of sql types, separated by commas. Because
         # some of the weewx sql keys (notably 'interval') are reserved
         # words in MySQL, put them in backquotes.
@@ -274,11 +983,8 @@ class Manager(object):
         # question marks:
         q_str = ','.join('?' * len(key_list))
         # Form the SQL insert statement:
-        sql_insert_stmt = "INSERT INTO %s (%s) VALUES (%s)" % (self.table_name, k_str, q_str) 
-        cursor.execute(sql_insert_stmt, value_list)
-        syslog.syslog(log_level, "manager: added record %s to database '%s'" % 
-                      (weeutil.weeutil.timestamp_to_string(record['dateTime']),
-                       self.database_name))
+        self._insert_stmts[key_tuple] = "INSERT INTO %s (%s) VALUES (%s)" % (table_name, k_str, q_str)
+        return self._insert_stmts[key_tuple]
 
     def genBatchRows(self, startstamp=None, stopstamp=None):
         """Generator function that yields raw rows from the archive database
@@ -292,28 +998,39 @@ class Manager(object):
         
         yields: A list with the data records"""
 
-        _cursor = self.connection.cursor()
-        try:
-            if startstamp is None:
-                if stopstamp is None:
-                    _gen = _cursor.execute("SELECT * FROM %s ORDER BY dateTime ASC" % self.table_name)
-                else:
-                    _gen = _cursor.execute("SELECT * FROM %s WHERE dateTime <= ? ORDER BY dateTime ASC" % self.table_name, (stopstamp,))
+        if startstamp is None:
+            if stopstamp is None:
+                (_where, _args) = ("", ())
             else:
-                if stopstamp is None:
-                    _gen = _cursor.execute("SELECT * FROM %s WHERE dateTime > ? ORDER BY dateTime ASC" % self.table_name, (startstamp,))
-                else:
-                    _gen = _cursor.execute("SELECT * FROM %s WHERE dateTime > ? AND dateTime <= ? ORDER BY dateTime ASC" % self.table_name,
-                                            (startstamp, stopstamp))
-               
+                (_where, _args) = ("WHERE dateTime <= ?", (stopstamp,))
+        else:
+            if stopstamp is None:
+                (_where, _args) = ("WHERE dateTime > ?", (startstamp,))
+            else:
+                (_where, _args) = ("WHERE dateTime > ? AND dateTime <= ?", (startstamp, stopstamp))
+
+        # If the archive is partitioned, read the tables of the periods in the
+        # interval one after the other:
+        if self.partition_period:
+            _first = _partition_of(startstamp + 1, self.partition_period) if startstamp is not None else None
+            _last  = _partition_of(stopstamp, self.partition_period) if stopstamp is not None else None
+            _tables = ["%s_%s" % (self.table_name, _suffix) for _suffix in self.partitions
+                       if (_first is None or _suffix >= _first) and (_last is None or _suffix <= _last)]
+        else:
+            _tables = [self.table_name]
+
+        # The whole archive may be asked for, so read it as it is needed:
+        _cursor = self.connection.streaming_cursor()
+        try:
             _last_time = 0
-            for _row in _gen:
-                # The following is to get around a bug in sqlite when all the
-                # tables are in one file:
-                if _row[0] <= _last_time:
-                    continue
-                _last_time = _row[0]
-                yield _row
+            for _table in _tables:
+                for _row in _cursor.execute("SELECT * FROM %s %s ORDER BY dateTime ASC" % (_table, _where), _args):
+                    # The following is to get around a bug in sqlite when all the
+                    # tables are in one file:
+                    if _row[0] <= _last_time:
+                        continue
+                    _last_time = _row[0]
+                    yield _row
         finally:
             _cursor.close()
 
@@ -343,26 +1060,71 @@ class Manager(object):
         
         returns: a record dictionary or None if the record does not exist."""
 
-        _cursor = self.connection.cursor()
+        # Tags such as $current and $trend ask for the same few records over
+        # and over again. Look in the cache first, unless the table has grown
+        # since it was filled:
+        if self._record_cache_stamp != self.last_timestamp:
+            self._record_cache.clear()
+            self._record_cache_stamp = self.last_timestamp
+        _key = (timestamp, max_delta)
         try:
-            if max_delta:
-                time_start_ts = timestamp - max_delta
-                time_stop_ts  = timestamp + max_delta
-                _cursor.execute("SELECT * FROM %s WHERE dateTime>=? AND dateTime<=? "\
-                                "ORDER BY ABS(dateTime-?) ASC LIMIT 1" % self.table_name,
-                                (time_start_ts, time_stop_ts, timestamp))
+            _row = self._record_cache.pop(_key)
+        except KeyError:
+            _row = self._getRow(timestamp, max_delta)
+            if _row is None:
+                return None
+        # Put it back in, as the most recently used:
+        self._record_cache[_key] = _row
+        if len(self._record_cache) > Manager.record_cache_size:
+            self._record_cache.popitem(last=False)
+        return dict(zip(self.sqlkeys, _row))
+
+    # The largest number of records kept by getRecord():
+    record_cache_size = 50
+
+    def _getRow(self, timestamp, max_delta):
+        """Returns the row nearest in time to a timestamp, within max_delta,
+        or None if there is none."""
+        # The records just archived by this process may still be held in a
+        # ring buffer:
+        _recent = weewx.recent.get_recent_records(self.table_key)
+        if _recent is not None:
+            try:
+                _record = _recent.getRecord(timestamp, max_delta)
+            except weewx.recent.NotHeld:
+                pass
             else:
-                _cursor.execute("SELECT * FROM %s WHERE dateTime=?" % self.table_name, (timestamp,))
-            _row = _cursor.fetchone()
-            return dict(zip(self.sqlkeys, _row)) if _row else None
+                return tuple(_record.get(_key) for _key in self.sqlkeys) if _record is not None else None
+        _table = self._tableOf(timestamp - (max_delta or 0) - 1, timestamp + (max_delta or 0))
+        _cursor = self.connection.cursor()
+        try:
+            _cursor.execute("SELECT * FROM %s WHERE dateTime<=? AND dateTime>=? "
+                            "ORDER BY dateTime DESC LIMIT 1" % _table,
+                            (timestamp, timestamp - (max_delta or 0)))
+            _before = _cursor.fetchone()
+            if not max_delta or (_before and _before[self.sqlkeys.index('dateTime')] == timestamp):
+                return _before
+            # Each probe is a seek on the primary key, then a single step:
+            _cursor.execute("SELECT * FROM %s WHERE dateTime>? AND dateTime<=? "
+                            "ORDER BY dateTime ASC LIMIT 1" % _table,
+                            (timestamp, timestamp + max_delta))
+            _after = _cursor.fetchone()
         finally:
             _cursor.close()
+        _i = self.sqlkeys.index('dateTime')
+        if _before is None or (_after is not None and _after[_i] - timestamp < timestamp - _before[_i]):
+            return _after
+        return _before
 
     def updateValue(self, timestamp, obs_type, new_value):
         """Update (replace) a single value in the database."""
         
         self.connection.execute("UPDATE %s SET %s=? WHERE dateTime=?" % 
-                                (self.table_name, obs_type), (new_value, timestamp))
+                                (self._tableOf(timestamp - 1, timestamp), obs_type), (new_value, timestamp))
+        self._record_cache.clear()
+        _recent = weewx.recent.get_recent_records(self.table_key)
+        if _recent is not None:
+            _recent.updateValue(timestamp, obs_type, new_value)
 
     def getSql(self, sql, sqlargs=()):
         """Executes an arbitrary SQL statement on the database.
@@ -384,30 +1146,46 @@ class Manager(object):
         """Generator function that executes an arbitrary SQL statement on
         the database."""
         
-        _cursor = self.connection.cursor()
+        _cursor = self.connection.streaming_cursor()
         try:
             for _row in _cursor.execute(sql, sqlargs):
                 yield _row
         finally:
             _cursor.close()
             
-    sql_dict = {'mintime' : "SELECT dateTime FROM %(table_name)s "\
-                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND "\
-                              "%(obs_type)s = (SELECT MIN(%(obs_type)s) FROM %(table_name)s "\
-                              "WHERE dateTime > %(start)s and dateTime <= %(stop)s) AND %(obs_type)s IS NOT NULL",
-                'maxtime' : "SELECT dateTime FROM %(table_name)s "\
-                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND "\
-                              "%(obs_type)s = (SELECT MAX(%(obs_type)s) FROM %(table_name)s "\
-                              "WHERE dateTime > %(start)s and dateTime <= %(stop)s) AND %(obs_type)s IS NOT NULL",
-                'last'    : "SELECT %(obs_type)s FROM %(table_name)s "\
-                              "WHERE dateTime = (SELECT MAX(dateTime) FROM %(table_name)s "\
-                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s  AND %(obs_type)s IS NOT NULL)",
-                'lasttime': "SELECT MAX(dateTime) FROM %(table_name)s "\
-                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s  AND %(obs_type)s IS NOT NULL"}
+    # Each of these steps through the records in order, stopping at the first
+    # one, so an index on (obs_type, dateTime) can be used if there is one.
+    # The second column holds the partner of the aggregation type (see
+    # partner_types).
+    sql_dict = {'min'     : "SELECT %(obs_type)s, dateTime FROM %(table_name)s "\
+                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND %(obs_type)s IS NOT NULL "\
+                              "ORDER BY %(obs_type)s ASC, dateTime ASC LIMIT 1",
+                'mintime' : "SELECT dateTime, %(obs_type)s FROM %(table_name)s "\
+                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND %(obs_type)s IS NOT NULL "\
+                              "ORDER BY %(obs_type)s ASC, dateTime ASC LIMIT 1",
+                'max'     : "SELECT %(obs_type)s, dateTime FROM %(table_name)s "\
+                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND %(obs_type)s IS NOT NULL "\
+                              "ORDER BY %(obs_type)s DESC, dateTime ASC LIMIT 1",
+                'maxtime' : "SELECT dateTime, %(obs_type)s FROM %(table_name)s "\
+                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND %(obs_type)s IS NOT NULL "\
+                              "ORDER BY %(obs_type)s DESC, dateTime ASC LIMIT 1",
+                'last'    : "SELECT %(obs_type)s, dateTime FROM %(table_name)s "\
+                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND %(obs_type)s IS NOT NULL "\
+                              "ORDER BY dateTime DESC LIMIT 1",
+                'lasttime': "SELECT dateTime, %(obs_type)s FROM %(table_name)s "\
+                              "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND %(obs_type)s IS NOT NULL "\
+                              "ORDER BY dateTime DESC LIMIT 1"}
+
+    # Aggregation types that are found together, a value and its time, by a
+    # single query. Each maps to its partner:
+    partner_types = {'min' : 'mintime', 'mintime' : 'min',
+                     'max' : 'maxtime', 'maxtime' : 'max',
+                     'last': 'lasttime', 'lasttime': 'last'}
                             
     simple_sql = "SELECT %(aggregate_type)s(%(obs_type)s) FROM %(table_name)s "\
                    "WHERE dateTime > %(start)s AND dateTime <= %(stop)s AND %(obs_type)s IS NOT NULL"
                    
+    @cache_aggregates
     def getAggregate(self, timespan, obs_type,
                      aggregate_type, **option_dict):
         """Returns an aggregation of a statistical type for a given time period.
@@ -433,22 +1211,117 @@ class Manager(object):
         
         interpolate_dict = {'aggregate_type' : aggregate_type,
                             'obs_type'       : obs_type,
-                            'table_name'     : self.table_name,
+                            'table_name'     : self._tableOf(timespan.start, timespan.stop),
                             'start'          : timespan.start,
                             'stop'           : timespan.stop}
         
         select_stmt = Manager.sql_dict.get(aggregate_type, Manager.simple_sql)
             
+        _start = time.time()
         _row = self.getSql(select_stmt % interpolate_dict)
+        _record_scan(self, obs_type, time.time() - _start)
 
         _result = _row[0] if _row else None
+        if aggregate_type in Manager.partner_types:
+            self._cachePartner(timespan, obs_type, aggregate_type, _row[1] if _row else None, option_dict)
         
         # Look up the unit type and group of this combination of observation type and aggregation:
         (t, g) = weewx.units.getStandardUnitType(self.std_unit_system, obs_type, aggregate_type)
         # Form the value tuple and return it:
         return weewx.units.ValueTuple(_result, t, g)
-    
-    def getSqlVectors(self, timespan, obs_type, 
+
+    def _cachePartner(self, timespan, obs_type, aggregate_type, value, option_dict):
+        """A query for one of a pair of aggregation types, such as min and
+        mintime, finds the other as well. Put it in the aggregate cache, as
+        though getAggregate() had been asked for it, so that asking for it
+        does not cost another query."""
+        if self.aggregate_cache is None:
+            return
+        _partner = Manager.partner_types[aggregate_type]
+        if value is not None and _partner.endswith('time'):
+            value = int(value)
+        (t, g) = weewx.units.getStandardUnitType(self.std_unit_system, obs_type, _partner)
+        (_key, _pinned) = _aggregate_key(self, 'getAggregate', (timespan, obs_type, _partner), option_dict)
+        self.aggregate_cache.put(_key, weewx.units.ValueTuple(value, t, g), _pinned)
+
+    # Aggregation types that can be derived from a single summary of the
+    # statistics over a timespan. See getAggregates().
+    summary_types = ['min', 'mintime', 'max', 'maxtime', 'sum', 'count', 'avg']
+
+    # Returns the summary of the archive table over a timespan. Its row looks
+    # like a stats-tuple (see weewx.accum), less wsum and sumtime.
+    summary_sql = "SELECT MIN(%(obs_type)s), "\
+                  "(SELECT dateTime FROM %(table_name)s WHERE dateTime > %(start)s AND dateTime <= %(stop)s "\
+                  "AND %(obs_type)s IS NOT NULL ORDER BY %(obs_type)s ASC, dateTime ASC LIMIT 1), "\
+                  "MAX(%(obs_type)s), "\
+                  "(SELECT dateTime FROM %(table_name)s WHERE dateTime > %(start)s AND dateTime <= %(stop)s "\
+                  "AND %(obs_type)s IS NOT NULL ORDER BY %(obs_type)s DESC, dateTime ASC LIMIT 1), "\
+                  "SUM(%(obs_type)s), COUNT(%(obs_type)s) "\
+                  "FROM %(table_name)s WHERE dateTime > %(start)s AND dateTime <= %(stop)s"
+
+    @cache_aggregates
+    def getAggregates(self, timespan, obs_type, aggregate_types=None, **option_dict):
+        """Returns several aggregations of a statistical type for a given time period.
+
+        Aggregation types that can be derived from a summary of the time period
+        (see summary_types) are all calculated from a single query. Any others
+        are calculated one at a time by getAggregate().
+
+        timespan: An instance of weeutil.Timespan with the time period over which
+        aggregation is to be done.
+
+        obs_type: The type over which aggregation is to be done (e.g., 'barometer',
+        'outTemp', 'rain', ...)
+
+        aggregate_types: A list of the types of aggregation to be done. If None,
+        then all the types in summary_types, provided they can be calculated
+        from a summary for this observation type. Otherwise, none.
+
+        option_dict: Passed on to getAggregate().
+
+        returns: A dictionary. The key is the aggregation type, the value a
+        value tuple, as would be returned by getAggregate()."""
+
+        _wanted = Manager.summary_types if aggregate_types is None else aggregate_types
+
+        # Only get the summary if it will be used:
+        _stats = self._getSummaryStats(timespan, obs_type) \
+            if any(_agg in Manager.summary_types for _agg in _wanted) else None
+        if _stats is None and aggregate_types is None:
+            return {}
+
+        _results = {}
+        for _agg in _wanted:
+            if _stats is not None and _agg in Manager.summary_types:
+                # Look up the unit type and group of this combination of observation type and aggregation:
+                (t, g) = weewx.units.getStandardUnitType(self.std_unit_system, obs_type, _agg)
+                _results[_agg] = weewx.units.ValueTuple(_summary_value(_stats, _agg), t, g)
+            else:
+                _results[_agg] = self.getAggregate(timespan, obs_type, _agg, **option_dict)
+        return _results
+
+    def _getSummaryStats(self, timespan, obs_type):
+        """Get the statistics of an observation type over a time period in a
+        single query.
+
+        returns: A stats-tuple (min, mintime, max, maxtime, sum, count, wsum,
+        sumtime), or None if the observation type cannot be summarized."""
+
+        if obs_type not in self.sqlkeys:
+            return None
+
+        interpolate_dict = {'obs_type'   : obs_type,
+                            'table_name' : self._tableOf(timespan.start, timespan.stop),
+                            'start'      : timespan.start,
+                            'stop'       : timespan.stop}
+        _start = time.time()
+        _row = self.getSql(Manager.summary_sql % interpolate_dict)
+        _record_scan(self, obs_type, time.time() - _start)
+        # Each record carries a weight of one:
+        return tuple(_row) + (_row[4], _row[5])
+
+    @cache_aggregates
+    def getSqlVectors(self, timespan, obs_type,
                       aggregate_type=None,
                       aggregate_interval=None): 
         """Get time and (possibly aggregated) data vectors within a time
@@ -519,21 +1392,39 @@ class Manager(object):
                 # in the SQL statement. We'll have to do it in Python.
                 # Do we know how to do it?
                 if aggregate_type not in ['sum', 'count', 'avg', 'max', 'min']:
-                    raise weewx.ViolatedPrecondition("Invalid aggregation type" % aggregate_type)
+                    raise weewx.ViolatedPrecondition("Invalid aggregation type %s" % aggregate_type)
                 
                 # This SQL select string will select the proper wind types
-                sql_str = 'SELECT dateTime, %s, usUnits FROM %s WHERE dateTime > ? AND dateTime <= ?' % \
-                    (windvec_types[obs_type], self.table_name)
+                sql_str = 'SELECT dateTime, %s, usUnits FROM %s WHERE dateTime > ? AND dateTime <= ? '\
+                    'ORDER BY dateTime ASC' % (windvec_types[obs_type], self._tableOf(timespan[0], timespan[1]))
+
+                _spans = list(weeutil.weeutil.intervalgen(timespan[0], timespan[1], aggregate_interval))
+                _stops = [stamp.stop for stamp in _spans]
+
+                # Rather than query each aggregation interval separately, read the
+                # whole timespan in one pass. Because the rows come back ordered by
+                # time, they can be grouped by interval as they stream by. The
+                # interval holding a row is the first one that stops at or after it.
+                _gen = _cursor.execute(sql_str, (_spans[0].start, _spans[-1].stop)) if _spans else []
+
+                # Wind directions tend to repeat, so cache the x- and y-components
+                # of a unit vector in each direction:
+                _unit_vecs = {}
 
                 # Go through each aggregation interval, calculating the aggregation.
-                for stamp in weeutil.weeutil.intervalgen(timespan[0], timespan[1], aggregate_interval):
-    
+                for (_ispan, _recs) in itertools.groupby(_gen, lambda _rec: bisect.bisect_left(_stops, _rec[0])):
+
+                    stamp = _spans[_ispan]
                     _mag_extreme = _dir_at_extreme = None
                     _xsum = _ysum = 0.0
                     _count = 0
                     _last_time = None
     
-                    for _rec in _cursor.execute(sql_str, stamp):
+                    for _rec in _recs:
+                        # Intervalgen can skip an ambiguous interval at the end of
+                        # DST. Ignore any rows that fall in the gap.
+                        if _rec[0] <= stamp[0]:
+                            continue
                         (_mag, _dir) = _rec[1:3]
     
                         if _mag is None:
@@ -563,8 +1454,11 @@ class Manager(object):
                                 # No need to do the arithmetic if mag is zero.
                                 # We also need a good direction
                                 if _mag > 0.0 and _dir is not None:
-                                    _xsum += _mag * math.cos(math.radians(90.0 - _dir))
-                                    _ysum += _mag * math.sin(math.radians(90.0 - _dir))
+                                    if _dir not in _unit_vecs:
+                                        _unit_vecs[_dir] = (math.cos(math.radians(90.0 - _dir)),
+                                                            math.sin(math.radians(90.0 - _dir)))
+                                    _xsum += _mag * _unit_vecs[_dir][0]
+                                    _ysum += _mag * _unit_vecs[_dir][1]
                     # We've gone through the whole interval. Were there any
                     # good data?
                     if _count:
@@ -596,7 +1490,7 @@ class Manager(object):
                 # data in the requested time period
                 # This SQL select string will select the proper wind types
                 sql_str = 'SELECT dateTime, %s, usUnits, `interval` FROM %s WHERE dateTime >= ? AND dateTime <= ?' % \
-                        (windvec_types[obs_type], self.table_name)
+                        (windvec_types[obs_type], self._tableOf(timespan[0] - 1, timespan[1]))
                 
                 for _rec in _cursor.execute(sql_str, timespan):
                     start_vec.append(_rec[0] - _rec[4])
@@ -629,6 +1523,11 @@ class Manager(object):
                 weewx.units.ValueTuple(stop_vec, time_type, time_group),
                 weewx.units.ValueTuple(data_vec, data_type, data_group))
 
+    def _invalidate_aggregates(self):
+        """Forget any cached aggregates from my table. They are out of date."""
+        if self.aggregate_cache is not None:
+            self.aggregate_cache.invalidate(self.table_key)
+
     def _check_unit_system(self, unit_system):
         """ Check to make sure a unit system is the same as what's already in use in the database."""
 
@@ -709,18 +1608,13 @@ class Manager(object):
                 if not aggregate_interval:
                     raise weewx.ViolatedPrecondition("Aggregation interval missing")
 
-                if aggregate_type.lower() == 'last':
-                    sql_str = "SELECT %s, MIN(usUnits), MAX(usUnits) FROM %s WHERE dateTime = "\
-                        "(SELECT MAX(dateTime) FROM %s WHERE "\
-                        "dateTime > ? AND dateTime <= ? AND %s IS NOT NULL)" % (sql_type, self.table_name, 
-                                                                                self.table_name, sql_type)
-                else:
-                    sql_str = "SELECT %s(%s), MIN(usUnits), MAX(usUnits) FROM %s "\
-                        "WHERE dateTime > ? AND dateTime <= ?" % (aggregate_type, sql_type, self.table_name)
+                _spans = list(weeutil.weeutil.intervalgen(startstamp, stopstamp, aggregate_interval))
 
-                for stamp in weeutil.weeutil.intervalgen(startstamp, stopstamp, aggregate_interval):
-                    _cursor.execute(sql_str, stamp)
-                    _rec = _cursor.fetchone()
+                # Use the coarsest tier of downsampled records that holds the
+                # spans, and the archive for any later ones:
+                (_tier, _ntier) = self._tierFor(_spans, sql_type, aggregate_type)
+                for (stamp, _rec) in itertools.chain(self._genTierAggregates(_tier, _spans[:_ntier], sql_type, aggregate_type, _cursor),
+                                                     self._genGroupedAggregates(_spans[_ntier:], sql_type, aggregate_type, _cursor)):
                     # Don't accumulate any results where there wasn't a record
                     # (signified by a null result)
                     if _rec and _rec[0] is not None:
@@ -737,7 +1631,7 @@ class Manager(object):
             else:
                 # No aggregation
                 sql_str = "SELECT dateTime, %s, usUnits, `interval` FROM %s "\
-                            "WHERE dateTime >= ? AND dateTime <= ?" % (sql_type, self.table_name)
+                            "WHERE dateTime >= ? AND dateTime <= ?" % (sql_type, self._tableOf(startstamp - 1, stopstamp))
                 for _rec in _cursor.execute(sql_str, (startstamp, stopstamp)):
                     start_vec.append(_rec[0] - _rec[3])
                     stop_vec.append(_rec[0])
@@ -757,6 +1651,114 @@ class Manager(object):
                 ValueTuple(stop_vec, time_type, time_group), 
                 ValueTuple(data_vec, data_type, data_group))
 
+    # Database types for which aggregates over many intervals are calculated
+    # with a single GROUP BY query. Sqlite has no round trip to amortize, and
+    # one indexed query per interval is faster than sorting for the GROUP BY.
+    grouped_dbtypes = ['mysql']
+
+    # The maximum number of runs of equal length intervals that will be folded
+    # into the bucket expression of a single grouped query:
+    max_runs_per_query = 32
+
+    grouped_sql = "SELECT %(bucket)s AS bucket, %(aggregate_type)s(%(obs_type)s), MIN(usUnits), MAX(usUnits) "\
+                    "FROM %(table_name)s WHERE dateTime > ? AND dateTime <= ? GROUP BY bucket"
+
+    grouped_last_sql = "SELECT %(bucket)s AS bucket, a.%(obs_type)s, a.usUnits, a.usUnits FROM %(table_name)s AS a "\
+                         "JOIN (SELECT MAX(dateTime) AS lasttime FROM %(table_name)s "\
+                         "WHERE dateTime > ? AND dateTime <= ? AND %(obs_type)s IS NOT NULL GROUP BY %(bucket)s) AS b "\
+                         "ON a.dateTime = b.lasttime"
+
+    def _genGroupedAggregates(self, spans, sql_type, aggregate_type, cursor):
+        """Generator function that calculates an aggregate over a sequence of
+        contiguous time spans, using as few queries as possible.
+
+        Rather than issuing one query per time span, consecutive spans of equal
+        length are collected into "runs." Within a run, the span holding a
+        given timestamp can be calculated with integer arithmetic, so an
+        expression giving the start of the span can be used in a GROUP BY
+        clause. Runs are broken wherever the length of the spans changes
+        (for example, at a DST transition, or between months of different
+        lengths), so the buckets are exactly those given by
+        weeutil.weeutil.intervalgen().
+
+        spans: A list of contiguous TimeSpans, in increasing order.
+
+        sql_type: The observation type to be aggregated.
+
+        aggregate_type: The type of aggregation to be done.
+
+        cursor: A cursor to be used for the queries.
+
+        yields: A 2-way tuple (span, row) for each span in spans. The row is a
+        3-way tuple (aggregate value, minimum usUnits, maximum usUnits),
+        exactly as it would have been returned by running the aggregation on
+        the span alone."""
+
+        # Empty spans return None for every aggregate, except for 'count'
+        _empty = (0, None, None) if aggregate_type.lower() == 'count' else (None, None, None)
+
+        # The bucket arithmetic requires integer boundaries. If that's not the
+        # case, or if the database does not benefit, fall back to one query per span.
+        if self.connection.dbtype not in Manager.grouped_dbtypes or \
+                not all(int(span.start) == span.start and int(span.stop) == span.stop for span in spans):
+            for span in spans:
+                yield (span, self._getSpanAggregate(span, sql_type, aggregate_type, cursor) or _empty)
+            return
+
+        _runs = list(_genIntervalRuns(spans))
+        for i in range(0, len(_runs), Manager.max_runs_per_query):
+            _chunk = _runs[i:i + Manager.max_runs_per_query]
+            # Form a bucket expression that evaluates to the start of the span
+            # holding the timestamp:
+            _bucket = "CASE %s END" % ' '.join(["WHEN dateTime <= %d THEN dateTime - 1 - ((dateTime - %d) %% %d)" %
+                                                (run_spans[-1].stop, origin + 1, length)
+                                                for (origin, length, run_spans) in _chunk])
+            interpolate_dict = {'aggregate_type' : aggregate_type,
+                                'obs_type'       : sql_type,
+                                'table_name'     : self._tableOf(_chunk[0][0], _chunk[-1][2][-1].stop),
+                                'bucket'         : _bucket}
+
+            if aggregate_type.lower() == 'last':
+                sql_str = Manager.grouped_last_sql % interpolate_dict
+            else:
+                sql_str = Manager.grouped_sql % interpolate_dict
+
+            _results = {}
+            for _rec in cursor.execute(sql_str, (_chunk[0][0], _chunk[-1][2][-1].stop)):
+                _results[_rec[0]] = _rec[1:]
+
+            for (origin, length, run_spans) in _chunk:
+                for span in run_spans:
+                    yield (span, _results.get(int(span.start), _empty))
+
+    def _genTierAggregates(self, tier, spans, sql_type, aggregate_type, cursor):
+        """Generator function that calculates an aggregate over a sequence of
+        spans from a tier of downsampled records. See _tierFor(). Yields a
+        2-way tuple (span, row), as _genGroupedAggregates() does."""
+        if not spans:
+            return
+        sql_str = "SELECT %s, MIN(usUnits), MAX(usUnits) FROM %s_tier_%s WHERE dateTime > ? AND dateTime <= ?" % \
+            (Manager.tier_sql[aggregate_type.lower()] % {'obs_type' : sql_type}, self.table_name, tier)
+        for span in spans:
+            cursor.execute(sql_str, span)
+            yield (span, cursor.fetchone())
+
+    def _getSpanAggregate(self, span, sql_type, aggregate_type, cursor):
+        """Calculate an aggregate over a single span. Returns a 3-way tuple
+        (aggregate value, minimum usUnits, maximum usUnits)."""
+
+        _table = self._tableOf(span[0], span[1])
+        if aggregate_type.lower() == 'last':
+            sql_str = "SELECT %s, MIN(usUnits), MAX(usUnits) FROM %s WHERE dateTime = "\
+                "(SELECT MAX(dateTime) FROM %s WHERE "\
+                "dateTime > ? AND dateTime <= ? AND %s IS NOT NULL)" % (sql_type, _table,
+                                                                        _table, sql_type)
+        else:
+            sql_str = "SELECT %s(%s), MIN(usUnits), MAX(usUnits) FROM %s "\
+                "WHERE dateTime > ? AND dateTime <= ?" % (aggregate_type, sql_type, _table)
+        cursor.execute(sql_str, span)
+        return cursor.fetchone()
+
 
 def reconfig(old_db_dict, new_db_dict, new_unit_system=None, new_schema=None):
     """Copy over an old archive to a new one, using a provided schema."""
@@ -771,8 +1773,8 @@ def reconfig(old_db_dict, new_db_dict, new_unit_system=None, new_schema=None):
             record_generator = weewx.units.GenWithConvert(old_archive.genBatchRecords(), new_unit_system)
         
             # This is very fast because it is done in a single transaction
-            # context:
-            new_archive.addRecord(record_generator)
+            # context, in batches:
+            new_archive.addRecord(record_generator, quiet=True)
 
 #===============================================================================
 #                    Class DBBinder
@@ -780,9 +1782,12 @@ def reconfig(old_db_dict, new_db_dict, new_unit_system=None, new_schema=None):
 
 class DBBinder(object):
     """Given a binding name, it returns the matching database as a managed object. Caches
-    results."""
+    results.
+    
+    If there is a ManagerPool, the managers are checked out of it, and handed
+    back when the DBBinder is closed."""
 
-    def __init__(self, bindings_dict, databases_dict):
+    def __init__(self, bindings_dict, databases_dict, pool=None, read_only=False):
         """ Initialize a DBBinder object.
         
         bindings_dict: Typically, this is [DataBindings] section of a
@@ -796,17 +1801,31 @@ class DBBinder(object):
         It should look something like:
           {'archive_sqlite' : {'root': '/home/weewx',
                                'database_name': 'archive/archive.sdb',
-                               'driver': 'weedb.sqlite'}"""
+                               'driver': 'weedb.sqlite'}
+
+        pool: An instance of ManagerPool to check the managers out of. Default
+        is the pool set with set_manager_pool(), if any.
+        
+        read_only: True if the managers will only be used to read. See
+        open_manager(). Default is False."""
            
         self.bindings_dict = bindings_dict
         self.databases_dict = databases_dict
         self.default_binding_dict = {}
         self.manager_cache = {}
+        self.aggregate_cache = None
+        # The key of each binding's table in the registry of ArchiveWriters:
+        self.writer_keys = {}
+        self.pool = pool if pool is not None else _manager_pool
+        self.read_only = read_only
     
     def close(self):
         for data_binding in self.manager_cache.keys():
             try:
-                self.manager_cache[data_binding].close()
+                if self.pool is not None:
+                    self.pool.checkin(self.manager_cache[data_binding])
+                else:
+                    self.manager_cache[data_binding].close()
                 del self.manager_cache[data_binding]
             except Exception:
                 pass
@@ -820,15 +1839,33 @@ class DBBinder(object):
     def set_binding_defaults(self, binding_name, default_binding_dict):
         self.default_binding_dict[binding_name] = default_binding_dict
         
+    def set_aggregate_cache(self, aggregate_cache):
+        """Have all my managers memoize their aggregates in an instance of
+        AggregateCache. Set to None to stop memoizing."""
+        self.aggregate_cache = aggregate_cache
+        for manager in self.manager_cache.values():
+            manager.aggregate_cache = aggregate_cache
+
     def get_manager(self, data_binding='wx_binding', initialize=False):
-        """Given a binding name, returns the managed object"""
+        """Given a binding name, returns the managed object. If an
+        ArchiveWriter is writing to its table, the records handed to it so far
+        are in the database by the time it is returned."""
 
         if data_binding not in self.manager_cache:
             manager_dict = get_manager_dict(self.bindings_dict, 
                                             self.databases_dict, 
                                             data_binding,
                                             default_binding_dict=self.default_binding_dict)
-            self.manager_cache[data_binding] = open_manager(manager_dict, initialize)
+            if self.pool is not None:
+                self.manager_cache[data_binding] = self.pool.checkout(manager_dict, initialize, self.read_only)
+            else:
+                self.manager_cache[data_binding] = open_manager(manager_dict, initialize, self.read_only)
+            self.manager_cache[data_binding].aggregate_cache = self.aggregate_cache
+            self.writer_keys[data_binding] = _writer_key(manager_dict)
+        else:
+            _writer = _writers.get(self.writer_keys[data_binding])
+            if _writer:
+                _writer.sync(self.manager_cache[data_binding])
 
         return self.manager_cache[data_binding]
     
@@ -845,10 +1882,634 @@ class DBBinder(object):
 
         return db_lookup
 
+#===============================================================================
+#                          Archive table scan statistics
+#===============================================================================
+
+# The number of aggregate queries made over archive tables by this process,
+# and the time they took, keyed by (database name, table name), then by
+# observation type. They are used to suggest covering indexes. See
+# Manager.suggest_indexes():
+_scan_stats = {}
+_scan_stats_lock = threading.Lock()
+
+def _record_scan(manager, obs_type, elapsed):
+    with _scan_stats_lock:
+        _stats = _scan_stats.setdefault((manager.database_name, manager.table_name), {})
+        _count, _time = _stats.get(obs_type, (0, 0.0))
+        _stats[obs_type] = (_count + 1, _time + elapsed)
+
+def get_scan_stats(database_name, table_name):
+    """Returns the statistics of the aggregate queries over an archive table
+    made by this process so far. It is a dictionary keyed by observation type.
+    Each value is a tuple (number of queries, total time in seconds)."""
+    with _scan_stats_lock:
+        return dict(_scan_stats.get((database_name, table_name), {}))
+
+#===============================================================================
+#                             class ManagerPool
+#===============================================================================
+
+# The pool that DBBinders and uploaders draw their managers from, if any. See
+# set_manager_pool():
+_manager_pool = None
+
+def set_manager_pool(pool):
+    """Have the DBBinders created from now on, and pooled_manager(), draw
+    their managers from an instance of ManagerPool. Set to None to stop
+    pooling.
+    
+    returns: The pool that was in use before, or None."""
+    global _manager_pool
+    (_old_pool, _manager_pool) = (_manager_pool, pool)
+    return _old_pool
+
+def get_manager_pool():
+    """Returns the pool set with set_manager_pool(), or None."""
+    return _manager_pool
+
+@contextlib.contextmanager
+def pooled_manager(manager_dict, initialize=False, read_only=False):
+    """Context manager that checks a manager out of the pool set with
+    set_manager_pool(), and hands it back when done. If there is no pool, the
+    manager is opened, and closed when done. See open_manager() for
+    read_only."""
+    _pool = _manager_pool
+    if _pool is None:
+        with open_manager(manager_dict, initialize, read_only) as _manager:
+            yield _manager
+    else:
+        _manager = _pool.checkout(manager_dict, initialize, read_only)
+        try:
+            yield _manager
+        finally:
+            _pool.checkin(_manager)
+
+class ManagerPool(object):
+    """A thread-safe pool of open database managers, so that they can be
+    reused, rather than opened and closed every archive period.
+    
+    A manager is checked out with checkout(), and handed back with checkin().
+    While it is checked out, no one else gets it, so it can be used by any
+    one thread. Managers that have sat idle for longer than max_idle seconds
+    are closed. Should all max_size managers be in use, another one is opened
+    anyway, but it is closed, rather than pooled, when it is handed back.
+    
+    The engine sets up one pool for the process, so the report generators of
+    every report cycle and the uploader threads all share it.
+    
+    USEFUL ATTRIBUTES
+    
+    max_size: The largest number of managers the pool keeps open.
+    
+    max_idle: How long, in seconds, a manager can sit idle before it is closed.
+    
+    opens: The number of managers opened for the pool.
+    
+    reuses: The number of checkouts that got a manager that was already open.
+    
+    overflows: The number of managers opened, and closed again, because all
+    max_size were in use.
+    
+    evictions: The number of managers closed because they sat idle."""
+
+    def __init__(self, max_size=10, max_idle=900):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.opens = 0
+        self.reuses = 0
+        self.overflows = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # The idle managers, keyed by _pool_key(). Each value is a list of
+        # 2-way tuples (manager, time it was handed back), the most recently
+        # used last:
+        self._idle = {}
+        # The number of pooled managers checked out:
+        self._in_use = 0
+        self._closed = False
+
+    def __str__(self):
+        return "%d in use, %d idle; %d opens, %d reuses, %d overflows, %d evictions" % \
+            (self.in_use, self.idle, self.opens, self.reuses, self.overflows, self.evictions)
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    @property
+    def idle(self):
+        return sum(len(_entries) for _entries in self._idle.values())
+
+    def checkout(self, manager_dict, initialize=False, read_only=False):
+        """Return an open manager of the table given by a manager dictionary.
+        It belongs to the caller until handed back with checkin(). See
+        open_manager() for read_only."""
+        _key = _pool_key(manager_dict, read_only and not initialize)
+        while True:
+            with self._lock:
+                _expired = self._expire()
+                _entries = self._idle.get(_key)
+                if _entries:
+                    _manager = _entries.pop()[0]
+                    self._in_use += 1
+                else:
+                    _manager = None
+                    if not self._closed and self._in_use < self.max_size <= self._in_use + self.idle:
+                        # Make room by closing the manager of another table
+                        # that has sat idle the longest:
+                        _oldest = min(self._idle, key=lambda k: self._idle[k][0][1])
+                        _expired.append(self._idle[_oldest].pop(0)[0])
+                        if not self._idle[_oldest]:
+                            del self._idle[_oldest]
+                        self.evictions += 1
+                    _pooled = not self._closed and self._in_use + self.idle < self.max_size
+                    if _pooled:
+                        self._in_use += 1
+            self._close(_expired)
+            if _manager is None:
+                break
+            # Others may have written to the table while the manager sat
+            # idle. Bring it up to date, making sure it is still usable:
+            try:
+                _writer = _writers.get(_writer_key(manager_dict))
+                if _writer:
+                    _writer.wait()
+                    _manager._writer_commits = _writer.ncommits
+                _manager._sync()
+            except weedb.DatabaseError, e:
+                syslog.syslog(syslog.LOG_INFO, "manager: Closing pooled connection to database '%s': %s" % 
+                              (manager_dict['database_dict']['database_name'], e))
+                with self._lock:
+                    self._in_use -= 1
+                self._close([_manager])
+                continue
+            with self._lock:
+                self.reuses += 1
+            return _manager
+
+        # None was idle. Open a new one, which other threads may use later:
+        try:
+            # Its connection gets handed from one thread to another:
+            _manager = open_manager(dict(manager_dict,
+                                         database_dict=_database_dict_with(manager_dict['database_dict'],
+                                                                           check_same_thread=False)),
+                                    initialize, read_only)
+        except:
+            if _pooled:
+                with self._lock:
+                    self._in_use -= 1
+            raise
+        with self._lock:
+            if _pooled:
+                self.opens += 1
+            else:
+                self.overflows += 1
+        _manager._pool_key = _key if _pooled else None
+        return _manager
+
+    def checkin(self, manager):
+        """Hand back a manager obtained from checkout()."""
+        manager.aggregate_cache = None
+        _key = getattr(manager, '_pool_key', None)
+        with self._lock:
+            if _key is not None:
+                self._in_use -= 1
+                self._idle.setdefault(_key, []).append((manager, time.time()))
+            _expired = self._expire()
+        if _key is None:
+            _expired.append(manager)
+        self._close(_expired)
+
+    def close(self):
+        """Close all the idle managers. Those checked out get closed when
+        they are handed back."""
+        with self._lock:
+            self._closed = True
+            _idle = [_entry[0] for _entries in self._idle.values() for _entry in _entries]
+            self._idle = {}
+        self._close(_idle)
+
+    def _expire(self):
+        """Remove the managers that have sat idle for too long, or all of
+        them if the pool has been closed. Must be called with the lock held.
+        
+        returns: A list of the removed managers, to be closed."""
+        _cutoff = time.time() - self.max_idle
+        _expired = []
+        for _key in self._idle.keys():
+            _entries = self._idle[_key]
+            # They are in order of use, so the stale ones come first:
+            while _entries and (self._closed or _entries[0][1] < _cutoff):
+                _expired.append(_entries.pop(0)[0])
+            if not _entries:
+                del self._idle[_key]
+        self.evictions += len(_expired)
+        return _expired
+
+    @staticmethod
+    def _close(managers):
+        for _manager in managers:
+            try:
+                _manager.close()
+            except Exception:
+                pass
+
+def _pool_key(manager_dict, read_only):
+    return (manager_dict['manager'],) + _writer_key(manager_dict) + (read_only,)
+
+def _database_key(database_dict):
+    """Returns a tuple that identifies a database: its driver and where it
+    is, as well as its name."""
+    _driver = database_dict.get('driver')
+    if _driver == 'weedb.sqlite':
+        return (_driver, os.path.abspath(os.path.join(database_dict.get('root', ''), database_dict['database_name'])))
+    return (_driver, database_dict.get('host', 'localhost'), str(database_dict.get('port', '')), database_dict['database_name'])
+
+def table_key(database_dict, table_name):
+    """Returns a tuple that identifies a table among those of every database.
+    Databases of the same name on different servers, or under different
+    sqlite roots, are told apart."""
+    return _database_key(database_dict) + (table_name,)
+
+def _database_dict_with(database_dict, **options):
+    """Returns a copy of a database dictionary, with options that only the
+    sqlite driver knows about. Other drivers get it unchanged."""
+    _database_dict = dict(database_dict)
+    if _database_dict.get('driver') == 'weedb.sqlite':
+        _database_dict.update(options)
+    return _database_dict
+
+#===============================================================================
+#                             class ArchiveWriter
+#===============================================================================
+
+# The ArchiveWriters that are running, keyed by the table key of the table
+# they write to. See table_key():
+_writers = {}
+
+def _writer_key(manager_dict):
+    return table_key(manager_dict['database_dict'], manager_dict['table_name'])
+
+class ArchiveWriter(threading.Thread):
+    """Writes archive records and daily high/lows to a database in a thread of
+    its own, so the caller does not have to wait on the database.
+    
+    addRecord() and updateHiLo() put the work in a bounded queue, and return
+    at once, unless the queue is full. The thread then writes everything that
+    has queued up in one go, with consecutive records added in a single
+    transaction.
+    
+    While the thread is running, a manager of its table returned by
+    open_manager() or DBBinder.get_manager() is only handed over once
+    everything queued so far has been written. Anyone reading the table in
+    the same process therefore sees the records handed to the writer.
+    
+    Should a write fail, the thread reopens its manager and tries again,
+    once. Should that fail too, or the manager not open at all, the thread
+    stops, and the next call to addRecord(), updateHiLo() or flush() raises
+    weedb.OperationalError. Anything still queued is not written, just as
+    it would not have been had the caller written it and got the exception
+    itself. The records can then be caught up from the last one in the
+    database.
+    
+    USEFUL ATTRIBUTES
+    
+    queue_depth: The number of items waiting to be written.
+    
+    ncommits: The number of transactions committed.
+    
+    last_latency, max_latency: The time taken by the last, and the slowest,
+    commit, in seconds.
+    
+    error: The exception that stopped the thread, or None."""
+
+    def __init__(self, manager_dict, max_queue=20):
+        """Initialize an instance of ArchiveWriter.
+        
+        manager_dict: The manager dictionary of the table to be written to.
+        The thread opens a manager of its own with it.
+        
+        max_queue: The largest number of items that can be waiting to be
+        written. Default is 20."""
+        threading.Thread.__init__(self, name="ArchiveWriter")
+        self.setDaemon(True)
+        self.manager_dict = manager_dict
+        self.queue = Queue.Queue(max_queue)
+        self.ncommits = 0
+        self.last_latency = None
+        self.max_latency = None
+        self.error = None
+        self._total_latency = 0.0
+        self._manager = None
+
+    def __str__(self):
+        return "queue depth %d; %d commits; commit latency last %s, max %s, mean %s" % \
+            (self.queue_depth, self.ncommits, _format_latency(self.last_latency), _format_latency(self.max_latency),
+             _format_latency(self._total_latency / self.ncommits if self.ncommits else None))
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def start(self):
+        _writers[_writer_key(self.manager_dict)] = self
+        threading.Thread.start(self)
+
+    def addRecord(self, record):
+        """Queue a record to be added to the archive.
+        
+        raises: weedb.OperationalError, if the thread has stopped."""
+        # The caller is free to change the record once it is queued:
+        self._put(('record', dict(record)))
+
+    def updateHiLo(self, accumulator):
+        """Queue an accumulator to update the daily high/lows with.
+        
+        raises: weedb.OperationalError, if the thread has stopped."""
+        self._put(('hilo', accumulator))
+
+    def flush(self):
+        """Wait until everything queued so far has been written.
+        
+        raises: weedb.OperationalError, if the thread stopped because a write
+        failed."""
+        self.wait()
+        if self.error is not None:
+            raise weedb.OperationalError("Archive writer stopped: %s" % self.error)
+
+    def wait(self):
+        """Wait until everything queued so far has been written, or the
+        thread has stopped. Unlike flush(), this does not raise an exception
+        if a write failed, so readers of the table can carry on."""
+        if threading.current_thread() is self or not self.queue.unfinished_tasks or not self.is_alive():
+            return
+        _done = threading.Event()
+        try:
+            self._put(('flush', _done))
+        except weedb.OperationalError:
+            return
+        # Wait in steps, so signals still get through:
+        while not _done.wait(1.0) and self.is_alive():
+            pass
+
+    def sync(self, manager):
+        """Wait until everything queued so far has been written. Then, if
+        anything has been written since, bring the cached timestamps of a
+        manager of the same table up to date, and have it forget any
+        aggregates it has cached."""
+        self.wait()
+        if getattr(manager, '_writer_commits', None) != self.ncommits:
+            manager._writer_commits = self.ncommits
+            manager._sync()
+            manager._invalidate_aggregates()
+
+    def close(self):
+        """Write everything queued so far, then stop the thread."""
+        if self.is_alive():
+            try:
+                self._put(None)
+            except weedb.OperationalError:
+                pass
+            self.join()
+        if _writers.get(_writer_key(self.manager_dict)) is self:
+            del _writers[_writer_key(self.manager_dict)]
+        syslog.syslog(syslog.LOG_INFO, "manager: archive writer stopped; %s" % self)
+
+    def _put(self, item):
+        """Queue an item, waiting while the queue is full, unless the thread
+        stops in the meantime."""
+        while True:
+            if not self.is_alive():
+                raise weedb.OperationalError("Archive writer stopped: %s" % (self.error or "not running"))
+            try:
+                self.queue.put(item, True, 1.0)
+                return
+            except Queue.Full:
+                pass
+
+    def run(self):
+        try:
+            self._manager = open_manager(self.manager_dict)
+            while True:
+                # Wait for something to do, then take whatever else has queued up:
+                _items = [self.queue.get()]
+                while True:
+                    try:
+                        _items.append(self.queue.get_nowait())
+                    except Queue.Empty:
+                        break
+                try:
+                    _stop = self._write(_items)
+                finally:
+                    for _item in _items:
+                        self.queue.task_done()
+                if _stop:
+                    break
+        except Exception, e:
+            self.error = e
+            syslog.syslog(syslog.LOG_ERR, "manager: archive writer stopped: %s" % e)
+            # Wake up anyone waiting on what was queued:
+            while True:
+                try:
+                    _item = self.queue.get_nowait()
+                except Queue.Empty:
+                    break
+                if _item is not None and _item[0] == 'flush':
+                    _item[1].set()
+                self.queue.task_done()
+        finally:
+            self._close_manager()
+
+    def _write(self, items):
+        """Write a list of queued items, in order.
+        
+        returns: True if the thread has been asked to stop."""
+        _stop = False
+        _records = []
+        _flushes = []
+        for _item in items:
+            if _item is None:
+                _stop = True
+            elif _item[0] == 'record':
+                _records.append(_item[1])
+            elif _item[0] == 'hilo':
+                # The records ahead of it go in first:
+                self._commit('addRecord', _records)
+                _records = []
+                self._commit('updateHiLo', _item[1])
+            else:
+                _flushes.append(_item[1])
+        self._commit('addRecord', _records)
+        for _done in _flushes:
+            _done.set()
+        return _stop
+
+    def _commit(self, method, arg):
+        """Call a manager method that writes to the database, timing it.
+        Should it fail, reopen the manager, in case the connection was lost,
+        and try again. Should that fail too, the exception is raised."""
+        if not arg:
+            return
+        t1 = time.time()
+        try:
+            getattr(self._manager, method)(arg)
+        except Exception, e:
+            syslog.syslog(syslog.LOG_ERR, "manager: archive writer: %s failed in database '%s': %s. Retrying." %
+                          (method, self.manager_dict['database_dict']['database_name'], e))
+            self._close_manager()
+            self._manager = open_manager(self.manager_dict)
+            t1 = time.time()
+            getattr(self._manager, method)(arg)
+        self.last_latency = time.time() - t1
+        self.max_latency = max(self.max_latency, self.last_latency)
+        self._total_latency += self.last_latency
+        self.ncommits += 1
+
+    def _close_manager(self):
+        if self._manager is not None:
+            try:
+                self._manager.close()
+            except weedb.DatabaseError:
+                pass
+            self._manager = None
+
+def _format_latency(latency):
+    return "%.3fs" % latency if latency is not None else "N/A"
+
 #===============================================================================
 #                                 Utilities
 #===============================================================================
 
+def _genIntervalRuns(spans):
+    """Generator function that groups a sequence of contiguous TimeSpans into
+    runs of spans that all have the same length.
+    
+    spans: An iterable returning TimeSpans in increasing order.
+    
+    yields: A 3-way tuple (origin, length, run_spans), where origin is the
+    start of the first span in the run, length is the common length of the
+    spans, and run_spans is a list of the spans in the run."""
+
+    _run = []
+    for span in spans:
+        if _run and (span.length != _run[0].length or span.start != _run[-1].stop):
+            yield (_run[0].start, _run[0].length, _run)
+            _run = []
+        _run.append(span)
+    if _run:
+        yield (_run[0].start, _run[0].length, _run)
+
+def _summary_column_defs(columns):
+    """Returns the column definitions for a CREATE TABLE statement of some
+    columns of a summary, such as 'min REAL, mintime INTEGER'."""
+    return ', '.join(["%s %s" % (_column, 'INTEGER' if _column == 'count' or _column.endswith('time') else 'REAL')
+                      for _column in columns])
+
+def _column_defs(schema):
+    """Returns the column definitions for a CREATE TABLE statement of a
+    schema, a list of (column name, SQL type) tuples."""
+    # Put the names in backquotes, because at least one of them ('interval')
+    # is a MySQL reserved word:
+    return ', '.join(["`%s` %s" % _type for _type in schema])
+
+def _archive_schema(connection, table_name):
+    """Returns the schema of an existing archive table, as a list of (column
+    name, SQL type) tuples, from which another like it can be made."""
+    _schema = []
+    for (_, _column, _type, _can_be_null, _, _is_primary) in connection.genSchemaOf(table_name):
+        if _is_primary:
+            _schema.append((_column, 'INTEGER NOT NULL UNIQUE PRIMARY KEY'))
+        else:
+            _schema.append((_column, ('VARCHAR(255)' if _type == 'STR' else _type) + ('' if _can_be_null else ' NOT NULL')))
+    return _schema
+
+def _partition_of(timestamp, period):
+    """Returns the period of the partition a timestamp belongs in, such as
+    '2014' for a period of a year. As with days, a record stamped at the very
+    start of a period belongs to the previous one."""
+    return time.strftime(Manager.partition_formats[period], time.localtime(timestamp - 1))
+
+def _partition_span(suffix):
+    """Returns the TimeSpan of a partition. The records in it have start <
+    dateTime <= stop."""
+    _year = int(suffix[:4])
+    if len(suffix) == 4:
+        (_start, _stop) = ((_year, 1), (_year + 1, 1))
+    else:
+        _month = int(suffix[4:])
+        (_start, _stop) = ((_year, _month), (_year + _month // 12, _month % 12 + 1))
+    return weeutil.weeutil.TimeSpan(int(time.mktime(_start + (1, 0, 0, 0, 0, 0, -1))),
+                                    int(time.mktime(_stop + (1, 0, 0, 0, 0, 0, -1))))
+
+def _partitions_between(first_ts, last_ts, period):
+    """Returns the periods of the partitions that the records from first_ts
+    to last_ts belong in, in order."""
+    _suffixes = [_partition_of(first_ts, period)]
+    while _partition_span(_suffixes[-1]).stop < last_ts:
+        _suffixes.append(_partition_of(_partition_span(_suffixes[-1]).stop + 1, period))
+    return _suffixes
+
+def _tier_span(tier, timestamp):
+    """Returns the TimeSpan of the bucket of a tier that a record stamped
+    with timestamp is rolled up into. Buckets fall on local hours, or days."""
+    if tier == 'day':
+        _start = weeutil.weeutil.startOfArchiveDay(timestamp)
+        return weeutil.weeutil.TimeSpan(_start, weeutil.weeutil.startOfDay(_start + 30 * 3600))
+    _start = int(weeutil.weeutil.startOfInterval(timestamp - 1, Manager.tier_lengths[tier]))
+    return weeutil.weeutil.TimeSpan(_start, _start + Manager.tier_lengths[tier])
+
+def _tier_columns(obs_type):
+    """Returns the columns of a tier that hold an observation type."""
+    return [obs_type] + ["%s_%s" % (obs_type, _stat) for _stat in Manager.tier_stats]
+
+def _tier_row(span, records, obs_types):
+    """Rolls up the records of a bucket of a tier. Returns the values of the
+    row, in the order dateTime, usUnits, interval, and then the columns of
+    each of obs_types."""
+    _accum = weewx.accum.Accum(span)
+    _stats = dict((_obs_type, weewx.accum.ScalarStats()) for _obs_type in obs_types)
+    for _record in records:
+        _accum.addRecord(_record)
+        # The accumulator does not keep statistics of every type (such as
+        # wind direction), so keep them separately:
+        for _obs_type in obs_types:
+            _stats[_obs_type].addHiLo(_record.get(_obs_type), _record['dateTime'])
+            _stats[_obs_type].addSum(_record.get(_obs_type))
+    _record = _accum.getRecord()
+    _row = [span.stop, _record['usUnits'], (span.stop - span.start) // 60]
+    for _obs_type in obs_types:
+        _row += [_record.get(_obs_type), _stats[_obs_type].min, _stats[_obs_type].max,
+                 _stats[_obs_type].sum, _stats[_obs_type].count]
+    return _row
+
+def _summary_value(stats_tuple, aggregate_type):
+    """Derive an aggregate from a stats-tuple.
+    
+    stats_tuple: A tuple (min, mintime, max, maxtime, sum, count, wsum, sumtime),
+    as returned by _getSummaryStats(). 
+    
+    aggregate_type: One of the types in Manager.summary_types.
+    
+    returns: The aggregate value, or None if there is no data."""
+
+    (_min, _mintime, _max, _maxtime, _sum, _count, _wsum, _sumtime) = stats_tuple
+    if aggregate_type == 'min':
+        return _min
+    elif aggregate_type == 'mintime':
+        return int(_mintime) if _mintime is not None else None
+    elif aggregate_type == 'max':
+        return _max
+    elif aggregate_type == 'maxtime':
+        return int(_maxtime) if _maxtime is not None else None
+    elif aggregate_type == 'sum':
+        return _sum
+    elif aggregate_type == 'count':
+        return int(_count) if _count is not None else None
+    elif aggregate_type == 'avg':
+        return _wsum / _sumtime if _wsum is not None and _sumtime else None
+    raise weewx.ViolatedPrecondition("Invalid summary aggregation type '%s'" % aggregate_type)
+
 default_binding_dict = {'database' : 'archive_sqlite',
                         'table_name' : 'archive',
                         'manager' : 'weewx.wxmanager.WXDaySummaryManager',
@@ -863,6 +2524,10 @@ default_binding_dict = {'database' : 'archive_sqlite',
 #  manager: The manager class
 #  table_name: The name of the internal table
 #  schema: The schema to be used in case of initialization
+#  indexes: Optional. The observation types to be given covering indexes
+#      when initialized. See Manager.add_indexes().
+#  partition: Optional. 'year' or 'month', to keep the records in a table
+#      for each, if the table is empty when initialized. See Manager.partition().
 #  database_dict: The database dictionary. This will be passed
 #      on to weedb.
 #
@@ -902,18 +2567,52 @@ def get_manager_dict(bindings_dict, databases_dict, data_binding,
         # elements of the schema in order:
         manager_dict['schema'] = [(col_name, manager_dict['schema'][col_name]) for col_name in manager_dict['schema']]
 
+    # The covering indexes may also be specified as the name of a python
+    # object, or else as a list of observation types:
+    indexes = manager_dict.get('indexes')
+    if isinstance(indexes, str):
+        manager_dict['indexes'] = weeutil.weeutil._get_object(indexes) if '.' in indexes else [indexes]
+
     return manager_dict
 
-def open_manager(manager_dict, initialize=False):
+def open_manager(manager_dict, initialize=False, read_only=False):
+    """Open a manager, given a manager dictionary.
+    
+    initialize: True to create the database and table if they do not exist.
+    
+    read_only: True for a manager that only reads the table. Where the
+    database supports it, its connection is then opened read-only, so it
+    does not get in the way of writers. Ignored if initialize is True."""
     
+    if read_only and not initialize:
+        manager_dict = dict(manager_dict,
+                            database_dict=_database_dict_with(manager_dict['database_dict'], read_only=True))
+
+    # If an ArchiveWriter is writing to the table, let it catch up first:
+    _writer = _writers.get(_writer_key(manager_dict))
+    if _writer:
+        _writer.wait()
+
     manager_cls = weeutil.weeutil._get_object(manager_dict['manager'])
     if initialize:
-        return manager_cls.open_with_create(manager_dict['database_dict'],
-                                            manager_dict['table_name'],
-                                            manager_dict['schema'])
+        _manager = manager_cls.open_with_create(manager_dict['database_dict'],
+                                                manager_dict['table_name'],
+                                                manager_dict['schema'])
+        if manager_dict.get('partition') and not _manager.partition_period:
+            if _manager.first_timestamp is None:
+                _manager.partition(manager_dict['partition'])
+            else:
+                syslog.syslog(syslog.LOG_NOTICE, "manager: Table '%s' has records, so it was not partitioned. "
+                              "Use 'wee_config_database --partition-archive=%s' to do so." % 
+                              (_manager.table_name, manager_dict['partition']))
+        if manager_dict.get('indexes'):
+            _manager.add_indexes(manager_dict['indexes'])
     else:
-        return manager_cls.open(manager_dict['database_dict'],
-                                manager_dict['table_name'])
+        _manager = manager_cls.open(manager_dict['database_dict'],
+                                    manager_dict['table_name'])
+    if _writer:
+        _manager._writer_commits = _writer.ncommits
+    return _manager
     
 def open_manager_with_config(config_dict, data_binding,
                              initialize=False, default_binding_dict=default_binding_dict):
@@ -945,8 +2644,9 @@ def drop_database_with_config(config_dict, data_binding,
 #
 #     Adds daily summaries to the database.
 # 
-#     This class specializes method _addSingleRecord so that it adds
-#     the data to a daily summary, as well as the regular archive table.
+#     This class specializes methods _addSingleRecord and _insertBatch so
+#     that they add the data to a daily summary, as well as the regular
+#     archive table.
 #     
 #     Note that a date does not include midnight --- that belongs
 #     to the previous day. That is because a data record archives
@@ -969,6 +2669,52 @@ def show_progress(nrec, last_time):
     print >>sys.stdout, "Records processed: %d; Last date: %s\r" % \
         (nrec, weeutil.weeutil.timestamp_to_string(last_time)),
     sys.stdout.flush()
+
+def _genDaySummaries(dbmanager, start_ts, stop_ts, first_accum=None):
+    """Generator function that calculates the daily summaries of the archive
+    records with a timestamp greater than start_ts, and less than or equal to
+    stop_ts.
+    
+    dbmanager: The manager of the archive.
+    
+    first_accum: The accumulator to add the records of the first day to.
+    [Optional. Default is to start with an empty one, as for all other days.]
+    
+    yields: A 3-way tuple (day_accum, last_ts, nrecs) for each day with
+    records, where day_accum is the accumulator, last_ts the timestamp of the
+    last record added to it, and nrecs the number of records added."""
+    
+    _day_accum = first_accum
+    _lastTime = None
+    _nrecs = 0
+    for _rec in dbmanager.genBatchRecords(start_ts, stop_ts):
+        if _day_accum is None:
+            _day_accum = weewx.accum.Accum(weeutil.weeutil.archiveDaySpan(_rec['dateTime']))
+        try:
+            _day_accum.addRecord(_rec)
+        except weewx.accum.OutOfSpan:
+            # The record belongs to the next day. Finish this one:
+            if _nrecs:
+                yield (_day_accum, _lastTime, _nrecs)
+            _day_accum = weewx.accum.Accum(weeutil.weeutil.archiveDaySpan(_rec['dateTime']))
+            _day_accum.addRecord(_rec)
+            _nrecs = 0
+        _lastTime = _rec['dateTime']
+        _nrecs += 1
+    if _nrecs:
+        yield (_day_accum, _lastTime, _nrecs)
+
+def _backfill_span(args):
+    """Calculate the daily summaries of a span of the archive. Run in a
+    worker process by DaySummaryManager.backfill_day_summary().
+    
+    args: A 4-way tuple (database_dict, table_name, start_ts, stop_ts).
+    
+    returns: A list, with the tuples yielded by _genDaySummaries()."""
+    
+    (database_dict, table_name, start_ts, stop_ts) = args
+    with Manager.open(database_dict, table_name) as dbmanager:
+        return list(_genDaySummaries(dbmanager, start_ts, stop_ts))
         
 class DaySummaryManager(Manager):
     """Manage a daily statistical summary. 
@@ -987,7 +2733,22 @@ class DaySummaryManager(Manager):
     sumtime is the sum of the archive intervals.
         
     In addition to all the tables for each type, there is one additional table called
-    'archive_day__metadata', which currently holds the time of the last update. """
+    'archive_day__metadata', which currently holds the time of the last update.
+    
+    Optionally, the daily summaries can be rolled up into monthly and yearly
+    summaries (see add_rollups()). For type 'outTemp', they would be in tables
+    'archive_month_outTemp' and 'archive_year_outTemp', with the same columns
+    as the daily summary. A row summarizes the days of the month (or the
+    months of the year) starting at its dateTime. Once they exist, they are
+    kept up to date along with the daily summaries, and aggregates over long
+    periods use the coarsest summaries that exactly cover them.
+    
+    Optionally, the daily summaries of all types can be combined into a
+    single table, 'archive_day__summary', keyed by type and day (see
+    combine_daily()). A whole day can then be read, or written, with a single
+    statement. The table of each type is replaced by a view of the same name,
+    so queries against the daily summaries of a type work the same with
+    either layout. """
     
     version = "1.0"
 
@@ -1002,26 +2763,39 @@ class DaySummaryManager(Manager):
     
     select_update_str = """SELECT value FROM %s_day__metadata WHERE name = 'lastUpdate';"""
     
+    # The SQL statements used for the combined layout of the daily summaries
+    
+    combined_create_str = "CREATE TABLE %s_day__summary (dateTime INTEGER NOT NULL, obs_type CHAR(30) NOT NULL, "\
+      "%s, PRIMARY KEY (obs_type, dateTime));"
+    combined_index_str  = "CREATE INDEX %s_day__summary_dateTime ON %s_day__summary (dateTime);"
+    view_create_str     = "CREATE VIEW %s_day_%s AS SELECT dateTime, %s FROM %s_day__summary WHERE obs_type = '%s';"
+    
     # Set of SQL statements to be used for calculating aggregate statistics. Key is the aggregation type.
-    sqlDict = {'min'        : "SELECT MIN(min) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
+    # The queries for min, max, and the *time types step through the days in
+    # order, and stop at the first. Those for min, mintime, max, and maxtime
+    # find the partner type as well, in the second column. See
+    # Manager.partner_types.
+    sqlDict = {'min'        : "SELECT min, mintime FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                              "AND min IS NOT NULL ORDER BY min ASC, dateTime ASC LIMIT 1",
                'minmax'     : "SELECT MIN(max) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
-               'max'        : "SELECT MAX(max) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
+               'max'        : "SELECT max, maxtime FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                              "AND max IS NOT NULL ORDER BY max DESC, dateTime ASC LIMIT 1",
                'maxmin'     : "SELECT MAX(min) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
                'meanmin'    : "SELECT AVG(min) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
                'meanmax'    : "SELECT AVG(max) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
                'maxsum'     : "SELECT MAX(sum) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
-               'mintime'    : "SELECT mintime FROM %(table_name)s_day_%(obs_key)s  WHERE dateTime >= %(start)s AND dateTime < %(stop)s AND " \
-                              "min = (SELECT MIN(min) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime <%(stop)s)",
-               'maxmintime' : "SELECT mintime FROM %(table_name)s_day_%(obs_key)s  WHERE dateTime >= %(start)s AND dateTime < %(stop)s AND " \
-                              "min = (SELECT MAX(min) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime <%(stop)s)",
-               'maxtime'    : "SELECT maxtime FROM %(table_name)s_day_%(obs_key)s  WHERE dateTime >= %(start)s AND dateTime < %(stop)s AND " \
-                              "max = (SELECT MAX(max) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime <%(stop)s)",
-               'minmaxtime' : "SELECT maxtime FROM %(table_name)s_day_%(obs_key)s  WHERE dateTime >= %(start)s AND dateTime < %(stop)s AND " \
-                              "max = (SELECT MIN(max) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime <%(stop)s)",
-               'maxsumtime' : "SELECT maxtime FROM %(table_name)s_day_%(obs_key)s  WHERE dateTime >= %(start)s AND dateTime < %(stop)s AND " \
-                              "sum = (SELECT MAX(sum) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime <%(stop)s)",
-               'gustdir'    : "SELECT max_dir FROM %(table_name)s_day_%(obs_key)s  WHERE dateTime >= %(start)s AND dateTime < %(stop)s AND " \
-                              "max = (SELECT MAX(max) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s)",
+               'mintime'    : "SELECT mintime, min FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                              "AND min IS NOT NULL ORDER BY min ASC, dateTime ASC LIMIT 1",
+               'maxmintime' : "SELECT mintime FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                              "AND min IS NOT NULL ORDER BY min DESC, dateTime ASC LIMIT 1",
+               'maxtime'    : "SELECT maxtime, max FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                              "AND max IS NOT NULL ORDER BY max DESC, dateTime ASC LIMIT 1",
+               'minmaxtime' : "SELECT maxtime FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                              "AND max IS NOT NULL ORDER BY max ASC, dateTime ASC LIMIT 1",
+               'maxsumtime' : "SELECT maxtime FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                              "AND sum IS NOT NULL ORDER BY sum DESC, dateTime ASC LIMIT 1",
+               'gustdir'    : "SELECT max_dir FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                              "AND max IS NOT NULL ORDER BY max DESC, dateTime ASC LIMIT 1",
                'sum'        : "SELECT SUM(sum) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
                'count'      : "SELECT SUM(count) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
                'avg'        : "SELECT SUM(wsum),SUM(sumtime) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
@@ -1032,7 +2806,39 @@ class DaySummaryManager(Manager):
                'max_le'     : "SELECT SUM(max <= %(val)s) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
                'min_le'     : "SELECT SUM(min <= %(val)s) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
                'sum_ge'     : "SELECT SUM(sum >= %(val)s) FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s"}
-    
+
+    # Returns the summary of the daily summaries over a timespan. Its row looks
+    # like a stats-tuple (see weewx.accum).
+    day_summary_sql = "SELECT MIN(min), "\
+                      "(SELECT mintime FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                      "AND min IS NOT NULL ORDER BY min ASC, dateTime ASC LIMIT 1), "\
+                      "MAX(max), "\
+                      "(SELECT maxtime FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s "\
+                      "AND max IS NOT NULL ORDER BY max DESC, dateTime ASC LIMIT 1), "\
+                      "SUM(sum), SUM(count), SUM(wsum), SUM(sumtime) "\
+                      "FROM %(table_name)s_day_%(obs_key)s WHERE dateTime >= %(start)s AND dateTime < %(stop)s"
+
+    # The levels of summary, from finest to coarsest. The summaries of each level
+    # after the first are rolled up from the one before it.
+    rollup_levels = ['day', 'month', 'year']
+
+    # Aggregation types that can be calculated from the month and year summaries,
+    # and the columns of the summaries they need:
+    rollup_aggregates = {'min'     : ('min',),
+                         'mintime' : ('mintime',),
+                         'max'     : ('max',),
+                         'maxtime' : ('maxtime',),
+                         'gustdir' : ('max_dir',),
+                         'sum'     : ('sum',),
+                         'count'   : ('count',),
+                         'avg'     : ('wsum', 'sumtime'),
+                         'rms'     : ('wsquaresum', 'sumtime'),
+                         'vecavg'  : ('xsum', 'ysum', 'dirsumtime'),
+                         'vecdir'  : ('xsum', 'ysum')}
+
+    # No month, even allowing for a daylight savings change, is shorter than this:
+    min_rollup_length = 27 * 24 * 3600
+
     def __init__(self, connection, table_name='archive', schema=None):
         """Initialize an instance of DaySummaryManager
         
@@ -1061,14 +2867,38 @@ class DaySummaryManager(Manager):
                 self._initialize_day_tables(schema, _cursor)
             syslog.syslog(syslog.LOG_NOTICE, "manager: Created daily summary tables")
         
-        # Get a list of all the observation types which have daily summaries
+        # Get a list of all the observation types which have daily summaries.
+        # With the combined layout, they are views rather than tables.
         all_tables = self.connection.tables()
         prefix = "%s_day_" % self.table_name
         Nprefix = len(prefix)
-        meta_name = '%s_day__metadata' % self.table_name
-        self.daykeys = [x[Nprefix:] for x in all_tables if (x.startswith(prefix) and x != meta_name)]
+        private_names = ['%s_day__metadata' % self.table_name, '%s_day__summary' % self.table_name]
+        self.daykeys = [x[Nprefix:] for x in all_tables + self.connection.views() 
+                        if (x.startswith(prefix) and x not in private_names)]
         row = self.connection.execute("""SELECT value FROM %s_day__metadata WHERE name = 'Version';""" % self.table_name)
         self.version = row[0] if row is not None else "1.0"
+        # The layout of the daily summaries. Either 'split', a table for each
+        # type, or 'combined', a single table for all types:
+        row = self.getSql("""SELECT value FROM %s_day__metadata WHERE name = 'layout';""" % self.table_name)
+        self.day_layout = str(row[0]) if row is not None else 'split'
+        # The columns of the combined table, less dateTime and obs_type:
+        self._combined_columns = self.connection.columnsOf('%s_day__summary' % self.table_name)[2:] \
+            if self.day_layout == 'combined' else None
+
+        # The types that have month and year summaries, as well as daily summaries:
+        self.rollupkeys = [x for x in self.daykeys 
+                           if "%s_month_%s" % (self.table_name, x) in all_tables 
+                           and "%s_year_%s" % (self.table_name, x) in all_tables]
+        # The columns of the summaries of each type, the SQL to summarize them
+        # at each level, and how periods break down into levels. All are
+        # filled in as needed:
+        self._summary_columns = {}
+        self._summary_sql = {}
+        self._rollup_runs = {}
+
+        # The summary of the day most recently written is kept resident, along
+        # with the value of lastUpdate written with it:
+        self._invalidate_day_cache()
 
     def _initialize_day_tables(self, archiveSchema, cursor):
         """Initialize the tables needed for the daily summary."""
@@ -1080,6 +2910,15 @@ class DaySummaryManager(Manager):
         # Put the version number in it:
         cursor.execute(DaySummaryManager.meta_replace_str % self.table_name, ("Version", DaySummaryManager.version))
 
+    def addRecord(self, record_obj, log_level=syslog.LOG_NOTICE, quiet=False):
+        """Specialized version that forgets the resident day summary should
+        the transaction fail."""
+        try:
+            super(DaySummaryManager, self).addRecord(record_obj, log_level, quiet)
+        except Exception:
+            self._invalidate_day_cache()
+            raise
+
     def _addSingleRecord(self, record, cursor, log_level):
         """Specialized version that updates the daily summaries, as well as the 
         main archive table."""
@@ -1094,24 +2933,57 @@ class DaySummaryManager(Manager):
         _day_summary = self._get_day_summary(_sod_ts, cursor)
         _day_summary.addRecord(record)
         self._set_day_summary(_day_summary, record['dateTime'], cursor)
-        syslog.syslog(log_level, "manager: added record %s to daily summary in '%s'" % 
-                      (weeutil.weeutil.timestamp_to_string(record['dateTime']), 
-                       self.database_name))
+        if log_level is not None:
+            syslog.syslog(log_level, "manager: added record %s to daily summary in '%s'" % 
+                          (weeutil.weeutil.timestamp_to_string(record['dateTime']), 
+                           self.database_name))
         
+    def _insertBatch(self, key_list, batch, cursor, log_level):
+        """Specialized version that updates the daily summaries, as well as the
+        main archive table. Consecutive records that fall in the same day are
+        added to that day's summary together, so it need be read and written
+        only once."""
+
+        # First let my superclass handle adding the records to the main archive table:
+        super(DaySummaryManager, self)._insertBatch(key_list, batch, cursor, log_level)
+
+        try:
+            for (_sod_ts, _day_records) in itertools.groupby(batch, lambda _rec: weeutil.weeutil.startOfArchiveDay(_rec['dateTime'])):
+                _day_records = list(_day_records)
+                _day_summary = self._get_day_summary(_sod_ts, cursor)
+                for record in _day_records:
+                    _day_summary.addRecord(record)
+                self._set_day_summary(_day_summary, _day_records[-1]['dateTime'], cursor)
+                if log_level is not None:
+                    for record in _day_records:
+                        syslog.syslog(log_level, "manager: added record %s to daily summary in '%s'" % 
+                                      (weeutil.weeutil.timestamp_to_string(record['dateTime']), 
+                                       self.database_name))
+        except Exception:
+            # The batch will be rolled back, taking any summaries written with it.
+            self._invalidate_day_cache()
+            raise
+
     def updateHiLo(self, accumulator):
         """Use the contents of an accumulator to update the daily hi/lows."""
         
         # Get the start-of-day for the timespan in the accumulator
         _sod_ts = weeutil.weeutil.startOfArchiveDay(accumulator.timespan.stop)
 
-        with weedb.Transaction(self.connection) as _cursor:
-            # Retrieve the daily summaries seen so far:
-            _stats_dict = self._get_day_summary(_sod_ts, _cursor)
-            # Update them with the contents of the accumulator:
-            _stats_dict.updateHiLo(accumulator)
-            # Then save the results:
-            self._set_day_summary(_stats_dict, accumulator.timespan.stop, _cursor)
+        try:
+            with weedb.Transaction(self.connection) as _cursor:
+                # Retrieve the daily summaries seen so far:
+                _stats_dict = self._get_day_summary(_sod_ts, _cursor)
+                # Update them with the contents of the accumulator:
+                _stats_dict.updateHiLo(accumulator)
+                # Then save the results:
+                self._set_day_summary(_stats_dict, accumulator.timespan.stop, _cursor)
+        except Exception:
+            self._invalidate_day_cache()
+            raise
+        self._invalidate_aggregates()
         
+    @cache_aggregates
     def getAggregate(self, timespan, obs_type, aggregate_type, **option_dict):
         """Returns an aggregation of a statistical type for a given time period.
         It will use the daily summaries if possible, otherwise the archive table.
@@ -1131,17 +3003,31 @@ class DaySummaryManager(Manager):
         type is unknown. The second element is the unit type (eg, 'degree_F').
         The third element is the unit group (eg, "group_temperature") """
         
+        if aggregate_type in ['last', 'lasttime']:
+            # Cannot use the day summaries. We'll have to calculate the aggregate
+            # using the regular archive table:
+            return Manager.getAggregate(self, timespan, obs_type, aggregate_type,
+                                          **option_dict)
+
         # We can use the day summary optimizations if the starting and ending times of
         # the aggregation interval sit on midnight boundaries, or are the first or last
         # records in the database.
-        if aggregate_type in ['last', 'lasttime'] or not (weeutil.weeutil.isMidnight(timespan.start) or \
-                                                          timespan.start == self.first_timestamp) \
-                                                  or not (weeutil.weeutil.isMidnight(timespan.stop)  or \
-                                                          timespan.stop  == self.last_timestamp):
-            
+        (day_span, complete) = self._getDaySpan(timespan)
+
+        if not complete:
+            # Otherwise, for some aggregation types, the whole days in the middle
+            # can still come from the day summaries, leaving only the partial days
+            # at the ends to be calculated from the archive table.
+            if day_span is not None and aggregate_type in Manager.summary_types \
+                    and obs_type in self.daykeys and obs_type in self.sqlkeys:
+                _stats = self._getHybridStats(timespan, day_span, obs_type)
+                # Look up the unit type and group of this combination of stats type and aggregation:
+                (t, g) = weewx.units.getStandardUnitType(self.std_unit_system, obs_type, aggregate_type)
+                return weewx.units.ValueTuple(_summary_value(_stats, aggregate_type), t, g)
+
             # Cannot use the day summaries. We'll have to calculate the aggregate
             # using the regular archive table:
-            return Manager.getAggregate(self, timespan, obs_type, aggregate_type, 
+            return Manager.getAggregate(self, timespan, obs_type, aggregate_type,
                                           **option_dict)
 
         # We can use the daily summaries. Proceed.
@@ -1179,8 +3065,17 @@ class DaySummaryManager(Manager):
                      'val'           : target_val,
                      'table_name'    : self.table_name}
             
-        # Run the query against the database:
-        _row = self.getSql(DaySummaryManager.sqlDict[aggregate_type] % interDict)
+        if aggregate_type in DaySummaryManager.rollup_aggregates \
+                and self._useRollups(obs_type, interDict['start'], interDict['stop']):
+            # Use the month and year summaries for as much of the timespan as they cover:
+            _columns = DaySummaryManager.rollup_aggregates[aggregate_type]
+            _summary = self._getRollupSummary(interDict['start'], interDict['stop'], obs_type, _columns)
+            _row = tuple(_summary[_column] for _column in _columns)
+        else:
+            # Run the query against the database:
+            _row = self.getSql(DaySummaryManager.sqlDict[aggregate_type] % interDict)
+            if aggregate_type in Manager.partner_types:
+                self._cachePartner(timespan, obs_type, aggregate_type, _row[1] if _row else None, option_dict)
 
         #=======================================================================
         # Each aggregation type requires a slightly different calculation.
@@ -1225,7 +3120,190 @@ class DaySummaryManager(Manager):
         (t, g) = weewx.units.getStandardUnitType(self.std_unit_system, obs_type, aggregate_type)
         # Form the value tuple and return it:
         return weewx.units.ValueTuple(_result, t, g)
-        
+
+    def _getSummaryStats(self, timespan, obs_type):
+        """Specialized version that uses the daily summaries wherever possible,
+        in the same way getAggregate() does."""
+
+        (day_span, complete) = self._getDaySpan(timespan)
+        if complete:
+            return self._getDayStats(day_span, obs_type) if obs_type in self.daykeys else None
+        if day_span is not None and obs_type in self.daykeys and obs_type in self.sqlkeys:
+            return self._getHybridStats(timespan, day_span, obs_type)
+        return Manager._getSummaryStats(self, timespan, obs_type)
+
+    def _getDaySpan(self, timespan):
+        """Find the whole days in a timespan. Their statistics can be taken
+        from the daily summaries.
+
+        A day is whole if the timespan includes it from midnight to midnight.
+        The timespan may also start or stop at the first or last record in
+        the database, in which case the day holding it counts as whole.
+
+        returns: A 2-way tuple (day_span, complete). day_span is a TimeSpan
+        holding the whole days, or None if there are none. complete is True if
+        the whole days make up the entire timespan."""
+
+        start_aligned = weeutil.weeutil.isMidnight(timespan.start) or timespan.start == self.first_timestamp
+        stop_aligned  = weeutil.weeutil.isMidnight(timespan.stop)  or timespan.stop  == self.last_timestamp
+
+        day_start = weeutil.weeutil.startOfDay(timespan.start) if start_aligned \
+            else weeutil.weeutil.archiveDaySpan(timespan.start, grace=0).stop
+        day_stop  = timespan.stop if stop_aligned else weeutil.weeutil.startOfDay(timespan.stop)
+
+        if start_aligned and stop_aligned:
+            return (weeutil.weeutil.TimeSpan(day_start, day_stop), True)
+        elif day_start < day_stop:
+            return (weeutil.weeutil.TimeSpan(day_start, day_stop), False)
+        return (None, False)
+
+    def _getDayStats(self, day_span, obs_type):
+        """Get the statistics of an observation type over some whole days
+        from the daily summaries, in a single query.
+
+        returns: A stats-tuple (min, mintime, max, maxtime, sum, count, wsum,
+        sumtime)."""
+
+        if self._useRollups(obs_type, day_span.start, day_span.stop):
+            _summary = self._getRollupSummary(day_span.start, day_span.stop, obs_type)
+            return tuple(_summary[_column] for _column in 
+                         ('min', 'mintime', 'max', 'maxtime', 'sum', 'count', 'wsum', 'sumtime'))
+
+        interDict = {'obs_key'    : obs_type,
+                     'table_name' : self.table_name,
+                     'start'      : day_span.start,
+                     'stop'       : day_span.stop}
+        return tuple(self.getSql(DaySummaryManager.day_summary_sql % interDict))
+
+    def _getHybridStats(self, timespan, day_span, obs_type):
+        """Get the statistics of an observation type over a timespan that does
+        not sit on midnight boundaries.
+
+        The whole days in day_span are taken from the daily summaries, any
+        partial days on either side of it from the archive table. The parts are
+        then combined.
+
+        returns: A stats-tuple (min, mintime, max, maxtime, sum, count, wsum,
+        sumtime)."""
+
+        # Get the statistics of the partial day at the start, the whole days,
+        # and the partial day at the end, in that order:
+        _parts = []
+        if timespan.start < day_span.start:
+            _parts.append(Manager._getSummaryStats(self, weeutil.weeutil.TimeSpan(timespan.start, day_span.start), obs_type))
+        _parts.append(self._getDayStats(day_span, obs_type))
+        if day_span.stop < timespan.stop:
+            _parts.append(Manager._getSummaryStats(self, weeutil.weeutil.TimeSpan(day_span.stop, timespan.stop), obs_type))
+
+        # Find the most extreme values. In case of a tie, the earliest one wins.
+        _min = _mintime = _max = _maxtime = None
+        for _part in _parts:
+            if _part[0] is not None and (_min is None or _part[0] < _min):
+                (_min, _mintime) = _part[0:2]
+            if _part[2] is not None and (_max is None or _part[2] > _max):
+                (_max, _maxtime) = _part[2:4]
+
+        # Add up the rest:
+        _sum     = weeutil.weeutil.sum_with_none([_part[4] for _part in _parts])
+        _count   = sum(_part[5] for _part in _parts if _part[5] is not None)
+        _wsum    = weeutil.weeutil.sum_with_none([_part[6] for _part in _parts])
+        _sumtime = sum(_part[7] for _part in _parts if _part[7] is not None)
+
+        return (_min, _mintime, _max, _maxtime, _sum, _count, _wsum, _sumtime)
+
+    def _useRollups(self, obs_type, start_ts, stop_ts):
+        """Returns True if the month and year summaries might help with the
+        daily summaries of an observation type from start_ts to stop_ts."""
+        # Not if the period is too short to hold a whole month:
+        return obs_type in self.rollupkeys and stop_ts - start_ts >= DaySummaryManager.min_rollup_length
+
+    def _getRollupSummary(self, start_ts, stop_ts, obs_type, columns=None):
+        """Summarize the daily summaries of an observation type from start_ts
+        up to, but not including, stop_ts, using the coarsest summaries that
+        exactly cover each part.
+
+        columns: The columns of the daily summary (e.g., 'min', 'sumtime') to
+        be summarized. Default is None, meaning all of them.
+
+        returns: A dictionary. The key is a column, the value its summary
+        over the period."""
+
+        if columns is not None:
+            # The times of the extremes cannot be combined without the extremes:
+            columns = set(columns)
+            if 'mintime' in columns:
+                columns.add('min')
+            if 'maxtime' in columns or 'max_dir' in columns:
+                columns.add('max')
+        _columns = [_column for _column in self._summaryColumnsOf(obs_type) 
+                    if columns is None or _column in columns]
+        # The same periods tend to get asked for over and over, so remember how they break down:
+        _runs = self._rollup_runs.get((start_ts, stop_ts))
+        if _runs is None:
+            if len(self._rollup_runs) >= 100:
+                self._rollup_runs.clear()
+            _runs = self._rollup_runs[(start_ts, stop_ts)] = list(self._genRollupSpans(start_ts, stop_ts))
+        _parts = [self._getLevelSummary(obs_type, _level, _span.start, _span.stop, columns=_columns)
+                  for (_level, _span) in _runs]
+
+        # The part with the most extreme value supplies its time as well. In
+        # case of a tie, the earliest one wins.
+        _min_part = _max_part = None
+        for _part in _parts:
+            if _part.get('min') is not None and (_min_part is None or _part['min'] < _min_part['min']):
+                _min_part = _part
+            if _part.get('max') is not None and (_max_part is None or _part['max'] > _max_part['max']):
+                _max_part = _part
+
+        _summary = {}
+        for _column in _columns:
+            if _column in ('min', 'mintime'):
+                _summary[_column] = _min_part[_column] if _min_part else None
+            elif _column in ('max', 'maxtime', 'max_dir'):
+                _summary[_column] = _max_part[_column] if _max_part else None
+            else:
+                _summary[_column] = weeutil.weeutil.sum_with_none([_part[_column] for _part in _parts])
+        return _summary
+
+    def _genRollupSpans(self, start_ts, stop_ts):
+        """Generator function that breaks the daily summaries from start_ts up
+        to, but not including, stop_ts, into runs that are each covered exactly
+        by summaries of a single level. There are at most five: days, months,
+        years, months, then days again.
+
+        yields: A 2-way tuple (level, span), where level is one of
+        rollup_levels, and span a TimeSpan. The summaries of that level with a
+        dateTime from span.start up to, but not including, span.stop cover the
+        run."""
+
+        # The day holding stop_ts is included, unless stop_ts is its very start:
+        _limit = stop_ts if weeutil.weeutil.isMidnight(stop_ts) else weeutil.weeutil.archiveDaySpan(stop_ts, grace=0).stop
+
+        # Find the first and last month boundaries, and year boundaries, in the period:
+        _month = weeutil.weeutil.archiveMonthSpan(start_ts, grace=0)
+        _first_month = _month.start if _month.start == start_ts else _month.stop
+        _last_month = weeutil.weeutil.archiveMonthSpan(_limit, grace=0).start
+        if _first_month >= _last_month:
+            # Not even one whole month
+            yield ('day', weeutil.weeutil.TimeSpan(start_ts, stop_ts))
+            return
+        _year = weeutil.weeutil.archiveYearSpan(_first_month, grace=0)
+        _first_year = _year.start if _year.start == _first_month else _year.stop
+        _last_year = weeutil.weeutil.archiveYearSpan(_last_month, grace=0).start
+
+        if start_ts < _first_month:
+            yield ('day', weeutil.weeutil.TimeSpan(start_ts, _first_month))
+        if _first_year < _last_year:
+            if _first_month < _first_year:
+                yield ('month', weeutil.weeutil.TimeSpan(_first_month, _first_year))
+            yield ('year', weeutil.weeutil.TimeSpan(_first_year, _last_year))
+            if _last_year < _last_month:
+                yield ('month', weeutil.weeutil.TimeSpan(_last_year, _last_month))
+        else:
+            yield ('month', weeutil.weeutil.TimeSpan(_first_month, _last_month))
+        if _last_month < stop_ts:
+            yield ('day', weeutil.weeutil.TimeSpan(_last_month, stop_ts))
+
     def exists(self, obs_type):
         """Checks whether the observation type exists in the database."""
 
@@ -1238,7 +3316,7 @@ class DaySummaryManager(Manager):
         return self.exists(obs_type) and self.getAggregate(timespan, obs_type, 'count')[0] != 0
 
     def backfill_day_summary(self, start_ts=None, stop_ts=None, 
-                             progress_fn=show_progress):
+                             progress_fn=show_progress, processes=None, database_dict=None):
         """Fill the statistical database from an archive database.
         
         Normally, the daily summaries get filled by LOOP packets (to get maximum time
@@ -1247,13 +3325,27 @@ class DaySummaryManager(Manager):
         straight archive data. The Hi/Lows will all be there, but the times won't be
         any more accurate than the archive period.
         
+        The archive is worked through a month at a time. Each month is written
+        in a transaction of its own, along with the time of the last update,
+        so an interrupted backfill picks up where it left off. Only the day
+        holding start_ts is read back from the daily summaries. The days after
+        it are assumed to have no summaries yet.
+        
         start_ts: Archive data with a timestamp greater than this will be
         used. [Optional. Default is to start with the first datum in the archive.]
         
         stop_ts: Archive data with a timestamp less than or equal to this will be
         used. [Optional. Default is to end with the last datum in the archive.]
         
-        progress_fn: This function will be called after processing every 1000 records.
+        progress_fn: This function will be called after processing every month.
+        
+        processes: The number of worker processes that calculate the daily
+        summaries of each month. [Optional. Default is to calculate them in
+        this process.]
+        
+        database_dict: The database dictionary of this manager's database. The
+        worker processes need it to open their own connections. Required if
+        processes is given.
         
         returns: A 2-way tuple (nrecs, ndays) where 
           nrecs is the number of records backfilled;
@@ -1263,68 +3355,210 @@ class DaySummaryManager(Manager):
         nrecs = 0
         ndays = 0
         
-        _day_accum = None
-        _lastTime  = None
-        
         # If a start time for the backfill wasn't given, then start with the time of
         # the last statistics recorded:
         if start_ts is None:
             start_ts = self._getLastUpdate()
+        if stop_ts is None:
+            stop_ts = self.last_timestamp
+        if stop_ts is None or (start_ts is not None and start_ts >= stop_ts):
+            # Empty archive, or nothing new in it
+            return (0, 0)
 
-        with weedb.Transaction(self.connection) as _cursor:
-            # Go through all the archiveDb records in the time span, adding them to the
-            # database
-            start = start_ts + 1 if start_ts else None
-            for _rec in self.genBatchRecords(start, stop_ts):
-                # Get the start-of-day for the record:
-                _sod_ts = weeutil.weeutil.startOfArchiveDay(_rec['dateTime'])
-                # If this is the very first record, fetch a new accumulator
-                if not _day_accum:
-                    _day_accum = self._get_day_summary(_sod_ts)
-                # Try updating. If the time is out of the accumulator's time span, an
-                # exception will get raised.
-                try:
-                    _day_accum.addRecord(_rec)
-                except weewx.accum.OutOfSpan:
-                    # The record is out of the time span.
-                    # Save the old accumulator:
-                    self._set_day_summary(_day_accum, _rec['dateTime'], _cursor)
-                    ndays += 1
-                    # Get a new accumulator:
-                    _day_accum = self._get_day_summary(_sod_ts)
-                    # try again
-                    _day_accum.addRecord(_rec)
-                 
-                # Remember the timestamp for this record.
-                _lastTime = _rec['dateTime']
-                nrecs += 1
-                if progress_fn and nrecs%1000 == 0:
-                    progress_fn(nrecs, _lastTime)
-    
-            # We're done. Record the daily summary for the last day.
-            if _day_accum:
-                self._set_day_summary(_day_accum, _lastTime, _cursor)
-                ndays += 1
+        try:
+            if start_ts is not None:
+                # The day holding start_ts may already have a summary. Add the
+                # rest of the day's records to it.
+                _day_span = weeutil.weeutil.archiveDaySpan(start_ts)
+                with weedb.Transaction(self.connection) as _cursor:
+                    for (_day_accum, _lastTime, _nrecs) in _genDaySummaries(self, start_ts, min(_day_span.stop, stop_ts),
+                                                                            self._get_day_summary(_day_span.start, _cursor)):
+                        self._set_day_summary(_day_accum, _lastTime, _cursor)
+                        nrecs += _nrecs
+                        ndays += 1
+                start_ts = _day_span.stop
+            else:
+                # Start from just before the first record:
+                start_ts = self.first_timestamp - 1
+
+            # Break the rest into months. A month ends on midnight of the
+            # first, the end of the archive day before it.
+            _spans = []
+            while start_ts < stop_ts:
+                _month_stop = min(weeutil.weeutil.archiveMonthSpan(start_ts, grace=0).stop, stop_ts)
+                _spans.append((start_ts, _month_stop))
+                start_ts = _month_stop
+
+            _pool = None
+            if processes and len(_spans) > 1:
+                # The worker processes get the months in order, and they come
+                # back in the same order.
+                _pool = multiprocessing.Pool(processes)
+                _gen_months = _pool.imap(_backfill_span, [(database_dict, self.table_name, _start, _stop) 
+                                                          for (_start, _stop) in _spans])
+            else:
+                _gen_months = (list(_genDaySummaries(self, _start, _stop)) for (_start, _stop) in _spans)
+
+            try:
+                for _days in _gen_months:
+                    if not _days:
+                        continue
+                    with weedb.Transaction(self.connection) as _cursor:
+                        # Any month and year summaries get rolled up once the month is written:
+                        for (_day_accum, _lastTime, _nrecs) in _days:
+                            self._set_day_summary(_day_accum, _lastTime, _cursor, rollup=False)
+                        self._build_rollups(self.rollupkeys, _days[0][0].timespan.start, _days[-1][0].timespan.start, _cursor)
+                    nrecs += sum(_day[2] for _day in _days)
+                    ndays += len(_days)
+                    if progress_fn:
+                        progress_fn(nrecs, _days[-1][1])
+            finally:
+                if _pool:
+                    _pool.terminate()
+                    _pool.join()
+        except Exception:
+            self._invalidate_day_cache()
+            raise
         
+        self._invalidate_aggregates()
         return (nrecs, ndays)
 
+    def add_rollups(self):
+        """Add month and year summaries for all the types with daily summaries
+        that do not already have them, and fill them in from the daily summaries.
+        From then on, they are kept up to date along with the daily summaries.
+        
+        returns: The list of types that were added."""
+        
+        _new_keys = [x for x in self.daykeys if x not in self.rollupkeys]
+        with weedb.Transaction(self.connection) as _cursor:
+            for _obs_type in _new_keys:
+                # The columns are the same as the daily summary's:
+                _sqltypestr = _summary_column_defs(self._summaryColumnsOf(_obs_type))
+                for _level in DaySummaryManager.rollup_levels[1:]:
+                    _cursor.execute("CREATE TABLE %s_%s_%s (dateTime INTEGER NOT NULL UNIQUE PRIMARY KEY, %s);" % 
+                                    (self.table_name, _level, _obs_type, _sqltypestr))
+                _cursor.execute("SELECT MIN(dateTime), MAX(dateTime) FROM %s_day_%s" % (self.table_name, _obs_type))
+                (_first_sod, _last_sod) = _cursor.fetchone()
+                self._build_rollups([_obs_type], _first_sod, _last_sod, _cursor)
+        self.rollupkeys += _new_keys
+        syslog.syslog(syslog.LOG_NOTICE, "manager: Added month and year summaries for %d types to database '%s'" %
+                      (len(_new_keys), self.database_name))
+        self._invalidate_aggregates()
+        return _new_keys
+
+    def drop_rollups(self):
+        """Drop the month and year summaries, leaving the daily summaries."""
+        with weedb.Transaction(self.connection) as _cursor:
+            for _obs_type in self.rollupkeys:
+                for _level in DaySummaryManager.rollup_levels[1:]:
+                    _cursor.execute("DROP TABLE %s_%s_%s" % (self.table_name, _level, _obs_type))
+        self.rollupkeys = []
+        self._invalidate_aggregates()
+
+    def combine_daily(self):
+        """Move the daily summaries of all types into a single table, keyed
+        by type and day. The table of each type is replaced by a view of the
+        same name.
+        
+        returns: True if the daily summaries were moved, False if they were
+        already combined."""
+
+        if self.day_layout == 'combined':
+            return False
+        # The combined table has the columns of every type:
+        _columns = []
+        for _obs_type in self.daykeys:
+            _columns += [_column for _column in self._summaryColumnsOf(_obs_type) if _column not in _columns]
+        self._invalidate_day_cache()
+        with weedb.Transaction(self.connection) as _cursor:
+            _cursor.execute(DaySummaryManager.combined_create_str % (self.table_name, _summary_column_defs(_columns)))
+            _cursor.execute(DaySummaryManager.combined_index_str % (self.table_name, self.table_name))
+            for _obs_type in self.daykeys:
+                _type_columns = ', '.join(self._summaryColumnsOf(_obs_type))
+                _cursor.execute("INSERT INTO %s_day__summary (dateTime, obs_type, %s) SELECT dateTime, '%s', %s FROM %s_day_%s" % 
+                                (self.table_name, _type_columns, _obs_type, _type_columns, self.table_name, _obs_type))
+                _cursor.execute("DROP TABLE %s_day_%s" % (self.table_name, _obs_type))
+                _cursor.execute(DaySummaryManager.view_create_str % (self.table_name, _obs_type, _type_columns, self.table_name, _obs_type))
+            _cursor.execute(DaySummaryManager.meta_replace_str % self.table_name, ('layout', 'combined'))
+        self.day_layout = 'combined'
+        self._combined_columns = _columns
+        syslog.syslog(syslog.LOG_NOTICE, "manager: Combined the daily summaries of %d types in database '%s'" %
+                      (len(self.daykeys), self.database_name))
+        self._invalidate_aggregates()
+        return True
+
+    def split_daily(self):
+        """Move the daily summaries out of the combined table, back into a
+        table for each type. This undoes combine_daily().
+        
+        returns: True if the daily summaries were moved, False if they were
+        already split."""
+
+        if self.day_layout == 'split':
+            return False
+        self._invalidate_day_cache()
+        with weedb.Transaction(self.connection) as _cursor:
+            for _obs_type in self.daykeys:
+                _columns = self._summaryColumnsOf(_obs_type)
+                _cursor.execute("DROP VIEW %s_day_%s" % (self.table_name, _obs_type))
+                _cursor.execute("CREATE TABLE %s_day_%s (dateTime INTEGER NOT NULL UNIQUE PRIMARY KEY, %s);" % 
+                                (self.table_name, _obs_type, _summary_column_defs(_columns)))
+                _cursor.execute("INSERT INTO %s_day_%s (dateTime, %s) SELECT dateTime, %s FROM %s_day__summary WHERE obs_type = '%s'" % 
+                                (self.table_name, _obs_type, ', '.join(_columns), ', '.join(_columns), self.table_name, _obs_type))
+            _cursor.execute("DROP TABLE %s_day__summary" % self.table_name)
+            _cursor.execute(DaySummaryManager.meta_replace_str % self.table_name, ('layout', 'split'))
+        self.day_layout = 'split'
+        self._combined_columns = None
+        syslog.syslog(syslog.LOG_NOTICE, "manager: Split the daily summaries of %d types in database '%s'" %
+                      (len(self.daykeys), self.database_name))
+        self._invalidate_aggregates()
+        return True
+
 
     #--------------------------- UTILITY FUNCTIONS -----------------------------------
 
     def _get_day_summary(self, sod_ts, cursor=None):
         """Return an instance of an appropriate accumulator, initialized to a given day's statistics.
 
+        If the day is the one most recently written by this manager, and no
+        one else has written to the daily summaries since, the resident copy
+        is returned, rather than reading it back from the database. Ownership
+        passes to the caller, who is expected to hand it back to
+        _set_day_summary().
+
         sod_ts: The timestamp of the start-of-day of the desired day."""
                 
-        # Get the TimeSpan for the day starting with sod_ts:
-        _timespan = weeutil.weeutil.archiveDaySpan(sod_ts,0)
-
-        # Get an empty day accumulator:
-        _day_accum = weewx.accum.Accum(_timespan)
-        
         _cursor = cursor or self.connection.cursor()
 
         try:
+            if self._day_accum is not None and self._day_accum.timespan.start == sod_ts:
+                _day_accum, _lastUpdate = self._day_accum, self._day_accum_lastUpdate
+                # Until it is written back, the resident copy is no longer valid:
+                self._invalidate_day_cache()
+                # Make sure that no one else has updated the summaries in the meantime:
+                if self._getLastUpdate(_cursor) == _lastUpdate:
+                    return _day_accum
+
+            # Get the TimeSpan for the day starting with sod_ts:
+            _timespan = weeutil.weeutil.archiveDaySpan(sod_ts,0)
+    
+            # Get an empty day accumulator:
+            _day_accum = weewx.accum.Accum(_timespan)
+        
+            if self.day_layout == 'combined':
+                # All the types come back from a single query. Their rows are
+                # as wide as the widest type, so pick out the columns of each.
+                _cursor.execute("SELECT obs_type, %s FROM %s_day__summary WHERE dateTime = ?" % 
+                                (', '.join(self._combined_columns), self.table_name), (_day_accum.timespan.start,))
+                _rows = dict((str(_row[0]), dict(zip(self._combined_columns, _row[1:]))) for _row in _cursor)
+                for _day_key in self.daykeys:
+                    # If the date does not exist in the database yet then there will be no row.
+                    _stats_tuple = tuple(_rows[_day_key][_column] for _column in self._summaryColumnsOf(_day_key)) \
+                        if _day_key in _rows else None
+                    _day_accum.set_stats(_day_key, _stats_tuple)
+                return _day_accum
+
             # For each observation type, execute the SQL query and hand the results on
             # to the accumulator.
             for _day_key in self.daykeys:
@@ -1339,39 +3573,167 @@ class DaySummaryManager(Manager):
             if not cursor:
                 _cursor.close()
 
-    def _set_day_summary(self, day_accum, lastUpdate, cursor):
+    def _set_day_summary(self, day_accum, lastUpdate, cursor, rollup=True):
         """Write all statistics for a day to the database in a single transaction.
         
         day_accum: an accumulator with the daily summary. See weewx.accum
         
         lastUpdate: the time of the last update will be set to this. Normally, this
         is the timestamp of the last archive record added to the instance
-        day_accum."""
+        day_accum.
+        
+        rollup: If True, also update the month and year summaries that include
+        the day. Default is True."""
 
         # Make sure the new data uses the same unit system as the database.
         self._check_unit_system(day_accum.unit_system)
 
         _sod = day_accum.timespan.start
+        _written = []
+
+        # Don't try an update for types not in the database, nor for types
+        # that have not changed since they were last read or written. Stats
+        # classes that do not track this are always written.
+        _changed = [_summary_type for _summary_type in day_accum
+                    if _summary_type in self.daykeys and getattr(day_accum[_summary_type], 'dirty', True)]
+
+        if self.day_layout == 'combined':
+            # All the changed types go into the combined table at once:
+            _written = self._set_combined_summary(_sod, day_accum, _changed, cursor)
+        else:
+            # For each daily summary type...
+            for _summary_type in _changed:
+                _stats = day_accum[_summary_type]
+                # ... get the stats tuple to be written to the database...
+                _write_tuple = (_sod,) + _stats.getStatsTuple()
+                # ... and an appropriate SQL command with the correct number of question marks ...
+                _qmarks = ','.join(len(_write_tuple)*'?')
+                _sql_replace_str = "REPLACE INTO %s_day_%s VALUES(%s)" % (self.table_name, _summary_type, _qmarks)
+                # ... and write to the database. In case the type doesn't appear in the database,
+                # be prepared to catch an exception:
+                try:
+                    cursor.execute(_sql_replace_str, _write_tuple)
+                except weedb.OperationalError, e:
+                    syslog.syslog(syslog.LOG_ERR, "manager: Operational error database %s; %s" % (self.database_name, e))
+                else:
+                    if hasattr(_stats, 'dirty'):
+                        _stats.dirty = False
+                    _written.append(_summary_type)
+
+        if rollup:
+            self._build_rollups([x for x in _written if x in self.rollupkeys], _sod, _sod, cursor)
 
-        # For each daily summary type...
-        for _summary_type in day_accum:
-            # Don't try an update for types not in the database:
-            if _summary_type not in self.daykeys:
-                continue
-            # ... get the stats tuple to be written to the database...
-            _write_tuple = (_sod,) + day_accum[_summary_type].getStatsTuple()
-            # ... and an appropriate SQL command with the correct number of question marks ...
-            _qmarks = ','.join(len(_write_tuple)*'?')
-            _sql_replace_str = "REPLACE INTO %s_day_%s VALUES(%s)" % (self.table_name, _summary_type, _qmarks)
-            # ... and write to the database. In case the type doesn't appear in the database,
-            # be prepared to catch an exception:
-            try:
-                cursor.execute(_sql_replace_str, _write_tuple)
-            except weedb.OperationalError, e:
-                syslog.syslog(syslog.LOG_ERR, "manager: Operational error database %s; %s" % (self.database_name, e))
-                
         # Update the time of the last daily summary update:
         cursor.execute(DaySummaryManager.meta_replace_str % self.table_name, ('lastUpdate', str(int(lastUpdate))))
+
+        # The accumulator now matches what is in the database. Keep it resident.
+        self._day_accum = day_accum
+        self._day_accum_lastUpdate = int(lastUpdate)
+
+    def _set_combined_summary(self, sod, day_accum, obs_types, cursor):
+        """Write the statistics of some observation types for the day starting
+        at sod to the combined table, with a single statement.
+        
+        returns: The list of types written."""
+
+        if not obs_types:
+            return []
+
+        # Each row is as wide as the combined table. Columns the type does
+        # not have are left null.
+        _rows = []
+        for _obs_type in obs_types:
+            _stats = dict(zip(self._summaryColumnsOf(_obs_type), day_accum[_obs_type].getStatsTuple()))
+            _rows.append((sod, _obs_type) + tuple(_stats.get(_column) for _column in self._combined_columns))
+        _qmarks = ','.join((len(self._combined_columns) + 2)*'?')
+        try:
+            cursor.executemany("REPLACE INTO %s_day__summary (dateTime, obs_type, %s) VALUES(%s)" % 
+                               (self.table_name, ', '.join(self._combined_columns), _qmarks), _rows)
+        except weedb.OperationalError, e:
+            syslog.syslog(syslog.LOG_ERR, "manager: Operational error database %s; %s" % (self.database_name, e))
+            return []
+
+        for _obs_type in obs_types:
+            if hasattr(day_accum[_obs_type], 'dirty'):
+                day_accum[_obs_type].dirty = False
+        return obs_types
+
+    def _build_rollups(self, obs_types, first_sod, last_sod, cursor):
+        """Roll up the daily summaries of some observation types into the
+        month and year summaries, for the months and years that hold the
+        days starting with first_sod through last_sod."""
+        
+        if not obs_types or first_sod is None:
+            return
+        
+        # Each level is rolled up from the one below it:
+        for (_below, _level) in zip(DaySummaryManager.rollup_levels[:-1], DaySummaryManager.rollup_levels[1:]):
+            _span_fn = weeutil.weeutil.archiveMonthSpan if _level == 'month' else weeutil.weeutil.archiveYearSpan
+            _span = _span_fn(first_sod, grace=0)
+            while _span.start <= last_sod:
+                for _obs_type in obs_types:
+                    _row = self._getLevelSummary(_obs_type, _below, _span.start, _span.stop, cursor)
+                    _columns = self._summaryColumnsOf(_obs_type)
+                    # Skip periods with no summaries at all:
+                    if all(_row[_column] is None for _column in _columns):
+                        continue
+                    _write_tuple = (_span.start,) + tuple(_row[_column] for _column in _columns)
+                    _qmarks = ','.join(len(_write_tuple)*'?')
+                    cursor.execute("REPLACE INTO %s_%s_%s VALUES(%s)" % (self.table_name, _level, _obs_type, _qmarks), _write_tuple)
+                _span = _span_fn(_span.stop, grace=0)
+
+    def _getLevelSummary(self, obs_type, level, start_ts, stop_ts, cursor=None, columns=None):
+        """Summarize the summaries of one level (e.g., 'day') of an observation
+        type with a dateTime from start_ts up to, but not including, stop_ts.
+        
+        columns: A list of the columns to be summarized. Default is None,
+        meaning all of them, in order.
+        
+        returns: A dictionary. The key is a column of the summaries, the value
+        its summary."""
+        
+        if columns is None:
+            columns = self._summaryColumnsOf(obs_type)
+        _sql_key = (obs_type, level, tuple(columns))
+        if _sql_key not in self._summary_sql:
+            _table = "%s_%s_%s" % (self.table_name, level, obs_type)
+            _where = "dateTime >= %(start)s AND dateTime < %(stop)s"
+            _exprs = []
+            for _column in columns:
+                if _column == 'min':
+                    _exprs.append("MIN(min)")
+                elif _column == 'max':
+                    _exprs.append("MAX(max)")
+                elif _column == 'mintime':
+                    _exprs.append("(SELECT mintime FROM %s WHERE %s AND min IS NOT NULL ORDER BY min ASC, dateTime ASC LIMIT 1)" % (_table, _where))
+                elif _column in ('maxtime', 'max_dir'):
+                    _exprs.append("(SELECT %s FROM %s WHERE %s AND max IS NOT NULL ORDER BY max DESC, dateTime ASC LIMIT 1)" % (_column, _table, _where))
+                else:
+                    _exprs.append("SUM(%s)" % _column)
+            self._summary_sql[_sql_key] = "SELECT %s FROM %s WHERE %s" % (', '.join(_exprs), _table, _where)
+        
+        _sql = self._summary_sql[_sql_key] % {'start' : start_ts, 'stop' : stop_ts}
+        if cursor:
+            cursor.execute(_sql)
+            _row = cursor.fetchone()
+        else:
+            _row = self.getSql(_sql)
+        return dict(zip(columns, _row))
+
+    def _summaryColumnsOf(self, obs_type):
+        """Returns the columns of the daily summary of an observation type,
+        less dateTime."""
+        if obs_type not in self._summary_columns:
+            self._summary_columns[obs_type] = [_column for _column in 
+                                               self.connection.columnsOf("%s_day_%s" % (self.table_name, obs_type))
+                                               if _column != 'dateTime']
+        return self._summary_columns[obs_type]
+
+    def _invalidate_day_cache(self):
+        """Forget the resident day summary. It will be read from the database
+        when next needed."""
+        self._day_accum = None
+        self._day_accum_lastUpdate = None
             
     def _getLastUpdate(self, cursor=None):
         """Returns the time of the last update to the statistical database."""
@@ -1385,10 +3747,21 @@ class DaySummaryManager(Manager):
     
     def drop_daily(self):
         """Drop the daily summaries."""
+        self._invalidate_day_cache()
+        _all_views = self.connection.views()
         _all_tables = self.connection.tables()
         with weedb.Transaction(self.connection) as _cursor:
+            # With the combined layout, the daily summary of each type is a
+            # view. It must go before the table it looks into:
+            for _view_name in _all_views:
+                if _view_name.startswith('%s_day_' % self.table_name):
+                    _cursor.execute("DROP VIEW %s" % _view_name)
             for _table_name in _all_tables:
-                if _table_name.startswith('%s_day_' % self.table_name):
+                # The month and year summaries go with them:
+                if any(_table_name.startswith('%s_%s_' % (self.table_name, _level)) for _level in DaySummaryManager.rollup_levels):
                     _cursor.execute("DROP TABLE %s" % _table_name)
 
         del self.daykeys
+        del self.rollupkeys
+        self._summary_columns = {}
+        self._summary_sql = {}
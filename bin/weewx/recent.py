@@ -0,0 +1,280 @@
+#
+#    Copyright (c) 2009-2015 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""A ring buffer of the most recent archive records, shared by the services,
+uploaders and report generators of a process, so they need not go back to the
+database for records the process has just written."""
+
+from __future__ import with_statement
+import array
+import threading
+
+import weewx
+
+# Missing values are held as NaN:
+_NaN = float('nan')
+
+class NotHeld(ValueError):
+    """Raised when asking for records that a ring buffer cannot vouch it holds
+    all of."""
+
+class RecentRecords(object):
+    """Holds the archive records of the last so many hours in a ring buffer:
+    an array of fixed length for the timestamps, and another for each
+    observation type. Records are added as they are archived. Aggregates over
+    a window of time, and lookups of a single record, are answered from the
+    buffer as long as it holds every record in the window. Otherwise, NotHeld
+    is raised, and the database must be asked instead.
+
+    The methods can be called from any thread.
+
+    USEFUL ATTRIBUTES
+
+    hours: How many hours of records are held.
+
+    unit_system: The unit system of the records held.
+
+    held_since: All the records stamped later than this are held. None if no
+    record is known to be held yet."""
+
+    # Types whose values are integers:
+    int_types = ['interval']
+
+    def __init__(self, obs_types, hours=25, archive_interval=300):
+        """Initialize an empty buffer. See prime().
+
+        obs_types: The types to be held, usually the columns of the archive
+        table. Types in added records that are not in this list are ignored.
+
+        hours: The number of hours of records to be held. Default is 25, which
+        is enough for a whole day, even one with a change to or from DST.
+
+        archive_interval: The archive interval, in seconds, from which the
+        number of records to be held is worked out. Default is 300."""
+
+        self.hours = hours
+        self.size = int(hours * 3600 // archive_interval) + 1
+        self.obs_types = [_obs_type for _obs_type in obs_types if _obs_type not in ('dateTime', 'usUnits')]
+        self.unit_system = None
+        self.held_since = None
+        self._timestamps = array.array('d', [0.0]) * self.size
+        self._values = dict((_obs_type, array.array('d', [_NaN]) * self.size) for _obs_type in self.obs_types)
+        # The oldest record is at _first, with _count records after it, wrapping around:
+        self._first = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def __str__(self):
+        return "%d of %d records, since %s" % (self._count, self.size, self.held_since)
+
+    def prime(self, dbmanager):
+        """Fill the buffer with the last records in a database.
+
+        dbmanager: A manager of the archive table."""
+
+        _last_ts = dbmanager.lastGoodStamp()
+        with self._lock:
+            self._first = self._count = 0
+            self.unit_system = None
+            if _last_ts is None:
+                # There are no records, so every one to come will be held:
+                self.held_since = 0
+                return
+            self.held_since = _last_ts - self.hours * 3600
+            for _record in dbmanager.genBatchRecords(self.held_since, _last_ts):
+                self._addRecord(_record)
+
+    def addRecord(self, record):
+        """Add an archive record, just as it is added to the database. Records
+        that the database would refuse, because they duplicate the timestamp
+        of another or are in a different unit system, are ignored. A record
+        that arrives out of order cannot be put in its place, so the records
+        before it are no longer held."""
+        with self._lock:
+            self._addRecord(record)
+
+    def getAggregate(self, timespan, obs_type, aggregate_type):
+        """Calculate an aggregate over the records in a window of time,
+        just as the corresponding SQL function would.
+
+        timespan: The window. Records with start < dateTime <= stop are
+        included.
+
+        obs_type: The type to be aggregated, such as 'rain'.
+
+        aggregate_type: One of 'sum', 'count', 'avg', 'min' or 'max'.
+
+        returns: A 2-way tuple (value, unit system).
+
+        raises: NotHeld, if the buffer does not hold every record in the
+        window."""
+
+        if aggregate_type not in RecentRecords.aggregate_fns:
+            raise weewx.ViolatedPrecondition("Invalid aggregation type '%s'" % aggregate_type)
+        with self._lock:
+            _values = [_value for _value in self._genValues(timespan, obs_type) if _value == _value]
+            return (RecentRecords.aggregate_fns[aggregate_type](_values), self.unit_system)
+
+    # How each aggregate is calculated from the values that are not missing:
+    aggregate_fns = {'sum'   : lambda values: sum(values) if values else None,
+                     'count' : len,
+                     'avg'   : lambda values: sum(values) / len(values) if values else None,
+                     'min'   : lambda values: min(values) if values else None,
+                     'max'   : lambda values: max(values) if values else None}
+
+    def getValues(self, timespan, obs_types):
+        """Returns the values of some types, for each record in a window of
+        time.
+
+        timespan: The window. Records with start < dateTime <= stop are
+        included.
+
+        obs_types: A list of the types wanted.
+
+        returns: A list of tuples (dateTime, value, value, ...), with a value
+        for each of obs_types, or None where it is missing.
+
+        raises: NotHeld, if the buffer does not hold every record in the
+        window."""
+
+        with self._lock:
+            _columns = [[_as_value(_value, _obs_type in RecentRecords.int_types)
+                         for _value in self._genValues(timespan, _obs_type)] for _obs_type in obs_types]
+            (_lo, _hi) = self._window(timespan)
+            return [(int(self._timestamps[self._index(_i)]),) + tuple(_column[_i - _lo] for _column in _columns)
+                    for _i in range(_lo, _hi)]
+
+    def getRecord(self, timestamp, max_delta=None):
+        """Get the record nearest in time to a timestamp, as Manager.getRecord()
+        would.
+
+        timestamp: The time of the record.
+
+        max_delta: The largest difference in time that is acceptable. Default
+        is no difference.
+
+        returns: A record dictionary, with all of the types held, or None if
+        there is no such record.
+
+        raises: NotHeld, if the buffer does not hold every record within
+        max_delta of timestamp."""
+
+        _delta = max_delta or 0
+        with self._lock:
+            if self.held_since is None or timestamp - _delta <= self.held_since:
+                raise NotHeld("Records from %s are not held" % (timestamp - _delta))
+            _i = self._bisect(timestamp)
+            _before = _i - 1 if _i > 0 and self._timestamps[self._index(_i - 1)] >= timestamp - _delta else None
+            _after  = _i if _i < self._count and self._timestamps[self._index(_i)] <= timestamp + _delta else None
+            if _before is not None and self._timestamps[self._index(_before)] == timestamp:
+                return self._getRecord(_before)
+            if not max_delta:
+                return None
+            if _before is None or (_after is not None and
+                                   self._timestamps[self._index(_after)] - timestamp < timestamp - self._timestamps[self._index(_before)]):
+                return self._getRecord(_after) if _after is not None else None
+            return self._getRecord(_before)
+
+    def updateValue(self, timestamp, obs_type, new_value):
+        """Update a single value, as it is updated in the database."""
+        with self._lock:
+            _i = self._bisect(timestamp)
+            if _i > 0 and self._timestamps[self._index(_i - 1)] == timestamp and obs_type in self._values:
+                self._values[obs_type][self._index(_i - 1)] = _as_float(new_value)
+
+    def _addRecord(self, record):
+        _ts = record['dateTime']
+        if self.held_since is None or _ts <= self.held_since:
+            return
+        if self.unit_system is None:
+            self.unit_system = record['usUnits']
+        elif record['usUnits'] != self.unit_system:
+            return
+        if self._count and _ts <= self._timestamps[self._index(self._count - 1)]:
+            _i = self._bisect(_ts)
+            if _i == 0 or self._timestamps[self._index(_i - 1)] != _ts:
+                # Out of order. Forget the records up to it:
+                self.held_since = _ts
+                self._first = self._index(_i)
+                self._count -= _i
+            return
+        if self._count == self.size:
+            # Full. Forget the oldest record:
+            self.held_since = int(self._timestamps[self._first])
+            self._first = self._index(1)
+            self._count -= 1
+        _j = self._index(self._count)
+        self._timestamps[_j] = _ts
+        for _obs_type in self.obs_types:
+            self._values[_obs_type][_j] = _as_float(record.get(_obs_type))
+        self._count += 1
+
+    def _getRecord(self, i):
+        _j = self._index(i)
+        _record = {'dateTime' : int(self._timestamps[_j]), 'usUnits' : self.unit_system}
+        for _obs_type in self.obs_types:
+            _record[_obs_type] = _as_value(self._values[_obs_type][_j], _obs_type in RecentRecords.int_types)
+        return _record
+
+    def _genValues(self, timespan, obs_type):
+        """Yields the raw values of a type, NaN where missing, over a window."""
+        if obs_type not in self._values:
+            raise NotHeld("Type '%s' is not held" % obs_type)
+        (_lo, _hi) = self._window(timespan)
+        _values = self._values[obs_type]
+        for _i in xrange(_lo, _hi):
+            yield _values[self._index(_i)]
+
+    def _window(self, timespan):
+        """Returns the range of logical indexes of the records in a window."""
+        if self.held_since is None or timespan[0] < self.held_since:
+            raise NotHeld("Records from %s are not held" % timespan[0])
+        return (self._bisect(timespan[0]), self._bisect(timespan[1]))
+
+    def _index(self, i):
+        """Returns the position in the arrays of the i'th oldest record."""
+        return (self._first + i) % self.size
+
+    def _bisect(self, timestamp):
+        """Returns the number of records stamped at or before a time."""
+        _lo, _hi = 0, self._count
+        while _lo < _hi:
+            _mid = (_lo + _hi) // 2
+            if self._timestamps[self._index(_mid)] <= timestamp:
+                _lo = _mid + 1
+            else:
+                _hi = _mid
+        return _lo
+
+def _as_float(value):
+    try:
+        return float(value) if value is not None else _NaN
+    except (TypeError, ValueError):
+        return _NaN
+
+def _as_value(value, is_int=False):
+    if value != value:
+        return None
+    return int(value) if is_int else value
+
+# The ring buffers of the process, keyed by the table key of the archive
+# table. See weewx.manager.table_key():
+_recent_records = {}
+
+def set_recent_records(table_key, recent_records):
+    """Share a ring buffer of the records of an archive table with everyone
+    in the process reading the table. Use None to withdraw it."""
+    if recent_records is None:
+        _recent_records.pop(table_key, None)
+    else:
+        _recent_records[table_key] = recent_records
+
+def get_recent_records(table_key):
+    """Returns the ring buffer of the records of an archive table, or None if
+    there is none."""
+    return _recent_records.get(table_key)
@@ -75,6 +75,11 @@ class StdReportEngine(threading.Thread):
         else:
             syslog.syslog(syslog.LOG_DEBUG, "reportengine: Running reports for latest time in the database.")
 
+        # Different reports, templates, and plots often ask for the same
+        # aggregates. Share them between all the generators of this run:
+        aggregate_cache = weewx.manager.AggregateCache(
+            int(self.config_dict['StdReport'].get('aggregate_cache_size', 2000)))
+
         # Iterate over each requested report
         for report in self.config_dict['StdReport'].sections:
             
@@ -132,6 +137,8 @@ class StdReportEngine(threading.Thread):
                     traceback.print_exc()
                     continue
     
+                obj.db_binder.set_aggregate_cache(aggregate_cache)
+
                 try:
                     # Call its start() method
                     obj.start()
@@ -147,6 +154,10 @@ class StdReportEngine(threading.Thread):
                     
                 finally:
                     obj.finalize()
+
+        syslog.syslog(syslog.LOG_DEBUG, "reportengine: Aggregate cache: %s" % aggregate_cache)
+        if weewx.manager.get_manager_pool() is not None:
+            syslog.syslog(syslog.LOG_DEBUG, "reportengine: Manager pool: %s" % weewx.manager.get_manager_pool())
         
 #===============================================================================
 #                    Class ReportGenerator
@@ -161,8 +172,10 @@ class ReportGenerator(object):
         self.gen_ts      = gen_ts
         self.first_run   = first_run
         self.stn_info    = stn_info
+        # Generators only read the databases:
         self.db_binder   = weewx.manager.DBBinder(self.config_dict['DataBindings'],
-                                                  self.config_dict['Databases'])
+                                                  self.config_dict['Databases'],
+                                                  read_only=True)
         
     def start(self):
         self.run()
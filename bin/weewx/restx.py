@@ -86,6 +86,7 @@ import weeutil.weeutil
 import weewx.engine
 from weeutil.weeutil import to_int, to_float, to_bool, timestamp_to_string, accumulateLeaves
 import weewx.manager
+import weewx.recent
 import weewx.units
 
 class FailedPost(IOError):
@@ -223,9 +224,7 @@ class RESTThread(threading.Thread):
                 # Presumably, this is exclusive of the archive record 60 minutes
                 # before, so the SQL statement is exclusive on the left, inclusive
                 # on the right.
-                _result = dbmanager.getSql("SELECT SUM(rain), MIN(usUnits), MAX(usUnits) FROM %s "
-                                         "WHERE dateTime>? AND dateTime<=?" % dbmanager.table_name,
-                                         (_time_ts - 3600.0, _time_ts))
+                _result = self._get_rain(dbmanager, _time_ts - 3600.0, _time_ts)
                 if _result is not None and _result[0] is not None:
                     if not _result[1] == _result[2] == record['usUnits']:
                         raise ValueError("Inconsistent units (%s vs %s vs %s) when querying for hourRain" %
@@ -236,9 +235,7 @@ class RESTThread(threading.Thread):
     
             if not _datadict.has_key('rain24'):
                 # Similar issue, except for last 24 hours:
-                _result = dbmanager.getSql("SELECT SUM(rain), MIN(usUnits), MAX(usUnits) FROM %s "
-                                         "WHERE dateTime>? AND dateTime<=?" % dbmanager.table_name,
-                                         (_time_ts - 24*3600.0, _time_ts))
+                _result = self._get_rain(dbmanager, _time_ts - 24*3600.0, _time_ts)
                 if _result is not None and _result[0] is not None:
                     if not _result[1] == _result[2] == record['usUnits']:
                         raise ValueError("Inconsistent units (%s vs %s vs %s) when querying for rain24" %
@@ -251,11 +248,9 @@ class RESTThread(threading.Thread):
                 # NB: The WU considers the archive with time stamp 00:00
                 # (midnight) as (wrongly) belonging to the current day
                 # (instead of the previous day). But, it's their site,
-                # so we'll do it their way.  That means the SELECT statement
-                # is inclusive on both time ends:
-                _result = dbmanager.getSql("SELECT SUM(rain), MIN(usUnits), MAX(usUnits) FROM %s "
-                                         "WHERE dateTime>=? AND dateTime<=?" % dbmanager.table_name, 
-                                         (_sod_ts, _time_ts))
+                # so we'll do it their way.  That means the sum is inclusive
+                # on both time ends:
+                _result = self._get_rain(dbmanager, _sod_ts - 1, _time_ts)
                 if _result is not None and _result[0] is not None:
                     if not _result[1] == _result[2] == record['usUnits']:
                         raise ValueError("Inconsistent units (%s vs %s vs %s) when querying for dayRain" %
@@ -269,15 +264,31 @@ class RESTThread(threading.Thread):
             
         return _datadict
 
+    def _get_rain(self, dbmanager, start_ts, stop_ts):
+        """Returns the sum of the rain in the records with start_ts < dateTime
+        <= stop_ts, as a 3-way tuple (sum, minimum usUnits, maximum usUnits).
+        The records just archived are summed in memory, if they are still
+        held there, rather than in the database."""
+        _recent = weewx.recent.get_recent_records(dbmanager.table_key)
+        if _recent is not None:
+            try:
+                (_sum, _unit_system) = _recent.getAggregate((start_ts, stop_ts), 'rain', 'sum')
+                return (_sum, _unit_system, _unit_system)
+            except weewx.recent.NotHeld:
+                pass
+        return dbmanager.getSql("SELECT SUM(rain), MIN(usUnits), MAX(usUnits) FROM %s "
+                                "WHERE dateTime>? AND dateTime<=?" % dbmanager.table_name,
+                                (start_ts, stop_ts))
+
     def run(self):
-        """If there is a database specified, open the database, then call
-        run_loop() with the database.  If no database is specified, simply
-        call run_loop()."""
+        """If there is a database specified, and no pool of managers to check
+        one out of for each record, open the database, then call run_loop()
+        with the database.  Otherwise, simply call run_loop()."""
         
         # Open up the archive. Use a 'with' statement. This will automatically
         # close the archive in the case of an exception:
-        if self.manager_dict is not None:
-            with weewx.manager.open_manager(self.manager_dict) as _manager:
+        if self.manager_dict is not None and weewx.manager.get_manager_pool() is None:
+            with weewx.manager.open_manager(self.manager_dict, read_only=True) as _manager:
                 self.run_loop(_manager)
         else:
             self.run_loop()
@@ -285,6 +296,10 @@ class RESTThread(threading.Thread):
     def run_loop(self, dbmanager=None):
         """Runs a continuous loop, waiting for records to appear in the queue,
         then processing them.
+        
+        dbmanager: The manager to process the records with. If None, and
+        there is a database specified, a manager is checked out of the pool
+        for each record, and handed back once it has been processed.
         """
         
         while True :
@@ -305,7 +320,11 @@ class RESTThread(threading.Thread):
             try:
                 # Process the record, using whatever method the specializing
                 # class provides
-                self.process_record(_record, dbmanager)
+                if dbmanager is None and self.manager_dict is not None:
+                    with weewx.manager.pooled_manager(self.manager_dict, read_only=True) as _manager:
+                        self.process_record(_record, _manager)
+                else:
+                    self.process_record(_record, dbmanager)
             except BadLogin, e:
                 syslog.syslog(syslog.LOG_ERR, "restx: %s: bad login; "
                               "waiting 60 minutes then retrying" % self.protocol_name)
@@ -48,6 +48,8 @@ class TimeBinder(object):
         self.formatter    = formatter
         self.converter    = converter
         self.option_dict  = option_dict
+        # Aggregates calculated so far. Shared by all the binders that descend from me:
+        self.summaries    = {}
 
     # What follows is the list of time period attributes:
     
@@ -77,14 +79,14 @@ class TimeBinder(object):
         return TimespanBinder(weeutil.weeutil.archiveHoursAgoSpan(self.report_time, hours_ago=hours_ago), 
                               self.db_lookup, data_binding=data_binding, 
                               context='day', formatter=self.formatter, converter=self.converter,
-                              **self.option_dict)
+                              summaries=self.summaries, **self.option_dict)
     def hour(self, data_binding=None):
         return self.hours_ago(data_binding)
     def day(self, data_binding=None):
         return TimespanBinder(weeutil.weeutil.archiveDaySpan(self.report_time), 
                               self.db_lookup, data_binding=data_binding, 
                               context='day', formatter=self.formatter, converter=self.converter,
-                              **self.option_dict)
+                              summaries=self.summaries, **self.option_dict)
     def yesterday(self, data_binding=None):
         return self.days_ago(data_binding, days_ago=1)
     
@@ -92,29 +94,29 @@ class TimeBinder(object):
         return TimespanBinder(weeutil.weeutil.archiveDaysAgoSpan(self.report_time, days_ago=days_ago), 
                               self.db_lookup, data_binding=data_binding, 
                               context='day', formatter=self.formatter, converter=self.converter,
-                              **self.option_dict)
+                              summaries=self.summaries, **self.option_dict)
     def week(self, data_binding=None):
         week_start = to_int(self.option_dict.get('week_start', 6))
         return TimespanBinder(weeutil.weeutil.archiveWeekSpan(self.report_time, week_start),
                               self.db_lookup, data_binding=data_binding,
                               context='week', formatter=self.formatter, converter=self.converter,
-                              **self.option_dict)
+                              summaries=self.summaries, **self.option_dict)
     def month(self, data_binding=None):
         return TimespanBinder(weeutil.weeutil.archiveMonthSpan(self.report_time),
                               self.db_lookup, data_binding=data_binding,
-                              context='month', formatter=self.formatter, converter=self.converter, 
-                              **self.option_dict)
+                              context='month', formatter=self.formatter, converter=self.converter,
+                              summaries=self.summaries, **self.option_dict)
     def year(self, data_binding=None):
         return TimespanBinder(weeutil.weeutil.archiveYearSpan(self.report_time),
                               self.db_lookup, data_binding=data_binding,
                               context='year', formatter=self.formatter, converter=self.converter,
-                              **self.option_dict)
+                              summaries=self.summaries, **self.option_dict)
     def rainyear(self, data_binding=None):
         rain_year_start = to_int(self.option_dict.get('rain_year_start', 1))
         return TimespanBinder(weeutil.weeutil.archiveRainYearSpan(self.report_time, rain_year_start),
                               self.db_lookup, data_binding=data_binding,
-                              context='rainyear',  formatter=self.formatter, converter=self.converter, 
-                              **self.option_dict)
+                              context='rainyear',  formatter=self.formatter, converter=self.converter,
+                              summaries=self.summaries, **self.option_dict)
 
 
 #===============================================================================
@@ -141,7 +143,7 @@ class TimespanBinder(object):
     """
     def __init__(self, timespan, db_lookup, data_binding=None, context='current',
                  formatter=weewx.units.Formatter(),
-                 converter=weewx.units.Converter(), **option_dict):
+                 converter=weewx.units.Converter(), summaries=None, **option_dict):
         """Initialize an instance of TimespanBinder.
 
         timespan: An instance of weeutil.Timespan with the time span
@@ -165,6 +167,10 @@ class TimespanBinder(object):
         information to be used. [Optional. If not given, the default
         Converter will be used.]
 
+        summaries: A dictionary holding the aggregates calculated so far. It
+        can be shared between binders, so that each gets calculated only once.
+        [Optional. If not given, a new dictionary will be used.]
+
         option_dict: Other options which can be used to customize calculations.
         [Optional.]
         """
@@ -175,25 +181,29 @@ class TimespanBinder(object):
         self.context     = context
         self.formatter   = formatter
         self.converter   = converter
+        self.summaries   = summaries if summaries is not None else {}
         self.option_dict = option_dict
 
     # Iterate over days in the time period:
     def days(self, data_binding=None):
         return TimespanBinder._seqGenerator(weeutil.weeutil.genDaySpans, self.timespan,
                                             self.db_lookup, data_binding,
-                                            'day', self.formatter, self.converter, **self.option_dict)
+                                            'day', self.formatter, self.converter,
+                                            summaries=self.summaries, **self.option_dict)
 
     # Iterate over months in the time period:
     def months(self, data_binding=None):
         return TimespanBinder._seqGenerator(weeutil.weeutil.genMonthSpans, self.timespan,
                                             self.db_lookup, data_binding,
-                                            'month', self.formatter, self.converter, **self.option_dict)
+                                            'month', self.formatter, self.converter,
+                                            summaries=self.summaries, **self.option_dict)
 
     # Iterate over years in the time period:
     def years(self, data_binding=None):
         return TimespanBinder._seqGenerator(weeutil.weeutil.genYearSpans, self.timespan,
                                             self.db_lookup, data_binding,
-                                            'year', self.formatter, self.converter, **self.option_dict)
+                                            'year', self.formatter, self.converter,
+                                            summaries=self.summaries, **self.option_dict)
 
     # Static method used to implement the iteration:
     @staticmethod
@@ -223,7 +233,7 @@ class TimespanBinder(object):
         # Return an ObservationBinder: if an attribute is
         # requested from it, an aggregation value will be returned.
         return ObservationBinder(obs_type, self.timespan, self.db_lookup, self.data_binding, self.context,
-                                 self.formatter, self.converter, **self.option_dict)
+                                 self.formatter, self.converter, summaries=self.summaries, **self.option_dict)
 
 #===============================================================================
 #                    Class ObservationBinder
@@ -238,7 +248,8 @@ class ObservationBinder(object):
     """
 
     def __init__(self, obs_type, timespan, db_lookup, data_binding, context,
-                 formatter=weewx.units.Formatter(), converter=weewx.units.Converter(), **option_dict):
+                 formatter=weewx.units.Formatter(), converter=weewx.units.Converter(),
+                 summaries=None, **option_dict):
         """ Initialize an instance of ObservationBinder
 
         obs_type: A string with the stats type (e.g., 'outTemp') for which the query is
@@ -264,6 +275,10 @@ class ObservationBinder(object):
         information to be used. [Optional. If not given, the default
         Converter will be used.]
 
+        summaries: A dictionary holding the aggregates calculated so far. It
+        can be shared between binders, so that each gets calculated only once.
+        [Optional. If not given, a new dictionary will be used.]
+
         option_dict: Other options which can be used to customize calculations.
         [Optional.]
         """
@@ -275,6 +290,7 @@ class ObservationBinder(object):
         self.context      = context
         self.formatter    = formatter
         self.converter    = converter
+        self.summaries    = summaries if summaries is not None else {}
         self.option_dict  = option_dict
 
     def max_ge(self, val):
@@ -318,6 +334,15 @@ class ObservationBinder(object):
     def _do_query(self, aggregate_type, val=None):
         """Run a query against the databases, using the given aggregation type."""
         db_manager = self.db_lookup(self.data_binding)
+        if aggregate_type in db_manager.summary_types:
+            # Chances are other aggregates of this type will be wanted as well.
+            # They can all be had for the price of one, so get them together:
+            key = (self.data_binding, self.timespan, self.obs_type)
+            if key not in self.summaries:
+                self.summaries[key] = db_manager.getAggregates(self.timespan, self.obs_type)
+            result = self.summaries[key].get(aggregate_type)
+            if result is not None:
+                return weewx.units.ValueHelper(result, self.context, self.formatter, self.converter)
         result = db_manager.getAggregate(self.timespan, self.obs_type, aggregate_type, 
                                          val=val, **self.option_dict)
         return weewx.units.ValueHelper(result, self.context, self.formatter, self.converter)
@@ -64,7 +64,42 @@ class AccumTest(unittest.TestCase):
         
         self.assertEqual(ss.sum, 2*tsum)
         self.assertEqual(ss.count, 2*tcount)
-        
+
+    def test_dirty(self):
+
+        # Stats that have never been set are dirty:
+        ss = weewx.accum.ScalarStats()
+        self.assertTrue(ss.dirty)
+
+        # Stats set from a stats-tuple are clean:
+        ss.setStats((10.0, start_ts, 20.0, start_ts, 30.0, 2, 30.0, 2))
+        self.assertFalse(ss.dirty)
+
+        # A value between the high and low changes only 'last'. Still clean:
+        ss.addHiLo(15.0, stop_ts)
+        self.assertFalse(ss.dirty)
+        self.assertEqual(ss.last, 15.0)
+
+        # A new high makes it dirty:
+        ss.addHiLo(25.0, stop_ts)
+        self.assertTrue(ss.dirty)
+
+        ss.setStats(ss.getStatsTuple())
+        self.assertFalse(ss.dirty)
+        # So does adding to the sum:
+        ss.addSum(15.0)
+        self.assertTrue(ss.dirty)
+
+        # Same thing for vectors:
+        vs = weewx.accum.VecStats()
+        self.assertTrue(vs.dirty)
+        vs.setStats(vs.getStatsTuple())
+        self.assertFalse(vs.dirty)
+        vs.addHiLo((None, None), stop_ts)
+        self.assertFalse(vs.dirty)
+        vs.addSum((5.0, 90.0))
+        self.assertTrue(vs.dirty)
+
 if __name__ == '__main__':
     unittest.main()
             
@@ -19,6 +19,7 @@ import configobj
 
 os.environ['TZ'] = 'America/Los_Angeles'
 
+import weedb
 import weeutil.weeutil
 import weewx.tags
 import gen_fake_data
@@ -278,9 +279,198 @@ class Common(unittest.TestCase):
                     # Get the answer using the raw archive  table:
                     table_answer = ValueHelper(weewx.manager.Manager.getAggregate(manager, day_span, 'outTemp', aggregation))
                     daily_answer = ValueHelper(weewx.manager.DaySummaryManager.getAggregate(manager, day_span, 'outTemp', aggregation))
-                    self.assertEqual(str(table_answer), str(daily_answer), 
+                    self.assertEqual(str(table_answer), str(daily_answer),
                                      msg="aggregation=%s; %s vs %s" % (aggregation, table_answer, daily_answer))
-            
+
+    def test_agg_partners(self):
+        """Test that a value and its time are found together, and that the
+        second is served from the cache"""
+
+        # Spans that do, and do not, sit on midnight boundaries:
+        spans = [weeutil.weeutil.TimeSpan(time.mktime((2010,3,14,1,0,0,0,0,-1)),
+                                          time.mktime((2010,3,14,8,0,0,0,0,-1))),
+                 weeutil.weeutil.TimeSpan(time.mktime((2010,3,14,0,0,0,0,0,-1)),
+                                          time.mktime((2010,3,21,0,0,0,0,0,-1)))]
+
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            for span in spans:
+                # Find the answers the long way:
+                records = [(rec['dateTime'], rec['outTemp'])
+                           for rec in manager.genBatchRecords(span.start, span.stop)
+                           if rec['dateTime'] > span.start and rec['outTemp'] is not None]
+                expected = {'min'      : min(r[1] for r in records),
+                            'max'      : max(r[1] for r in records),
+                            'last'     : records[-1][1],
+                            'lasttime' : records[-1][0]}
+                expected['mintime'] = min(r[0] for r in records if r[1] == expected['min'])
+                expected['maxtime'] = min(r[0] for r in records if r[1] == expected['max'])
+
+                manager.aggregate_cache = weewx.manager.AggregateCache()
+                for aggregation in ['min', 'mintime', 'max', 'maxtime', 'last', 'lasttime']:
+                    self.assertEqual(manager.getAggregate(span, 'outTemp', aggregation)[0], expected[aggregation],
+                                     msg="aggregation=%s" % aggregation)
+                # The second of each pair was found by the query for the first:
+                self.assertEqual(manager.aggregate_cache.misses, 3)
+                self.assertEqual(manager.aggregate_cache.hits, 3)
+                manager.aggregate_cache = None
+
+    def test_agg_hybrid(self):
+        """Test aggregation over spans that do not sit on midnight boundaries"""
+
+        # A week that starts and stops in the middle of the day,
+        # then one that only stops in the middle of the day:
+        spans = [weeutil.weeutil.TimeSpan(time.mktime((2010,3,10,6,20,0,0,0,-1)),
+                                          time.mktime((2010,3,17,15,40,0,0,0,-1))),
+                 weeutil.weeutil.TimeSpan(time.mktime((2010,3,10,0,0,0,0,0,-1)),
+                                          time.mktime((2010,3,17,15,40,0,0,0,-1)))]
+
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            for span in spans:
+                for obs_type in ['outTemp', 'rain']:
+                    for aggregation in ['min', 'max', 'mintime', 'maxtime', 'sum', 'count', 'avg']:
+                        # Get the answer using the raw archive  table:
+                        table_answer = ValueHelper(weewx.manager.Manager.getAggregate(manager, span, obs_type, aggregation))
+                        hybrid_answer = ValueHelper(manager.getAggregate(span, obs_type, aggregation))
+                        self.assertEqual(str(table_answer), str(hybrid_answer),
+                                         msg="type=%s; aggregation=%s; %s vs %s" % (obs_type, aggregation, table_answer, hybrid_answer))
+
+    def test_rollups(self):
+        """Test aggregation using the month and year summaries"""
+
+        spans = [weeutil.weeutil.TimeSpan(time.mktime((2010,1,1,0,0,0,0,0,-1)),
+                                          time.mktime((2011,1,1,0,0,0,0,0,-1))),
+                 weeutil.weeutil.TimeSpan(time.mktime((2009,12,20,0,0,0,0,0,-1)),
+                                          time.mktime((2010,4,15,0,0,0,0,0,-1))),
+                 weeutil.weeutil.TimeSpan(time.mktime((2010,3,1,0,0,0,0,0,-1)),
+                                          time.mktime((2010,4,1,0,0,0,0,0,-1)))]
+
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            spans.append(weeutil.weeutil.TimeSpan(manager.first_timestamp, manager.last_timestamp))
+            # Get the answers using only the daily summaries first:
+            manager.drop_rollups()
+            daily_answers = [str(ValueHelper(manager.getAggregate(span, obs_type, aggregation)))
+                             for span in spans for obs_type in ['outTemp', 'rain', 'wind']
+                             for aggregation in ['min', 'max', 'mintime', 'maxtime', 'sum', 'count', 'avg']]
+            wind_answers = [str(ValueHelper(manager.getAggregate(span, 'wind', aggregation)))
+                            for span in spans for aggregation in ['gustdir', 'rms', 'vecavg', 'vecdir']]
+
+            manager.add_rollups()
+            try:
+                self.assertItemsEqual(manager.rollupkeys, manager.daykeys)
+                rollup_answers = [str(ValueHelper(manager.getAggregate(span, obs_type, aggregation)))
+                                  for span in spans for obs_type in ['outTemp', 'rain', 'wind']
+                                  for aggregation in ['min', 'max', 'mintime', 'maxtime', 'sum', 'count', 'avg']]
+                self.assertEqual(rollup_answers, daily_answers)
+                rollup_answers = [str(ValueHelper(manager.getAggregate(span, 'wind', aggregation)))
+                                  for span in spans for aggregation in ['gustdir', 'rms', 'vecavg', 'vecdir']]
+                self.assertEqual(rollup_answers, wind_answers)
+            finally:
+                manager.drop_rollups()
+
+    def test_combined(self):
+        """Test the combined layout of the daily summaries against a table for each type"""
+
+        sod = time.mktime((2010,3,15,0,0,0,0,0,-1))
+        spans = [weeutil.weeutil.TimeSpan(time.mktime((2010,3,14,0,0,0,0,0,-1)),
+                                          time.mktime((2010,3,21,0,0,0,0,0,-1))),
+                 weeutil.weeutil.TimeSpan(time.mktime((2010,3,10,6,20,0,0,0,-1)),
+                                          time.mktime((2010,3,17,15,40,0,0,0,-1)))]
+
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            def get_answers():
+                return [str(ValueHelper(manager.getAggregate(span, obs_type, aggregation)))
+                        for span in spans for obs_type in ['outTemp', 'rain', 'windSpeed']
+                        for aggregation in ['min', 'maxtime', 'sum', 'avg']] + \
+                       [str(ValueHelper(manager.getAggregate(spans[0], 'wind', aggregation)))
+                        for aggregation in ['meanmax', 'gustdir', 'vecavg']]
+            def get_day(sod):
+                manager._invalidate_day_cache()
+                day_accum = manager._get_day_summary(sod)
+                return dict((obs_type, day_accum[obs_type].getStatsTuple()) for obs_type in manager.daykeys)
+
+            split_answers = get_answers()
+            split_day = get_day(sod)
+            columns = manager.connection.columnsOf('archive_day_wind')
+
+            self.assertTrue(manager.combine_daily())
+            try:
+                self.assertFalse(manager.combine_daily())
+                self.assertEqual(manager.day_layout, 'combined')
+                self.assertEqual(manager.connection.columnsOf('archive_day_wind'), columns)
+                self.assertEqual(get_day(sod), split_day)
+                self.assertEqual(get_answers(), split_answers)
+                # Write a day back, then read it again:
+                day_accum = manager._get_day_summary(sod)
+                day_accum.unit_system = manager.std_unit_system
+                for obs_type in day_accum:
+                    day_accum[obs_type].dirty = True
+                with weedb.Transaction(manager.connection) as cursor:
+                    manager._set_day_summary(day_accum, manager._getLastUpdate(), cursor)
+                self.assertEqual(get_day(sod), split_day)
+                # A new manager should see the same layout and types:
+                with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager2:
+                    self.assertEqual(manager2.day_layout, 'combined')
+                    self.assertItemsEqual(manager2.daykeys, manager.daykeys)
+            finally:
+                self.assertTrue(manager.split_daily())
+
+            self.assertEqual(manager.day_layout, 'split')
+            self.assertEqual(manager.connection.columnsOf('archive_day_wind'), columns)
+            self.assertEqual(get_day(sod), split_day)
+            self.assertEqual(get_answers(), split_answers)
+
+    def test_backfill(self):
+        """Test rebuilding the daily summaries in worker processes, after an interruption"""
+
+        def get_summaries(manager):
+            return dict((obs_type, list(manager.genSql("SELECT * FROM archive_day_%s ORDER BY dateTime" % obs_type)))
+                        for obs_type in manager.daykeys)
+
+        database_dict = weewx.manager.get_manager_dict(self.config_dict['DataBindings'],
+                                                       self.config_dict['Databases'], 'wx_binding')['database_dict']
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            summaries = get_summaries(manager)
+            nrecs = manager.getAggregate(weeutil.weeutil.TimeSpan(manager.first_timestamp - 1, manager.last_timestamp), 'dateTime', 'count')[0]
+            # Interrupt the backfill partway through a day:
+            stop_ts = manager.first_timestamp + 40 * 24 * 3600 + 5 * 3600
+            manager.drop_daily()
+
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding', initialize=True) as manager:
+            (nrecs1, _) = manager.backfill_day_summary(stop_ts=stop_ts, progress_fn=None)
+            self.assertEqual(manager._getLastUpdate(), stop_ts)
+            (nrecs2, _) = manager.backfill_day_summary(progress_fn=None, processes=2, database_dict=database_dict)
+            self.assertEqual(nrecs1 + nrecs2, nrecs)
+            self.assertEqual(get_summaries(manager), summaries)
+            # Nothing left to do:
+            self.assertEqual(manager.backfill_day_summary(progress_fn=None), (0, 0))
+
+    def test_getAggregates(self):
+        """Test getting several aggregates at once against getting them one at a time"""
+
+        spans = [weeutil.weeutil.TimeSpan(time.mktime((2010,3,14,0,0,0,0,0,-1)),
+                                          time.mktime((2010,3,21,0,0,0,0,0,-1))),
+                 weeutil.weeutil.TimeSpan(time.mktime((2010,3,10,6,20,0,0,0,-1)),
+                                          time.mktime((2010,3,17,15,40,0,0,0,-1))),
+                 weeutil.weeutil.TimeSpan(time.mktime((2010,3,14,1,0,0,0,0,-1)),
+                                          time.mktime((2010,3,14,8,0,0,0,0,-1)))]
+
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            for span in spans:
+                # With no list of aggregates, all those that can be had from a summary are returned:
+                all_answers = manager.getAggregates(span, 'outTemp')
+                self.assertItemsEqual(all_answers.keys(), weewx.manager.Manager.summary_types)
+                # Ask for a mix of summary and other aggregates:
+                answers = manager.getAggregates(span, 'outTemp', ['min', 'maxtime', 'avg', 'last'])
+                for aggregation in ['min', 'maxtime', 'avg', 'last']:
+                    single_answer = ValueHelper(manager.getAggregate(span, 'outTemp', aggregation))
+                    self.assertEqual(str(ValueHelper(answers[aggregation])), str(single_answer),
+                                     msg="aggregation=%s; %s vs %s" % (aggregation, answers[aggregation], single_answer))
+                    if aggregation in all_answers:
+                        self.assertEqual(all_answers[aggregation], answers[aggregation])
+
+            # Heating degree days cannot be summarized:
+            self.assertEqual(manager.getAggregates(spans[0], 'heatdeg'), {})
+
     def test_rainYear(self):
         db_binder = weewx.manager.DBBinder(self.config_dict['DataBindings'], 
                                            self.config_dict['Databases'])
@@ -328,7 +518,7 @@ class TestMySQL(Common):
     
 def suite():
     tests = ['test_create_stats', 'testScalarTally', 'testWindTally', 
-             'testTags', 'test_rainYear', 'test_agg_intervals', 'test_agg', 'test_heatcool']
+             'testTags', 'test_rainYear', 'test_agg_intervals', 'test_agg', 'test_agg_partners', 'test_agg_hybrid', 'test_rollups', 'test_combined', 'test_backfill', 'test_getAggregates', 'test_heatcool']
     
     # Test both sqlite and MySQL:
     return unittest.TestSuite(map(TestSqlite, tests) + map(TestMySQL, tests))
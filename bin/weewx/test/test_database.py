@@ -6,6 +6,8 @@
 #
 """Test archive and stats database modules"""
 from __future__ import with_statement
+import math
+import threading
 import unittest
 import time
 
@@ -56,6 +58,47 @@ def genRecords():
         _record = expected_record(irec)
         yield _record
 
+wind_schema = archive_schema + [('windDir', 'REAL'), ('windGust', 'REAL'), ('windGustDir', 'REAL')]
+
+def genWindRecords():
+    """Records every 10 minutes, with calms, missing values, directions that
+    repeat, and a gap of five hours without any records."""
+    for ts in range(start_ts + 600, stop_ts + 1, 600):
+        i = (ts - start_ts) // 600
+        if 100 <= i < 130:
+            continue
+        _record = {'dateTime': ts, 'interval': 10, 'usUnits': 1,
+                   'windSpeed': float(i % 7) if i % 11 else None,
+                   'windDir': float((i * 45) % 360) if i % 13 else None,
+                   'windGust': float(i % 7 + i % 3) if i % 17 else None,
+                   'windGustDir': float((i * 30) % 360) if i % 19 else None}
+        yield _record
+
+def windvec_by_interval(records, timespan, mag_type, dir_type, aggregate_type, aggregate_interval):
+    """Aggregate the wind vectors of records, one interval at a time."""
+    def vec(mag, direction):
+        return complex(mag * math.cos(math.radians(90.0 - direction)),
+                       mag * math.sin(math.radians(90.0 - direction))) if direction is not None else complex(0.0, 0.0)
+    start_vec, stop_vec, data_vec = [], [], []
+    for stamp in weeutil.weeutil.intervalgen(timespan[0], timespan[1], aggregate_interval):
+        good = [(rec[mag_type], rec[dir_type]) for rec in records
+                if stamp.start < rec['dateTime'] <= stamp.stop and rec[mag_type] is not None
+                and (rec[mag_type] == 0.0 or rec[dir_type] is not None)]
+        if not good:
+            continue
+        start_vec.append(stamp.start)
+        stop_vec.append(stamp.stop)
+        if aggregate_type == 'count':
+            data_vec.append(len(good))
+        elif aggregate_type == 'min':
+            data_vec.append(vec(*min(good, key=lambda g: g[0])))
+        elif aggregate_type == 'max':
+            data_vec.append(vec(*max(good, key=lambda g: g[0])))
+        else:
+            total = sum((vec(*g) for g in good if g[0] > 0.0), complex(0.0, 0.0))
+            data_vec.append(total if aggregate_type == 'sum' else total / len(good))
+    return (start_vec, stop_vec, data_vec)
+
 #for rec in genRecords():
 #    print weeutil.weeutil.timestamp_to_string(rec['dateTime']), rec
 #time.sleep(0.5)
@@ -132,6 +175,32 @@ class Common(unittest.TestCase):
             metric_record = {'dateTime': stop_ts + interval, 'interval': interval, 'usUnits' : 16, 'outTemp': 20.0}
             self.assertRaises(weewx.UnitError, archive.addRecord, metric_record)
 
+    def test_add_batch_with_duplicate(self):
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
+            archive.addRecord(expected_record(nrecs/2))
+            # Adding a batch that includes an existing record should add all the others:
+            archive.addRecord(genRecords(), quiet=True)
+            self.assertEqual(archive.getSql("SELECT COUNT(*) FROM archive")[0], nrecs)
+            self.assertEqual(archive.first_timestamp, start_ts)
+            self.assertEqual(archive.last_timestamp, stop_ts)
+            for (irec, _rec) in enumerate(archive.genBatchRecords()):
+                self.assertEqual(_rec['outTemp'], temperfunc(irec))
+
+    def test_day_summary_two_writers(self):
+        with weewx.manager.DaySummaryManager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive1:
+            with weewx.manager.DaySummaryManager.open(self.archive_db_dict) as archive2:
+                # Interleave the records between the two managers. Each must
+                # notice what the other has added to the day's summary:
+                archive1.addRecord(expected_record(1))
+                archive2.addRecord(expected_record(2))
+                archive1.addRecord(expected_record(3))
+                archive2.addRecord(expected_record(4))
+            sod_ts = weeutil.weeutil.startOfArchiveDay(timefunc(1))
+            day_summary = archive1._get_day_summary(sod_ts)
+            self.assertEqual(day_summary['outTemp'].count, 4)
+            self.assertEqual(day_summary['outTemp'].min, temperfunc(1))
+            self.assertEqual(day_summary['outTemp'].max, temperfunc(4))
+
     def test_get_records(self):
         # Add a bunch of records:
         with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
@@ -183,6 +252,22 @@ class Common(unittest.TestCase):
             _rec = archive.getRecord(target_ts, max_delta=interval/50)
             self.assertEqual(_rec, None)
 
+            # With neighbors on both sides, the nearer one wins, or the earlier one in a tie:
+            for (offset, irec) in [(interval/3, nrecs/2), (2*interval/3, nrecs/2+1), (interval/2, nrecs/2)]:
+                _rec = archive.getRecord(timevec[nrecs/2] + offset, max_delta=interval)
+                self.assertEqual(_rec['dateTime'], timevec[irec])
+
+            # Records come from a cache, but changing one must not change the cache:
+            _rec = archive.getRecord(timevec[nrecs/2], max_delta=interval)
+            _rec['outTemp'] = None
+            self.assertEqual(archive.getRecord(timevec[nrecs/2], max_delta=interval)['outTemp'], temperfunc(nrecs/2))
+            # Nor must it hide changes to the table:
+            archive.updateValue(timevec[nrecs/2], 'outTemp', -10.0)
+            self.assertEqual(archive.getRecord(timevec[nrecs/2], max_delta=interval)['outTemp'], -10.0)
+            self.assertEqual(archive.getRecord(stop_ts + interval/3 * 2, max_delta=interval)['dateTime'], stop_ts)
+            archive.addRecord(expected_record(nrecs))
+            self.assertEqual(archive.getRecord(stop_ts + interval/3 * 2, max_delta=interval)['dateTime'], timefunc(nrecs))
+
             # Try finding a non-existent record:
             target_ts = timevec[nrecs/2] + 1
             _rec = archive.getRecord(target_ts)
@@ -215,6 +300,391 @@ class Common(unittest.TestCase):
                 # Compare them.
                 self.assertAlmostEqual(expected_avg, barvec[2][0][irec])
 
+    def test_grouped_aggregation(self):
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
+            archive.addRecord(genRecords())
+
+        # Calculate the aggregates both with the grouped queries, and one interval at a time.
+        # The results should be identical.
+        saved_dbtypes = weewx.manager.Manager.grouped_dbtypes
+        try:
+            with weewx.manager.Manager.open(self.archive_db_dict) as archive:
+                for aggregate_type in ['avg', 'min', 'max', 'sum', 'last']:
+                    for aggregate_interval in [3*interval, 5*interval, 24*interval]:
+                        weewx.manager.Manager.grouped_dbtypes = [archive.connection.dbtype]
+                        grouped = archive.getSqlVectors((start_ts - interval, stop_ts), 'barometer',
+                                                        aggregate_type, aggregate_interval)
+                        weewx.manager.Manager.grouped_dbtypes = []
+                        single = archive.getSqlVectors((start_ts - interval, stop_ts), 'barometer',
+                                                       aggregate_type, aggregate_interval)
+                        self.assertEqual(grouped, single)
+        finally:
+            weewx.manager.Manager.grouped_dbtypes = saved_dbtypes
+
+    def test_windvec(self):
+        records = list(genWindRecords())
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=wind_schema) as archive:
+            archive.addRecord(records)
+            for (obs_type, mag_type, dir_type) in [('windvec', 'windSpeed', 'windDir'),
+                                                   ('windgustvec', 'windGust', 'windGustDir')]:
+                for timespan in [(start_ts, stop_ts), (start_ts + 1234, stop_ts - 4321), (start_ts + 16*3600, start_ts + 23*3600)]:
+                    for aggregate_type in ['sum', 'count', 'avg', 'max', 'min']:
+                        for aggregate_interval in [1800, 3*interval, 24*interval]:
+                            expected = windvec_by_interval(records, timespan, mag_type, dir_type,
+                                                           aggregate_type, aggregate_interval)
+                            vectors = archive.getSqlVectors(timespan, obs_type, aggregate_type, aggregate_interval)
+                            self.assertEqual(vectors[0][0], expected[0])
+                            self.assertEqual(vectors[1][0], expected[1])
+                            self.assertEqual(len(vectors[2][0]), len(expected[2]))
+                            for (value, expected_value) in zip(vectors[2][0], expected[2]):
+                                self.assertAlmostEqual(value, expected_value)
+                # The intervals in the five hour gap are left out:
+                vectors = archive.getSqlVectors((start_ts, stop_ts), obs_type, 'count', 1800)
+                self.assertEqual(len(vectors[0][0]), (stop_ts - start_ts) / 1800 - 10)
+                # There is no 'last' for a vector:
+                self.assertRaises(weewx.ViolatedPrecondition, archive.getSqlVectors,
+                                  (start_ts, stop_ts), obs_type, 'last', 3*interval)
+                # Nor anything in an empty span:
+                self.assertEqual(archive.getSqlVectors((stop_ts + 3600, stop_ts + 7200), obs_type, 'avg', 1800)[2][0], [])
+
+    def test_aggregate_cache(self):
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
+            archive.addRecord(genRecords())
+            archive.aggregate_cache = weewx.manager.AggregateCache(max_entries=2)
+            span = weeutil.weeutil.TimeSpan(start_ts, stop_ts)
+
+            # The second time, the answer should come from the cache:
+            max1 = archive.getAggregate(span, 'outTemp', 'max')
+            max2 = archive.getAggregate(span, 'outTemp', 'max')
+            self.assertEqual(max1, max2)
+            self.assertEqual(max1[0], temperfunc(nrecs-1))
+            self.assertEqual((archive.aggregate_cache.hits, archive.aggregate_cache.misses), (1, 1))
+
+            # Only the least recently used entry should get pushed out:
+            archive.getAggregate(span, 'outTemp', 'min')
+            archive.getAggregate(span, 'outTemp', 'avg')
+            self.assertEqual(len(archive.aggregate_cache), 2)
+            archive.getAggregate(span, 'outTemp', 'avg')
+            self.assertEqual((archive.aggregate_cache.hits, archive.aggregate_cache.misses), (2, 3))
+            
+            # Adding a record must invalidate the results
+            archive.addRecord(expected_record(nrecs))
+            self.assertEqual(len(archive.aggregate_cache), 0)
+            span = weeutil.weeutil.TimeSpan(start_ts, timefunc(nrecs))
+            self.assertEqual(archive.getAggregate(span, 'outTemp', 'max')[0], temperfunc(nrecs))
+
+        # So must a record added by someone else:
+        with weewx.manager.Manager.open(self.archive_db_dict) as archive:
+            archive.aggregate_cache = weewx.manager.AggregateCache()
+            span = weeutil.weeutil.TimeSpan(start_ts - interval, timefunc(nrecs+1))
+            archive.getAggregate(span, 'outTemp', 'count')
+            archive.getAggregate(span, 'outTemp', 'count')
+            self.assertEqual(archive.aggregate_cache.hits, 1)
+            with weewx.manager.Manager.open(self.archive_db_dict) as archive2:
+                archive2.addRecord(expected_record(nrecs+1))
+            archive._sync()
+            self.assertEqual(archive.getAggregate(span, 'outTemp', 'count')[0], nrecs+2)
+            self.assertEqual(archive.aggregate_cache.hits, 1)
+
+    def test_indexes(self):
+        manager_dict = {'manager': 'weewx.manager.Manager', 'table_name': 'archive',
+                        'schema': archive_schema, 'database_dict': self.archive_db_dict,
+                        'indexes': ['outTemp']}
+        # Configured indexes are added when the table is initialized:
+        with weewx.manager.open_manager(manager_dict, initialize=True) as archive:
+            archive.addRecord(genRecords())
+            self.assertEqual(archive.getIndexes(), ['outTemp'])
+            # Unknown types, and ones already indexed, are skipped:
+            self.assertEqual(archive.add_indexes(['barometer', 'outTemp', 'foo']), ['barometer'])
+            self.assertItemsEqual(archive.getIndexes(), ['outTemp', 'barometer'])
+
+            # Aggregates come out the same with an index:
+            span = weeutil.weeutil.TimeSpan(start_ts, stop_ts)
+            self.assertEqual(archive.getAggregate(span, 'outTemp', 'max')[0], temperfunc(nrecs-1))
+            self.assertEqual(archive.getAggregate(span, 'barometer', 'mintime')[0], timefunc(1))
+
+            # The queries over types without an index are suggested:
+            archive.getAggregate(span, 'windSpeed', 'count')
+            scans = weewx.manager.get_scan_stats(archive.database_name, 'archive')
+            self.assertTrue(scans['windSpeed'][0] >= 1)
+            self.assertIn('windSpeed', archive.suggest_indexes(min_time=0))
+            self.assertNotIn('outTemp', archive.suggest_indexes(min_time=0))
+
+            self.assertEqual(archive.drop_indexes(['outTemp']), ['outTemp'])
+            self.assertEqual(archive.getIndexes(), ['barometer'])
+            self.assertEqual(archive.drop_indexes(), ['barometer'])
+            self.assertEqual(archive.getIndexes(), [])
+
+    def test_partitions(self):
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
+            archive.addRecord(genRecords())
+            archive.add_indexes(['outTemp'])
+            self.assertTrue(archive.partition('month'))
+            self.assertFalse(archive.partition('month'))
+            # The record at midnight on 1 July belongs to June:
+            self.assertEqual(archive.partitions, ['201206', '201207'])
+            self.assertItemsEqual(archive.connection.tables(), ['archive_201206', 'archive_201207'])
+            self.assertEqual(archive.connection.views(), ['archive'])
+            self.assertEqual(archive.getIndexes(), ['outTemp'])
+
+        # Everything reads as before:
+        with weewx.manager.Manager.open(self.archive_db_dict) as archive:
+            self.assertEqual(archive.partition_period, 'month')
+            self.assertEqual((archive.first_timestamp, archive.last_timestamp), (start_ts, stop_ts))
+            self.assertEqual([rec['dateTime'] for rec in archive.genBatchRecords()], timevec)
+            self.assertEqual([rec['dateTime'] for rec in archive.genBatchRecords(start_ts, stop_ts)], timevec[1:])
+            self.assertEqual(archive.getRecord(timefunc(3))['outTemp'], temperfunc(3))
+            span = weeutil.weeutil.TimeSpan(start_ts, stop_ts)
+            self.assertEqual(archive.getAggregate(span, 'outTemp', 'max')[0], temperfunc(nrecs-1))
+            self.assertEqual(archive.getAggregate(span, 'outTemp', 'count')[0], nrecs-1)
+            # Which only needs the one table:
+            self.assertEqual(archive._tableOf(span.start, span.stop), 'archive_201207')
+            self.assertEqual(archive._tableOf(start_ts - interval, stop_ts), 'archive')
+            self.assertEqual(archive.getSqlVectors(span, 'outTemp')[2][0], [temperfunc(i) for i in range(nrecs)])
+
+            # The table of a new period is added when needed:
+            archive.addRecord(dict(expected_record(nrecs), dateTime=stop_ts + 31*24*3600))
+            self.assertEqual(archive.partitions, ['201206', '201207', '201208'])
+            self.assertEqual(archive.getSql("SELECT COUNT(*) FROM archive")[0], nrecs+1)
+            self.assertEqual(archive.getIndexes(), ['outTemp'])
+            archive.updateValue(timefunc(3), 'outTemp', -10.0)
+            self.assertEqual(archive.getRecord(timefunc(3))['outTemp'], -10.0)
+
+            # Old periods can be moved out to a database of their own:
+            detached_db_dict = dict(self.archive_db_dict, database_name=self.archive_db_dict['database_name'] + '_201206')
+            try:
+                weedb.drop(detached_db_dict)
+            except weedb.NoDatabase:
+                pass
+            try:
+                self.assertEqual(archive.detach_partition('201206', detached_db_dict), 1)
+                with weewx.manager.Manager.open(detached_db_dict) as detached:
+                    self.assertEqual(detached.getRecord(start_ts)['outTemp'], temperfunc(0))
+            finally:
+                weedb.drop(detached_db_dict)
+            self.assertEqual(archive.partitions, ['201207', '201208'])
+            self.assertEqual(archive.first_timestamp, timefunc(1))
+            self.assertRaises(weewx.ViolatedPrecondition, archive.detach_partition, '201206', detached_db_dict)
+
+            self.assertTrue(archive.unpartition())
+            self.assertEqual(archive.connection.tables(), ['archive'])
+            self.assertEqual(archive.getSql("SELECT COUNT(*) FROM archive")[0], nrecs)
+            self.assertEqual(archive.getIndexes(), ['outTemp'])
+
+    def test_partition_batch_with_duplicate(self):
+        new_year_ts = int(time.mktime((2013, 1, 1, 0, 0, 0, 0, 0, -1)))
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
+            archive.addRecord(genRecords())
+            archive.partition('year')
+            archive.addRecord(dict(expected_record(0), dateTime=new_year_ts - interval))
+            # A batch with a duplicate, that crosses into a new year, adds all the others:
+            archive.addRecord([dict(expected_record(i), dateTime=new_year_ts + i*interval) for i in range(-3, 3)], quiet=True)
+            self.assertEqual(archive.partitions, ['2012', '2013'])
+            self.assertEqual(archive.getSql("SELECT COUNT(*) FROM archive_2013")[0], 2)
+            self.assertEqual(archive.getSql("SELECT COUNT(*) FROM archive")[0], nrecs+6)
+
+            # If the transaction fails, the table of the new year goes with it:
+            metric_record = dict(expected_record(0), dateTime=new_year_ts + 367*24*3600, usUnits=16)
+            self.assertRaises(weewx.UnitError, archive.addRecord,
+                              [dict(expected_record(0), dateTime=new_year_ts + 366*24*3600), metric_record])
+            self.assertEqual(archive.partitions, ['2012', '2013'])
+            self.assertItemsEqual(archive.connection.tables(), ['archive_2012', 'archive_2013'])
+            # ... and it can be added again:
+            archive.addRecord(dict(expected_record(0), dateTime=new_year_ts + 366*24*3600))
+            self.assertEqual(archive.partitions, ['2012', '2013', '2014'])
+            self.assertEqual(archive.getSql("SELECT COUNT(*) FROM archive")[0], nrecs+7)
+
+    def test_tiers(self):
+        def rounded(vectors):
+            return [[round(x, 6) for x in vec[0]] for vec in vectors]
+        aggregate_types = ['sum', 'count', 'avg', 'min', 'max']
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
+            archive.addRecord(genRecords())
+            span = weeutil.weeutil.TimeSpan(start_ts - 24*interval, stop_ts + interval)
+            daily = dict((agg, rounded(archive.getSqlVectors(span, 'outTemp', agg, 24*interval))) for agg in aggregate_types)
+            hourly = rounded(archive.getSqlVectors(span, 'outTemp', 'max', 3*interval))
+
+            self.assertEqual(archive.add_tiers(['hour', 'day']), ['hour', 'day'])
+            self.assertEqual(archive.add_tiers(['day']), [])
+            self.assertEqual(archive.tiers, ['hour', 'day'])
+            # Every hour, but only the two days that have ended, are rolled up:
+            self.assertEqual(archive.getSql("SELECT COUNT(*) FROM archive_tier_hour")[0], nrecs)
+            self.assertEqual(archive.getSql("SELECT COUNT(*) FROM archive_tier_day")[0], 2)
+            self.assertEqual(archive.getSql("SELECT outTemp, outTemp_count FROM archive_tier_hour WHERE dateTime=?",
+                                            (timefunc(3),)), (temperfunc(3), 1))
+            self.assertEqual(archive.update_tiers(), 0)
+
+            # Aggregates come from the coarsest tier that holds the spans, and
+            # are the same as from the records themselves:
+            spans = list(weeutil.weeutil.intervalgen(span.start, span.stop, 24*interval))
+            self.assertEqual(archive._tierFor(spans, 'outTemp', 'max'), ('day', 2))
+            self.assertEqual(archive._tierFor(spans, 'outTemp', 'last'), (None, 0))
+            spans = list(weeutil.weeutil.intervalgen(span.start, span.stop, 3*interval))
+            self.assertEqual(archive._tierFor(spans, 'outTemp', 'max'), ('hour', len(spans) - 1))
+            for agg in aggregate_types:
+                self.assertEqual(rounded(archive.getSqlVectors(span, 'outTemp', agg, 24*interval)), daily[agg])
+            self.assertEqual(rounded(archive.getSqlVectors(span, 'outTemp', 'max', 3*interval)), hourly)
+
+            # Records can only be expired once every tier holds them:
+            self.assertEqual(archive.expire_records(timefunc(30)), 25)
+            self.assertEqual(archive.first_timestamp, timefunc(25))
+            for agg in aggregate_types:
+                self.assertEqual(rounded(archive.getSqlVectors(span, 'outTemp', agg, 24*interval)), daily[agg])
+            self.assertEqual(rounded(archive.getSqlVectors(span, 'outTemp', 'max', 3*interval)), hourly)
+
+            # Which happens as days end:
+            archive.addRecord(expected_record(nrecs))
+            self.assertEqual(archive.update_tiers(), 2)
+
+            self.assertEqual(archive.drop_tiers(), ['hour', 'day'])
+            self.assertEqual(archive.connection.tables(), ['archive'])
+            self.assertRaises(weewx.ViolatedPrecondition, archive.expire_records, timefunc(30))
+
+    def test_archive_writer(self):
+        manager_dict = {'manager': 'weewx.manager.DaySummaryManager', 'table_name': 'archive',
+                        'schema': archive_schema, 'database_dict': self.archive_db_dict}
+        with weewx.manager.open_manager(manager_dict, initialize=True) as archive:
+            writer = weewx.manager.ArchiveWriter(manager_dict, max_queue=5)
+            writer.start()
+            try:
+                for _rec in genRecords():
+                    writer.addRecord(_rec)
+                # Anyone opening the table must see everything queued so far:
+                with weewx.manager.open_manager(manager_dict) as archive2:
+                    self.assertEqual(archive2.getSql("SELECT COUNT(*) FROM archive")[0], nrecs)
+                    self.assertEqual(archive2.last_timestamp, stop_ts)
+                # As must a manager that was already open, once synced:
+                writer.addRecord(expected_record(nrecs))
+                writer.sync(archive)
+                self.assertEqual(archive.last_timestamp, timefunc(nrecs))
+                self.assertEqual(writer.queue_depth, 0)
+                self.assertTrue(writer.ncommits > 0)
+                self.assertTrue(writer.max_latency >= writer.last_latency >= 0)
+                # Records queued at shutdown get written:
+                writer.addRecord(expected_record(nrecs+1))
+            finally:
+                writer.close()
+            self.assertFalse(writer.is_alive())
+            archive._sync()
+            self.assertEqual(archive.last_timestamp, timefunc(nrecs+1))
+            sod_ts = weeutil.weeutil.startOfArchiveDay(timefunc(nrecs+1))
+            day_summary = archive._get_day_summary(sod_ts)
+            self.assertEqual(day_summary['outTemp'].max, temperfunc(nrecs+1))
+
+    def test_archive_writer_failure(self):
+        manager_dict = {'manager': 'weewx.manager.DaySummaryManager', 'table_name': 'archive',
+                        'schema': archive_schema, 'database_dict': self.archive_db_dict}
+        # A writer that cannot open its database must not leave the caller
+        # blocked on a full queue:
+        bad_dict = dict(manager_dict, database_dict=dict(self.archive_db_dict, database_name='/var/tmp/weewx_test/nowhere/none'))
+        writer = weewx.manager.ArchiveWriter(bad_dict, max_queue=2)
+        writer.start()
+        with self.assertRaises(weedb.OperationalError):
+            for _rec in genRecords():
+                writer.addRecord(_rec)
+        self.assertTrue(writer.error is not None)
+        writer.close()
+
+        add_record = weewx.manager.DaySummaryManager.addRecord
+        failures = []
+        def failing_addRecord(manager, record_obj, *args, **kwargs):
+            if failures:
+                failures.pop()
+                raise weedb.OperationalError("database is locked")
+            return add_record(manager, record_obj, *args, **kwargs)
+        weewx.manager.DaySummaryManager.addRecord = failing_addRecord
+        try:
+            with weewx.manager.open_manager(manager_dict, initialize=True) as archive:
+                writer = weewx.manager.ArchiveWriter(manager_dict)
+                writer.start()
+                try:
+                    # A single failure is retried, with a new connection:
+                    failures.append(1)
+                    writer.addRecord(expected_record(0))
+                    writer.flush()
+                    self.assertEqual(failures, [])
+                    self.assertTrue(writer.is_alive())
+                    # Two in a row stop the writer, and the caller hears about it:
+                    failures.extend([1, 1])
+                    writer.addRecord(expected_record(1))
+                    self.assertRaises(weedb.OperationalError, writer.flush)
+                    self.assertRaises(weedb.OperationalError, writer.addRecord, expected_record(2))
+                    self.assertFalse(writer.is_alive())
+                finally:
+                    writer.close()
+                # Readers are not held up, and see what was written:
+                archive._sync()
+                self.assertEqual(archive.lastGoodStamp(), timefunc(0))
+        finally:
+            weewx.manager.DaySummaryManager.addRecord = add_record
+
+    def test_manager_pool(self):
+        manager_dict = {'manager': 'weewx.manager.Manager', 'table_name': 'archive',
+                        'schema': archive_schema, 'database_dict': self.archive_db_dict}
+        pool = weewx.manager.ManagerPool(max_size=1)
+        archive1 = pool.checkout(manager_dict, initialize=True)
+        # With the only pooled manager in use, another one gets opened, then closed:
+        archive2 = pool.checkout(manager_dict)
+        self.assertFalse(archive1 is archive2)
+        archive2.addRecord(genRecords())
+        pool.checkin(archive2)
+        self.assertEqual((pool.in_use, pool.idle, pool.opens, pool.overflows), (1, 0, 1, 1))
+        pool.checkin(archive1)
+        
+        # The pooled manager gets reused, even by another thread, and knows
+        # about the records added in the meantime:
+        result = []
+        def use_pool():
+            with weewx.manager.pooled_manager(manager_dict) as archive:
+                result.append((archive, archive.lastGoodStamp(), archive.last_timestamp))
+        weewx.manager.set_manager_pool(pool)
+        try:
+            _thread = threading.Thread(target=use_pool)
+            _thread.start()
+            _thread.join()
+        finally:
+            weewx.manager.set_manager_pool(None)
+        self.assertEqual(result, [(archive1, stop_ts, stop_ts)])
+        self.assertEqual((pool.in_use, pool.idle, pool.reuses), (0, 1, 1))
+        
+        # Idle managers get closed:
+        pool.max_idle = -1
+        bindings_dict = {'test_binding': {'manager': 'weewx.manager.Manager', 'database': 'test_db',
+                                          'table_name': 'archive'}}
+        with weewx.manager.DBBinder(bindings_dict, {'test_db': self.archive_db_dict}, pool=pool) as binder:
+            self.assertEqual(binder.get_manager('test_binding').last_timestamp, stop_ts)
+        self.assertEqual((pool.in_use, pool.idle, pool.evictions, pool.opens), (0, 0, 2, 2))
+        pool.close()
+
+        # Managers are pooled by where their database is, not just its name:
+        self.assertEqual(archive1.table_key, weewx.manager.table_key(self.archive_db_dict, 'archive'))
+        sqlite_dict = {'database_name': 'weedb.sdb', 'driver': 'weedb.sqlite'}
+        self.assertNotEqual(weewx.manager.table_key(dict(sqlite_dict, root='/var/tmp/a'), 'archive'),
+                            weewx.manager.table_key(dict(sqlite_dict, root='/var/tmp/b'), 'archive'))
+        self.assertEqual(weewx.manager.table_key(dict(sqlite_dict, root='/var/tmp/a'), 'archive'),
+                         weewx.manager.table_key(dict(sqlite_dict, database_name='/var/tmp/a/weedb.sdb'), 'archive'))
+        self.assertNotEqual(weewx.manager.table_key(dict(archive_mysql, host='a'), 'archive'),
+                            weewx.manager.table_key(dict(archive_mysql, host='b'), 'archive'))
+        self.assertNotEqual(weewx.manager._pool_key({'manager': 'weewx.manager.Manager', 'table_name': 'archive',
+                                                     'database_dict': dict(archive_mysql, host='a')}, False),
+                            weewx.manager._pool_key({'manager': 'weewx.manager.Manager', 'table_name': 'archive',
+                                                     'database_dict': dict(archive_mysql, host='b')}, False))
+
+    def test_streaming_then_ddl(self):
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
+            archive.addRecord(genRecords())
+            self.assertEqual(len(list(archive.genBatchRows())), nrecs)
+            # A result set that is not read to the end:
+            _rows = archive.genBatchRows()
+            _rows.next()
+            _rows.close()
+            # The tables the streaming cursors read are not left locked, so
+            # DDL on them does not have to wait. Should it, do not wait long:
+            archive.connection.execute("SET SESSION lock_wait_timeout = 5")
+            archive.add_indexes(['outTemp'])
+            archive.connection.execute("DROP TABLE archive")
+            self.assertEqual(archive.connection.tables(), [])
+
 class TestSqlite(Common):
 
     def __init__(self, *args, **kwargs):
@@ -230,8 +700,11 @@ class TestMySQL(Common):
     
 def suite():
     tests = ['test_no_archive', 'test_create_archive', 
-             'test_empty_archive', 'test_add_archive_records', 'test_get_records']
-    return unittest.TestSuite(map(TestSqlite, tests) + map(TestMySQL, tests))
+             'test_empty_archive', 'test_add_archive_records', 'test_add_batch_with_duplicate', 'test_get_records',
+             'test_grouped_aggregation', 'test_windvec', 'test_day_summary_two_writers', 'test_aggregate_cache',
+             'test_indexes', 'test_partitions', 'test_partition_batch_with_duplicate', 'test_tiers', 'test_archive_writer', 'test_archive_writer_failure',
+             'test_manager_pool']
+    return unittest.TestSuite(map(TestSqlite, tests) + map(TestMySQL, tests + ['test_streaming_then_ddl']))
             
 if __name__ == '__main__':
     unittest.TextTestRunner(verbosity=2).run(suite())
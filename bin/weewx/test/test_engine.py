@@ -0,0 +1,150 @@
+#
+#    Copyright (c) 2009-2015 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the calibration corrections of module weewx.engine"""
+import StringIO
+import syslog
+import unittest
+
+import configobj
+
+import weewx
+import weewx.engine
+
+config_string = """
+[StdCalibrate]
+    [[Corrections]]
+        outTemp = outTemp - 0.2
+        barometer = barometer + (outTemp - 32) * 0.0091
+        windchill = outTemp - 1
+"""
+
+class FakeEngine(object):
+    def __init__(self):
+        self.callbacks = {}
+    def bind(self, event_type, callback):
+        self.callbacks[event_type] = callback
+
+class CorrectionsTest(unittest.TestCase):
+
+    def setUp(self):
+        # Catch whatever gets logged:
+        self.logged = []
+        self.syslog = syslog.syslog
+        syslog.syslog = lambda level, msg: self.logged.append((level, msg))
+
+    def tearDown(self):
+        syslog.syslog = self.syslog
+
+    def test_order(self):
+        apply_corrections = weewx.engine.compile_corrections([('outTemp', 'outTemp - 0.2'),
+                                                              ('barometer', 'barometer + (outTemp - 32) * 0.01')])
+        packet = {'outTemp' : 52.2, 'barometer' : 30.0}
+        apply_corrections(packet, 'loop')
+        self.assertAlmostEqual(packet['outTemp'], 52.0)
+        # Barometer sees the corrected outTemp:
+        self.assertAlmostEqual(packet['barometer'], 30.2)
+
+        # The other way around, it sees the raw one:
+        apply_corrections = weewx.engine.compile_corrections([('barometer', 'barometer + (outTemp - 32) * 0.01'),
+                                                              ('outTemp', 'outTemp - 0.2')])
+        packet = {'outTemp' : 52.2, 'barometer' : 30.0}
+        apply_corrections(packet, 'loop')
+        self.assertAlmostEqual(packet['barometer'], 30.202)
+
+    def test_missing(self):
+        apply_corrections = weewx.engine.compile_corrections([('outTemp', 'outTemp - 0.2'),
+                                                              ('barometer', 'barometer + (outTemp - 32) * 0.01'),
+                                                              ('windchill', 'outTemp - 1')])
+        packet = {'outTemp' : 52.2}
+        apply_corrections(packet, 'loop')
+        # Barometer is not in the packet, so is not corrected, nor added:
+        self.assertEqual(sorted(packet.keys()), ['outTemp', 'windchill'])
+        self.assertAlmostEqual(packet['windchill'], 51.0)
+        packet = {'barometer' : 30.0}
+        apply_corrections(packet, 'loop')
+        self.assertEqual(packet, {'barometer' : 30.0})
+
+    def test_none(self):
+        apply_corrections = weewx.engine.compile_corrections([('outTemp', 'outTemp - 0.2'),
+                                                              ('inTemp', 'inTemp if inTemp is not None else 0.0')])
+        packet = {'outTemp' : None, 'inTemp' : None}
+        apply_corrections(packet, 'loop')
+        # The TypeError is ignored:
+        self.assertEqual(packet, {'outTemp' : None, 'inTemp' : 0.0})
+        self.assertEqual(self.logged, [])
+
+    def test_value_error(self):
+        apply_corrections = weewx.engine.compile_corrections([('outTemp', 'float("hot")'),
+                                                              ('inTemp', 'inTemp + 1')])
+        packet = {'outTemp' : 52.2, 'inTemp' : 70.0}
+        apply_corrections(packet, 'archive')
+        self.assertEqual(packet, {'outTemp' : 52.2, 'inTemp' : 71.0})
+        self.assertEqual(len(self.logged), 1)
+        self.assertEqual(self.logged[0][0], syslog.LOG_ERR)
+        self.assertTrue(self.logged[0][1].startswith("engine: StdCalibration archive error"))
+
+    def test_bound_names(self):
+        apply_corrections = weewx.engine.compile_corrections([('outTemp', '(lambda x, y: x - y)(outTemp, 0.2)'),
+                                                              ('rain', 'sum([x for x in (rain, extraRain) if x])'),
+                                                              ('inTemp', 'max(t for t in (inTemp, 60.0))')])
+        packet = {'outTemp' : 52.2, 'rain' : 0.1, 'extraRain' : 0.2, 'inTemp' : 55.0}
+        apply_corrections(packet, 'loop')
+        self.assertAlmostEqual(packet['outTemp'], 52.0)
+        self.assertAlmostEqual(packet['rain'], 0.3)
+        self.assertEqual(packet['inTemp'], 60.0)
+        # The names bound by the expressions are not taken to be inputs, nor
+        # do they end up in the packet:
+        self.assertEqual(sorted(packet.keys()), ['extraRain', 'inTemp', 'outTemp', 'rain'])
+
+    def test_multiline(self):
+        apply_corrections = weewx.engine.compile_corrections([('outTemp', 'outTemp - 0.2 # Thermometer reads high'),
+                                                              ('barometer', '(barometer +\n (outTemp - 32) * 0.01 # Temperature sensitive\n + 0.1)')])
+        packet = {'outTemp' : 52.2, 'barometer' : 30.0}
+        apply_corrections(packet, 'loop')
+        self.assertAlmostEqual(packet['outTemp'], 52.0)
+        self.assertAlmostEqual(packet['barometer'], 30.3)
+        self.assertRaises(SyntaxError, weewx.engine.compile_corrections, [('outTemp', 'outTemp -')])
+
+    def test_shadowed_names(self):
+        # Types named like builtins, or globals of the engine, are read from
+        # the packet, if they are in it:
+        apply_corrections = weewx.engine.compile_corrections([('outTemp', 'round(outTemp + time, 1)'),
+                                                              ('inTemp', 'round(inTemp, 1)')])
+        packet = {'outTemp' : 52.21, 'time' : 1.0, 'round' : lambda x, n: -x, 'inTemp' : 70.04}
+        apply_corrections(packet, 'loop')
+        self.assertAlmostEqual(packet['outTemp'], -53.21)
+        self.assertAlmostEqual(packet['inTemp'], -70.04)
+        # ... but not otherwise:
+        packet = {'outTemp' : 52.21, 'inTemp' : 70.04}
+        apply_corrections(packet, 'loop')
+        self.assertEqual(packet['inTemp'], 70.0)
+        # outTemp + <module 'time'> raises a TypeError:
+        self.assertEqual(packet['outTemp'], 52.21)
+
+    def test_std_calibrate(self):
+        config_dict = configobj.ConfigObj(StringIO.StringIO(config_string))
+        engine = FakeEngine()
+        service = weewx.engine.StdCalibrate(engine, config_dict)
+        packet = {'dateTime' : 1, 'usUnits' : weewx.US, 'outTemp' : 52.2, 'barometer' : 30.0}
+        engine.callbacks[weewx.NEW_LOOP_PACKET](weewx.Event(weewx.NEW_LOOP_PACKET, packet=packet))
+        self.assertAlmostEqual(packet['outTemp'], 52.0)
+        self.assertAlmostEqual(packet['barometer'], 30.182)
+        self.assertAlmostEqual(packet['windchill'], 51.0)
+        # Software records have already been corrected:
+        record = {'dateTime' : 1, 'usUnits' : weewx.US, 'outTemp' : 52.2}
+        engine.callbacks[weewx.NEW_ARCHIVE_RECORD](weewx.Event(weewx.NEW_ARCHIVE_RECORD, record=record, origin='software'))
+        self.assertEqual(record['outTemp'], 52.2)
+        engine.callbacks[weewx.NEW_ARCHIVE_RECORD](weewx.Event(weewx.NEW_ARCHIVE_RECORD, record=record, origin='hardware'))
+        self.assertAlmostEqual(record['outTemp'], 52.0)
+        service.shutDown()
+
+        # Without any corrections, nothing is bound:
+        engine = FakeEngine()
+        weewx.engine.StdCalibrate(engine, configobj.ConfigObj())
+        self.assertEqual(engine.callbacks, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#
+#    Copyright (c) 2009-2015 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test module weewx.recent"""
+import time
+import unittest
+
+import weewx.manager
+import weewx.recent
+from gen_fake_data import genFakeRecords
+
+# Two days of records, every 5 minutes:
+interval = 300
+start_ts = int(time.mktime((2009,1,1,0,0,0,0,0,-1)))
+stop_ts  = start_ts + 48*3600
+
+obs_types = ['dateTime', 'usUnits', 'interval', 'outTemp', 'barometer', 'windSpeed', 'rain']
+
+def brute_force(records, timespan, obs_type):
+    return [rec[obs_type] for rec in records if timespan[0] < rec['dateTime'] <= timespan[1] and rec[obs_type] is not None]
+
+class RecentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dataset = [dict((obs_type, record.get(obs_type)) for obs_type in obs_types)
+                        for record in genFakeRecords(start_ts=start_ts, stop_ts=stop_ts, interval=interval)]
+        self.recent = weewx.recent.RecentRecords(obs_types, hours=25, archive_interval=interval)
+        # Nothing is held until the buffer is primed:
+        self.assertRaises(weewx.recent.NotHeld, self.recent.getRecord, start_ts)
+        self.recent.held_since = 0
+        for record in self.dataset:
+            self.recent.addRecord(record)
+
+    def test_window(self):
+        # Only the last 25 hours are held:
+        self.assertEqual(len(self.recent), self.recent.size)
+        self.assertEqual(self.recent.held_since, stop_ts - 25*3600 - interval)
+        self.assertRaises(weewx.recent.NotHeld, self.recent.getAggregate, (stop_ts - 26*3600, stop_ts), 'rain', 'sum')
+        self.assertRaises(weewx.recent.NotHeld, self.recent.getAggregate, (stop_ts - 3600, stop_ts), 'inTemp', 'sum')
+        self.assertRaises(weewx.ViolatedPrecondition, self.recent.getAggregate, (stop_ts - 3600, stop_ts), 'rain', 'last')
+
+    def test_aggregates(self):
+        for timespan in [(stop_ts - 3600, stop_ts), (stop_ts - 24*3600, stop_ts), (stop_ts - 7200, stop_ts - 3600 + 1)]:
+            for obs_type in ['outTemp', 'rain', 'windSpeed']:
+                values = brute_force(self.dataset, timespan, obs_type)
+                self.assertAlmostEqual(self.recent.getAggregate(timespan, obs_type, 'sum')[0], sum(values))
+                self.assertEqual(self.recent.getAggregate(timespan, obs_type, 'count'), (len(values), weewx.US))
+                self.assertEqual(self.recent.getAggregate(timespan, obs_type, 'min')[0], min(values))
+                self.assertEqual(self.recent.getAggregate(timespan, obs_type, 'max')[0], max(values))
+                self.assertAlmostEqual(self.recent.getAggregate(timespan, obs_type, 'avg')[0], sum(values)/len(values))
+        # An empty window:
+        self.assertEqual(self.recent.getAggregate((stop_ts, stop_ts + 3600), 'rain', 'sum'), (None, weewx.US))
+        self.assertEqual(self.recent.getAggregate((stop_ts, stop_ts + 3600), 'rain', 'count'), (0, weewx.US))
+
+        rows = self.recent.getValues((stop_ts - 3600, stop_ts), ['interval', 'outTemp'])
+        self.assertEqual(rows, [(rec['dateTime'], rec['interval'], rec['outTemp']) for rec in self.dataset[-12:]])
+
+    def test_getRecord(self):
+        self.assertEqual(self.recent.getRecord(stop_ts - 600), self.dataset[-3])
+        self.assertEqual(self.recent.getRecord(stop_ts - 601), None)
+        # The nearest one is found, the earlier one if they are equally near:
+        self.assertEqual(self.recent.getRecord(stop_ts - 601, max_delta=200), self.dataset[-3])
+        self.assertEqual(self.recent.getRecord(stop_ts - 899, max_delta=200), self.dataset[-4])
+        self.assertEqual(self.recent.getRecord(stop_ts - 750, max_delta=200), self.dataset[-4])
+        self.assertEqual(self.recent.getRecord(stop_ts + 60, max_delta=30), None)
+        self.assertRaises(weewx.recent.NotHeld, self.recent.getRecord, stop_ts - 25*3600 - interval)
+
+        self.recent.updateValue(stop_ts - 600, 'outTemp', 12.5)
+        self.assertEqual(self.recent.getRecord(stop_ts - 600)['outTemp'], 12.5)
+
+    def test_out_of_order(self):
+        # Duplicates, and records in another unit system, are ignored:
+        self.recent.addRecord(dict(self.dataset[-1], outTemp=-40.0))
+        self.recent.addRecord(dict(self.dataset[-1], dateTime=stop_ts + interval, usUnits=weewx.METRIC))
+        self.assertEqual(self.recent.getRecord(stop_ts), self.dataset[-1])
+        self.assertEqual(self.recent.getRecord(stop_ts + interval), None)
+        # A record out of order means the ones before it are no longer held:
+        self.recent.addRecord(dict(self.dataset[-1], dateTime=stop_ts - 3600 - 1))
+        self.assertEqual(self.recent.held_since, stop_ts - 3600 - 1)
+        self.assertEqual(len(self.recent), 13)
+        self.assertEqual(self.recent.getAggregate((stop_ts - 3600, stop_ts), 'outTemp', 'max')[0],
+                         max(brute_force(self.dataset, (stop_ts - 3600, stop_ts), 'outTemp')))
+        self.assertRaises(weewx.recent.NotHeld, self.recent.getAggregate, (stop_ts - 7200, stop_ts), 'rain', 'sum')
+
+    def test_manager(self):
+        db_dict = {'database_name': '/tmp/weewx_test/test_recent.sdb', 'driver': 'weedb.sqlite'}
+        try:
+            weewx.manager.weedb.drop(db_dict)
+        except weewx.manager.weedb.NoDatabase:
+            pass
+        schema = [(obs_type, 'INTEGER NOT NULL UNIQUE PRIMARY KEY' if obs_type == 'dateTime' else 'REAL') for obs_type in obs_types]
+        with weewx.manager.Manager.open_with_create(db_dict, schema=schema) as archive:
+            archive.addRecord(self.dataset)
+            recent = weewx.recent.RecentRecords(archive.sqlkeys, hours=2, archive_interval=interval)
+            recent.prime(archive)
+            self.assertEqual(len(recent), 24)
+            self.assertEqual(recent.held_since, stop_ts - 7200)
+            weewx.recent.set_recent_records(archive.table_key, recent)
+            try:
+                # Records still held are read from the buffer, the rest from the database:
+                recent.updateValue(stop_ts, 'outTemp', 99.0)
+                self.assertEqual(archive.getRecord(stop_ts)['outTemp'], 99.0)
+                self.assertEqual(archive.getRecord(stop_ts - 3*3600), self.dataset[-37])
+                # Updates reach both:
+                archive.updateValue(stop_ts - 600, 'barometer', 31.0)
+                self.assertEqual(recent.getRecord(stop_ts - 600)['barometer'], 31.0)
+            finally:
+                weewx.recent.set_recent_records(archive.table_key, None)
+            self.assertEqual(archive.getRecord(stop_ts), self.dataset[-1])
+
+if __name__ == '__main__':
+    unittest.main()
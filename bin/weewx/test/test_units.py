@@ -85,7 +85,35 @@ class ConverterTest(unittest.TestCase):
         self.assertRaises(KeyError, c.convert, d_m)
         d_m['outTemp'] = (20.01, 'degree_C', 'group_foo')
         self.assertRaises(KeyError, c.convert, d_m)
-        
+
+    def testConvertDictPlan(self):
+        c = weewx.units.Converter()
+        d_m = {'outTemp'   : 20.01,
+               'windSpeed' : None,
+               'extraTemp1': [10.0, 20.0],
+               'interval'  : 5,
+               'foo'       : 'bar',
+               'usUnits'   : weewx.METRIC}
+        d_test = c.convertDict(d_m)
+        self.assertEqual(d_test, {'outTemp'   : 68.018,
+                                  'windSpeed' : None,
+                                  'extraTemp1': [50.0, 68.0],
+                                  'interval'  : 5,
+                                  'foo'       : 'bar'})
+        # The plan is reused for another dictionary with the same types...
+        self.assertEqual(len(c._plans), 1)
+        d_m['outTemp'] = 30.0
+        self.assertEqual(c.convertDict(d_m)['outTemp'], 86.0)
+        self.assertEqual(len(c._plans), 1)
+        # ... but not for one in another unit system:
+        d_us = dict(d_m, usUnits=weewx.US)
+        self.assertEqual(c.convertDict(d_us)['outTemp'], 30.0)
+        self.assertEqual(len(c._plans), 2)
+        # Impossible conversions still raise an exception every time:
+        for i in range(2):
+            self.assertRaises(KeyError, c.convertDict, {'outTemp' : 20.01, 'usUnits' : None})
+
+
     def testTargetUnits(self):
         c = weewx.units.Converter()
         self.assertEqual(c.getTargetUnit('outTemp'),            ('degree_F', 'group_temperature'))
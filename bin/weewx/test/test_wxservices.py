@@ -0,0 +1,319 @@
+#
+#    Copyright (c) 2009-2015 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the running totals and statistics of module weewx.wxservices"""
+from __future__ import with_statement
+import math
+import random
+import syslog
+import time
+import unittest
+
+import configobj
+
+import weedb
+import weewx
+import weewx.manager
+import weewx.units
+import weewx.wxservices
+import weeutil.weeutil
+import schemas.wview
+
+interval = 300
+start_ts = int(time.mktime((2013, 3, 1, 0, 0, 0, 0, 0, -1)))
+stop_ts = start_ts + 2 * 24 * 3600
+
+db_dict = {'database_name': '/var/tmp/weewx_test/test_wxservices.sdb', 'driver': 'weedb.sqlite'}
+
+def gen_records(start=start_ts, stop=stop_ts):
+    """Archive records every interval, with some of the values missing."""
+    for ts in xrange(start, stop + interval, interval):
+        phase = (ts - start_ts) * 2.0 * math.pi / (24 * 3600)
+        i = (ts - start_ts) // interval
+        yield {'dateTime'  : ts,
+               'usUnits'   : weewx.US,
+               'interval'  : interval // 60,
+               'outTemp'   : 50.0 - 10.0 * math.cos(phase) if i % 13 else None,
+               'radiation' : max(0.0, 800.0 * math.sin(phase)) if i % 17 else None,
+               'windSpeed' : abs(10.0 * math.sin(3 * phase)) if i % 11 else None,
+               'rain'      : (0.02 if i % 50 < 3 else 0.0) if i % 19 else None}
+
+def brute_sum(records, lo, hi, obs_type='rain'):
+    """The sum of a type over the records with lo < dateTime <= hi, as SQL would
+    have it: None if none of them have a value."""
+    values = [rec[obs_type] for rec in records if lo < rec['dateTime'] <= hi and rec[obs_type] is not None]
+    return sum(values) if values else None
+
+class SlidingTest(unittest.TestCase):
+
+    def test_sliding_sum(self):
+        window = weewx.wxservices.SlidingSum(3600)
+        self.assertEqual(window.total(start_ts), None)
+        window.add(start_ts, 0.1)
+        window.add(start_ts + 300, 0.2)
+        # A value expires exactly length seconds after it was stamped:
+        self.assertAlmostEqual(window.total(start_ts + 3599), 0.3)
+        self.assertAlmostEqual(window.total(start_ts + 3600), 0.2)
+        window.expire(start_ts + 3600)
+        self.assertEqual(len(window.entries), 1)
+        # A window of zeroes sums to exactly zero, rather than a rounding error:
+        window.add(start_ts + 3600, 0.0)
+        window.expire(start_ts + 3900)
+        self.assertEqual(window.total(start_ts + 3900), 0.0)
+        window.expire(start_ts + 7200)
+        self.assertEqual(window.total(start_ts + 7200), None)
+
+        # Against brute force:
+        rand = random.Random(71)
+        window = weewx.wxservices.SlidingSum(3600)
+        entries = []
+        ts = start_ts
+        for i in range(2000):
+            ts += rand.choice([60, 300, 300, 600, 3600])
+            value = rand.choice([0.0, 0.0, 0.01, 0.02, 0.13])
+            window.expire(ts)
+            window.add(ts, value)
+            entries.append((ts, value))
+            for t in (ts, ts + rand.randint(0, 3600)):
+                values = [v for (e, v) in entries if t - 3600 < e <= t]
+                expected = sum(values) if values else None
+                if expected is None or not any(values):
+                    self.assertEqual(window.total(t), expected)
+                else:
+                    self.assertAlmostEqual(window.total(t), expected)
+
+    def test_sliding_stats(self):
+        stats = weewx.wxservices.SlidingStats(3600)
+        self.assertEqual((stats.max, stats.min, stats.avg), (None, None, None))
+        # Missing values are ignored, so a window of them has no statistics:
+        stats.add(start_ts, None)
+        self.assertEqual((stats.max, stats.min, stats.avg), (None, None, None))
+        stats.add(start_ts + 300, 10.0)
+        stats.add(start_ts + 600, 20.0)
+        stats.add(start_ts + 900, None)
+        self.assertEqual((stats.max, stats.min, stats.avg), (20.0, 10.0, 15.0))
+        stats.expire(start_ts + 3900)
+        self.assertEqual((stats.max, stats.min, stats.avg), (20.0, 20.0, 20.0))
+        stats.expire(start_ts + 4200)
+        self.assertEqual((stats.max, stats.min, stats.avg), (None, None, None))
+
+        # Against brute force:
+        rand = random.Random(13)
+        stats = weewx.wxservices.SlidingStats(3600)
+        entries = []
+        ts = start_ts
+        for i in range(2000):
+            ts += rand.choice([60, 300, 300, 600, 3600])
+            value = rand.choice([None, rand.uniform(-20.0, 20.0), round(rand.uniform(-2, 2))])
+            stats.expire(ts)
+            stats.add(ts, value)
+            entries.append((ts, value))
+            values = [v for (e, v) in entries if ts - 3600 < e <= ts and v is not None]
+            self.assertEqual(stats.max, max(values) if values else None)
+            self.assertEqual(stats.min, min(values) if values else None)
+            if values:
+                self.assertAlmostEqual(stats.avg, sum(values) / len(values))
+            else:
+                self.assertEqual(stats.avg, None)
+
+class TotalsTest(unittest.TestCase):
+
+    def test_rain_totals(self):
+        totals = weewx.wxservices.RainTotals()
+        records = list(gen_records())
+        for rec in records:
+            totals.addRecord(rec)
+            ts = rec['dateTime']
+            for (obs, lo) in [('hourRain', ts - 3600), ('rain24', ts - 24*3600),
+                              ('dayRain', weeutil.weeutil.startOfDay(ts) - 1)]:
+                expected = brute_sum(records, lo, ts)
+                if expected is None:
+                    self.assertEqual(totals.get(obs, ts), None)
+                else:
+                    self.assertAlmostEqual(totals.get(obs, ts), expected)
+
+    def test_day_rollover(self):
+        totals = weewx.wxservices.RainTotals()
+        midnight = start_ts + 24 * 3600
+        totals.addRecord({'dateTime' : midnight - 300, 'usUnits' : weewx.US, 'rain' : 0.1})
+        self.assertAlmostEqual(totals.get('dayRain', midnight - 300), 0.1)
+        # The record stamped at midnight starts the new day:
+        totals.addRecord({'dateTime' : midnight, 'usUnits' : weewx.US, 'rain' : 0.2})
+        self.assertAlmostEqual(totals.get('dayRain', midnight), 0.2)
+        totals.addRecord({'dateTime' : midnight + 300, 'usUnits' : weewx.US, 'rain' : 0.3})
+        self.assertAlmostEqual(totals.get('dayRain', midnight + 300), 0.5)
+        self.assertAlmostEqual(totals.get('hourRain', midnight + 300), 0.6)
+        # No records yet on a day means no total:
+        self.assertEqual(totals.get('dayRain', midnight + 24 * 3600 + 300), None)
+        # Records out of order are ignored:
+        totals.addRecord({'dateTime' : midnight + 150, 'usUnits' : weewx.US, 'rain' : 1.0})
+        self.assertAlmostEqual(totals.get('dayRain', midnight + 300), 0.5)
+        # A day of no rain sums to zero:
+        for ts in range(midnight + 600, midnight + 24 * 3600 + 600, 300):
+            totals.addRecord({'dateTime' : ts, 'usUnits' : weewx.US, 'rain' : 0.0})
+        self.assertEqual(totals.get('dayRain', midnight + 24 * 3600 + 300), 0.0)
+        self.assertEqual(totals.get('rain24', midnight + 24 * 3600 + 300), 0.0)
+
+    def test_archive_stats(self):
+        stats = weewx.wxservices.ArchiveStats(3600)
+        records = list(gen_records())
+        for rec in records:
+            ts = rec['dateTime']
+            # The statistics are of the records before this one:
+            sod = weeutil.weeutil.startOfDay(ts)
+            windrun = sum(r['windSpeed'] * r['interval'] / 60.0 for r in records
+                          if sod < r['dateTime'] < ts and r['windSpeed'])
+            self.assertAlmostEqual(stats.get_windrun(ts), windrun)
+            window = [r for r in records if ts - 3600 < r['dateTime'] < ts]
+            expected = []
+            for (obs_type, fn) in [('outTemp', max), ('outTemp', min), ('radiation', None), ('windSpeed', None)]:
+                values = [r[obs_type] for r in window if r[obs_type] is not None]
+                if not values:
+                    expected.append(None)
+                elif fn:
+                    expected.append(fn(values))
+                else:
+                    expected.append(sum(values) / len(values))
+            for (value, expect) in zip(stats.get_ET_stats(ts), expected):
+                if expect is None:
+                    self.assertEqual(value, None)
+                else:
+                    self.assertAlmostEqual(value, expect)
+            self.assertTrue(stats.addRecord(rec))
+        # The wind run of the record stamped at midnight is that of the day before:
+        midnight = start_ts + 24 * 3600
+        stats = weewx.wxservices.ArchiveStats(3600)
+        stats.addRecord({'dateTime' : midnight - 300, 'usUnits' : weewx.US, 'interval' : 5, 'windSpeed' : 12.0})
+        stats.addRecord({'dateTime' : midnight, 'usUnits' : weewx.US, 'interval' : 5, 'windSpeed' : 12.0})
+        self.assertEqual(stats.get_windrun(midnight + 300), 0.0)
+        stats.addRecord({'dateTime' : midnight + 300, 'usUnits' : weewx.METRICWX, 'interval' : 5, 'windSpeed' : 6.0})
+        self.assertAlmostEqual(stats.get_windrun(midnight + 600), weewx.wxformulas.mps_to_mph(6.0) * 5 / 60.0)
+        # A record out of order is not added:
+        self.assertFalse(stats.addRecord({'dateTime' : midnight + 150, 'usUnits' : weewx.US, 'interval' : 5,
+                                          'windSpeed' : 100.0}))
+        self.assertAlmostEqual(stats.get_windrun(midnight + 600), weewx.wxformulas.mps_to_mph(6.0) * 5 / 60.0)
+
+class FakeStationInfo(object):
+    altitude_vt = weewx.units.ValueTuple(700.0, 'foot', 'group_altitude')
+    latitude_f = 45.0
+    longitude_f = -122.0
+
+class FakeBinder(object):
+    def __init__(self, dbmanager):
+        self.dbmanager = dbmanager
+    def get_manager(self, data_binding):
+        if self.dbmanager is None:
+            raise weedb.OperationalError("No database")
+        return self.dbmanager
+
+class FakeEngine(object):
+    def __init__(self, dbmanager):
+        self.stn_info = FakeStationInfo()
+        self.db_binder = FakeBinder(dbmanager)
+    def bind(self, event_type, callback):
+        pass
+
+class ServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            weedb.drop(db_dict)
+        except weedb.NoDatabase:
+            pass
+        self.syslog = syslog.syslog
+        syslog.syslog = lambda level, msg: None
+
+    def tearDown(self):
+        syslog.syslog = self.syslog
+
+    def _service(self, dbmanager):
+        calculations = dict((obs, 'hardware') for obs in weewx.wxservices.StdWXCalculate._dispatch_list)
+        for obs in ['hourRain', 'rain24', 'dayRain', 'ET', 'windrun']:
+            calculations[obs] = 'software'
+        config_dict = configobj.ConfigObj({'StdWXCalculate' : {'Calculations' : calculations}})
+        service = weewx.wxservices.StdWXCalculate(FakeEngine(dbmanager), config_dict)
+        service.startup(None)
+        return service
+
+    def test_service(self):
+        records = list(gen_records())
+        midnight = start_ts + 24 * 3600
+        with weewx.manager.Manager.open_with_create(db_dict, schema=schemas.wview.schema) as dbmanager:
+            # Start partway through the first day, so seed() has something to do:
+            dbmanager.addRecord([rec for rec in records if rec['dateTime'] <= midnight - 7200])
+            service = self._service(dbmanager)
+            # The old way, with everything read from the database:
+            reference = self._service(dbmanager)
+            reference.archive_stats = None
+
+            # The rest go through midnight. Slip in a record out of order:
+            late_records = [rec for rec in records if rec['dateTime'] > midnight - 7200]
+            late_records.insert(40, dict(late_records[30], dateTime=late_records[30]['dateTime'] - 150))
+            archived = [rec for rec in records if rec['dateTime'] <= midnight - 7200]
+            for (i, rec) in enumerate(late_records):
+                ts = rec['dateTime']
+                out_of_order = ts <= archived[-1]['dateTime']
+                (record, reference_record) = (dict(rec), dict(rec))
+                service.new_archive_record(weewx.Event(weewx.NEW_ARCHIVE_RECORD, record=record, origin='hardware'))
+                reference.new_archive_record(weewx.Event(weewx.NEW_ARCHIVE_RECORD, record=reference_record,
+                                                         origin='hardware'))
+                # Out of order, the statistics go stale, and the database is asked:
+                self.assertEqual(service.archive_stats_stale, out_of_order)
+                for obs_type in ['windrun', 'ET']:
+                    if reference_record[obs_type] is None:
+                        self.assertEqual(record[obs_type], None)
+                    else:
+                        self.assertAlmostEqual(record[obs_type], reference_record[obs_type])
+                # Rain totals ignore records out of order, so only check those in order:
+                if not out_of_order:
+                    for (obs, lo) in [('hourRain', ts - 3600), ('rain24', ts - 24*3600),
+                                      ('dayRain', weeutil.weeutil.startOfDay(ts) - 1)]:
+                        expected = brute_sum(archived + [rec], lo, ts)
+                        if expected is None:
+                            self.assertEqual(record[obs], None)
+                        else:
+                            self.assertAlmostEqual(record[obs], expected)
+                dbmanager.addRecord(rec)
+                archived = sorted(archived + [rec], key=lambda r: r['dateTime'])
+            # After the record out of order, the statistics were rebuilt:
+            self.assertFalse(service.archive_stats_stale)
+            self.assertEqual(service.archive_stats.last_ts, stop_ts)
+
+    def test_seed(self):
+        records = list(gen_records())
+        with weewx.manager.Manager.open_with_create(db_dict, schema=schemas.wview.schema) as dbmanager:
+            # An empty archive:
+            stats = weewx.wxservices.ArchiveStats(3600)
+            stats.seed(dbmanager)
+            self.assertEqual(stats.last_ts, None)
+            totals = weewx.wxservices.RainTotals()
+            totals.seed(dbmanager)
+            self.assertEqual(totals.last_ts, None)
+
+            # Seeding gives the same as adding every record:
+            dbmanager.addRecord(records)
+            stats.seed(dbmanager)
+            totals.seed(dbmanager)
+            all_stats = weewx.wxservices.ArchiveStats(3600)
+            all_totals = weewx.wxservices.RainTotals()
+            for rec in records:
+                all_stats.addRecord(rec)
+                all_totals.addRecord(rec)
+            ts = stop_ts + interval
+            self.assertEqual(stats.last_ts, stop_ts)
+            self.assertAlmostEqual(stats.get_windrun(ts), all_stats.get_windrun(ts))
+            for (value, expected) in zip(stats.get_ET_stats(ts), all_stats.get_ET_stats(ts)):
+                self.assertAlmostEqual(value, expected)
+            for obs in ['hourRain', 'rain24', 'dayRain']:
+                self.assertAlmostEqual(totals.get(obs, ts), all_totals.get(obs, ts))
+
+            # A failure to seed means the database is asked instead:
+            service = weewx.wxservices.StdWXCalculate(FakeEngine(None), configobj.ConfigObj())
+            service.startup(None)
+            self.assertEqual(service.archive_stats, None)
+            self.assertEqual(service.rain_totals, None)
+
+if __name__ == '__main__':
+    unittest.main()
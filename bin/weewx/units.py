@@ -650,6 +650,12 @@ class Converter(object):
         unit type ('mbar')"""
 
         self.group_unit_dict  = group_unit_dict
+        # Conversion plans for convertDict(), keyed by the unit system and
+        # the set of observation types of the dictionary:
+        self._plans = {}
+
+    # The most conversion plans that are held at once:
+    max_plans = 64
         
     @staticmethod
     def fromSkinDict(skin_dict):
@@ -731,14 +737,53 @@ class Converter(object):
         >>> target_dict = c.convertDict(source_dict)
         >>> print target_dict
         {'outTemp': 68.0, 'interval': 15, 'barometer': 30.0, 'dateTime': 194758100}
+        
+        The conversion function for each observation type is looked up only
+        the first time a dictionary with the same unit system and the same set
+        of types is seen. So, any changes to the unit dictionaries (such as
+        obs_group_dict) must be made before then, as when user/extensions.py
+        is loaded.
         """
         target_dict = {}
+        for (obs_type, conversion_func) in self._getPlan(obs_dict):
+            val = obs_dict[obs_type]
+            if conversion_func is None or val is None:
+                target_dict[obs_type] = val
+            elif type(val) in _scalar_types:
+                target_dict[obs_type] = conversion_func(val)
+            else:
+                # Not a simple number (perhaps a sequence). Do the conversion
+                # the long way, but keep only the first value in the ValueTuple:
+                target_dict[obs_type] = self.convert(as_value_tuple(obs_dict, obs_type))[0]
+        return target_dict
+
+    def _getPlan(self, obs_dict):
+        """Returns the conversion plan for an observation dictionary: a list of
+        2-way tuples (obs_type, conversion function), with a function of None
+        if no conversion is necessary."""
+        unit_system = obs_dict.get('usUnits')
+        plan_key = (unit_system, frozenset(obs_dict))
+        try:
+            return self._plans[plan_key]
+        except KeyError:
+            pass
+        plan = []
         for obs_type in obs_dict:
             if obs_type == 'usUnits': continue
-            # Do the conversion, but keep only the first value in
-            # the ValueTuple:
-            target_dict[obs_type] = self.convert(as_value_tuple(obs_dict, obs_type))[0]
-        return target_dict
+            (unit_type, unit_group) = StdUnitConverters[unit_system].getTargetUnit(obs_type)
+            if unit_type is None and unit_group is None:
+                plan.append((obs_type, None))
+                continue
+            # This follows convert() above, so the same exceptions are raised:
+            new_unit_type = self.group_unit_dict.get(unit_group, USUnits[unit_group])
+            if unit_type == new_unit_type:
+                plan.append((obs_type, None))
+            else:
+                plan.append((obs_type, _getConversionFunc(unit_type, new_unit_type)))
+        if len(self._plans) >= Converter.max_plans:
+            self._plans.clear()
+        self._plans[plan_key] = plan
+        return plan
             
             
     def getTargetUnit(self, obs_type, agg_type=None):
@@ -1018,12 +1063,7 @@ def convert(val_t, target_unit_type):
 
     # Retrieve the conversion function. An exception of type KeyError
     # will occur if the target or source units are invalid
-    try:
-        conversion_func = conversionDict[val_t[1]][target_unit_type]
-    except KeyError:
-        if weewx.debug:
-            syslog.syslog(syslog.LOG_DEBUG, "units: Unable to convert from %s to %s" %(val_t[1], target_unit_type))
-        raise
+    conversion_func = _getConversionFunc(val_t[1], target_unit_type)
     # Try converting a sequence first. A TypeError exception will occur if
     # the value is actually a scalar:
     try:
@@ -1033,6 +1073,19 @@ def convert(val_t, target_unit_type):
     # Add on the unit type and the group type and return the results:
     return ValueTuple(new_val, target_unit_type, val_t[2])
 
+def _getConversionFunc(unit_type, target_unit_type):
+    """Returns the function that converts a value from one unit type to
+    another. Raises KeyError if there is none."""
+    try:
+        return conversionDict[unit_type][target_unit_type]
+    except KeyError:
+        if weewx.debug:
+            syslog.syslog(syslog.LOG_DEBUG, "units: Unable to convert from %s to %s" %(unit_type, target_unit_type))
+        raise
+
+# The types of values that convertDict() can convert directly:
+_scalar_types = (float, int, long)
+
 def convertStd(val_t, target_std_unit_system):
     """Convert a value tuple to an appropriate unit in a target standardized
     unit system
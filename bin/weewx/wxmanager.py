@@ -37,6 +37,7 @@ class WXDaySummaryManager(weewx.manager.DaySummaryManager):
         # Now initialize the WX specific tables
         cursor.execute(WXDaySummaryManager.wx_sql_create_str % self.table_name)
         
+    @weewx.manager.cache_aggregates
     def getAggregate(self, timespan, obs_type, aggregateType, **option_dict):
         """Specialized version of getDayAggregate that can calculate heating or cooling degree days.
 
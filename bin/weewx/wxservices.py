@@ -6,10 +6,14 @@
 
 """Services specific to weather."""
 
+import collections
+import syslog
+
 import weedb
 import weewx.units
 import weewx.engine
 import weewx.wxformulas
+import weewx.recent
 import weeutil.weeutil
 
 
@@ -38,6 +42,9 @@ class StdWXCalculate(weewx.engine.StdService):
         'dewpoint',
         'inDewpoint',
         'rainRate',
+        'hourRain',
+        'rain24',
+        'dayRain',
         'maxsolarrad',
         'cloudbase',
         'humidex',
@@ -108,16 +115,47 @@ class StdWXCalculate(weewx.engine.StdService):
         self.ts_12h_ago = None
         self.archive_interval = None
         self.rain_events = []
+        # running totals of the rain in the archive records, seeded at startup
+        self.rain_totals = RainTotals()
+        self.loop_rain_totals = set()
+        # running statistics for windrun and ET, also seeded at startup
+        self.archive_stats = ArchiveStats(self.et_period)
+        self.archive_stats_stale = True
 
         # we will process both loop and archive events
+        self.bind(weewx.STARTUP, self.startup)
         self.bind(weewx.NEW_LOOP_PACKET, self.new_loop_packet)
         self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
 
+    def startup(self, event):
+        """Seed the rain totals with the archive records of the last day."""
+        try:
+            dbmanager = self.engine.db_binder.get_manager('wx_binding')
+            self.rain_totals.seed(dbmanager)
+        except weedb.DatabaseError, e:
+            syslog.syslog(syslog.LOG_ERR, "wxservices: Cannot calculate rain totals: %s" % e)
+            self.rain_totals = None
+        self._seed_archive_stats()
+
     def new_loop_packet(self, event):
         self.do_calculations(event.packet, 'loop')
 
     def new_archive_record(self, event):
+        if self.rain_totals is not None:
+            # Records generated in software carry the rain totals of the last
+            # LOOP packet, which do not include the rain in the record itself:
+            if getattr(event, 'origin', None) == 'software':
+                for obs in self.loop_rain_totals:
+                    event.record.pop(obs, None)
+            self.rain_totals.addRecord(weewx.units.to_US(dict((obs, event.record.get(obs))
+                                                              for obs in ('dateTime', 'usUnits', 'rain'))))
+        # Once a record has come out of order, the statistics are rebuilt from
+        # the archive, which by now holds it:
+        if self.archive_stats is not None and self.archive_stats_stale:
+            self._seed_archive_stats()
         self.do_calculations(event.record, 'archive')
+        if self.archive_stats is not None and not self.archive_stats.addRecord(event.record):
+            self.archive_stats_stale = True
 
     def do_calculations(self, data_dict, data_type):
         if self.ignore_zero_wind:
@@ -226,6 +264,25 @@ class StdWXCalculate(weewx.engine.StdService):
         # ...then divide by the period and scale to an hour
         data['rainRate'] = 3600 * rainsum / self.rain_period
 
+    # hourRain, rain24 and dayRain are the rain in the archive records of the
+    # last hour, the last 24 hours, and since midnight, as the uploaders have
+    # always reported them. They are kept as running totals, rather than
+    # summed over again from the database.
+    def calc_hourRain(self, data, data_type):
+        self._calc_rain_total(data, data_type, 'hourRain')
+
+    def calc_rain24(self, data, data_type):
+        self._calc_rain_total(data, data_type, 'rain24')
+
+    def calc_dayRain(self, data, data_type):
+        self._calc_rain_total(data, data_type, 'dayRain')
+
+    def _calc_rain_total(self, data, data_type, obs):
+        if self.rain_totals is not None:
+            data[obs] = self.rain_totals.get(obs, data['dateTime'])
+            if data_type == 'loop':
+                self.loop_rain_totals.add(obs)
+
     def calc_maxsolarrad(self, data, data_type):
         data['maxsolarrad'] = weewx.wxformulas.solar_rad_RS(
             self.latitude, self.longitude, self.altitude_m, data['dateTime'],
@@ -269,12 +326,11 @@ class StdWXCalculate(weewx.engine.StdService):
         end_ts = data['dateTime']
         start_ts = end_ts - self.et_period
         try:
-            dbmanager = self.engine.db_binder.get_manager('wx_binding')
-            r = dbmanager.getSql(
-                "SELECT"
-                " MAX(outTemp),MIN(outTemp),AVG(radiation),AVG(windSpeed),usUnits"
-                " FROM %s WHERE dateTime>? AND dateTime <=?"
-                % dbmanager.table_name, (start_ts, end_ts))
+            if self._archive_stats_hold(end_ts):
+                r = self.archive_stats.get_ET_stats(end_ts) + (weewx.US,)
+            else:
+                dbmanager = self.engine.db_binder.get_manager('wx_binding')
+                r = self._get_ET_stats(dbmanager, start_ts, end_ts)
             if r is None or None in r:
                 data['ET'] = None
             else:
@@ -300,14 +356,14 @@ class StdWXCalculate(weewx.engine.StdService):
         if data_type == 'loop':
             return
         ets = data['dateTime']
+        if self._archive_stats_hold(ets):
+            data['windrun'] = self.archive_stats.get_windrun(ets)
+            return
         sts = weeutil.weeutil.startOfDay(ets)
         try:
             run = 0.0
             dbmanager = self.engine.db_binder.get_manager('wx_binding')
-            for row in dbmanager.genSql("SELECT `interval`,windSpeed,usUnits"
-                                        " FROM %s"
-                                        " WHERE dateTime>? AND dateTime<=?" %
-                                        dbmanager.table_name, (sts, ets)):
+            for row in self._gen_wind_rows(dbmanager, sts, ets):
                 if row is None or None in row:
                     continue
                 if row[1]:
@@ -322,6 +378,55 @@ class StdWXCalculate(weewx.engine.StdService):
         except weedb.DatabaseError:
             pass
 
+    def _archive_stats_hold(self, ts):
+        """True if the running statistics of the archive records can be used
+        for a record, that is, if it comes after all those added to them."""
+        return self.archive_stats is not None and not self.archive_stats_stale and \
+            (self.archive_stats.last_ts is None or ts > self.archive_stats.last_ts)
+
+    def _seed_archive_stats(self):
+        try:
+            dbmanager = self.engine.db_binder.get_manager('wx_binding')
+            self.archive_stats.seed(dbmanager)
+            self.archive_stats_stale = False
+        except weedb.DatabaseError, e:
+            syslog.syslog(syslog.LOG_INFO, "wxservices: Calculating windrun and ET from the database: %s" % e)
+            self.archive_stats = None
+
+    def _get_ET_stats(self, dbmanager, start_ts, end_ts):
+        """Get the maximum and minimum temperature, the average radiation and
+        wind speed, and the unit system, of the records in a period. The
+        records just archived are read from memory, if they are still held
+        there, rather than from the database."""
+        recent = weewx.recent.get_recent_records(dbmanager.table_key)
+        if recent is not None:
+            try:
+                return tuple([recent.getAggregate((start_ts, end_ts), obs_type, agg)[0]
+                              for (obs_type, agg) in [('outTemp', 'max'), ('outTemp', 'min'),
+                                                      ('radiation', 'avg'), ('windSpeed', 'avg')]]) + (recent.unit_system,)
+            except weewx.recent.NotHeld:
+                pass
+        return dbmanager.getSql(
+            "SELECT"
+            " MAX(outTemp),MIN(outTemp),AVG(radiation),AVG(windSpeed),usUnits"
+            " FROM %s WHERE dateTime>? AND dateTime <=?"
+            % dbmanager.table_name, (start_ts, end_ts))
+
+    def _gen_wind_rows(self, dbmanager, start_ts, end_ts):
+        """Get the interval, wind speed and unit system of each record in a
+        period, from memory if possible, as _get_ET_stats() does."""
+        recent = weewx.recent.get_recent_records(dbmanager.table_key)
+        if recent is not None:
+            try:
+                return [(interval, speed, recent.unit_system) for (_, interval, speed) in
+                        recent.getValues((start_ts, end_ts), ['interval', 'windSpeed'])]
+            except weewx.recent.NotHeld:
+                pass
+        return dbmanager.genSql("SELECT `interval`,windSpeed,usUnits"
+                                " FROM %s"
+                                " WHERE dateTime>? AND dateTime<=?" %
+                                dbmanager.table_name, (start_ts, end_ts))
+
     def _get_archive_interval(self, data):
         if 'interval' in data and self.archive_interval != data['interval'] * 60:
             self.archive_interval = data['interval'] * 60
@@ -350,3 +455,236 @@ class StdWXCalculate(weewx.engine.StdService):
             self.ts_12h_ago = ts12
 
         return self.temperature_12h_ago
+
+
+class RainTotals(object):
+    """Keeps the rain in the archive records of the last hour (hourRain), the
+    last 24 hours (rain24), and since midnight (dayRain), in US units. Each
+    total is brought up to date as records are added, and as they expire,
+    rather than summed over again.
+
+    As with a SQL SUM, a total is None if there are no records with rain in
+    its period. Following the Weather Underground, dayRain includes the
+    record stamped at midnight."""
+
+    def __init__(self):
+        self.windows = {'hourRain' : SlidingSum(3600),
+                        'rain24'   : SlidingSum(24 * 3600)}
+        self.last_ts = None
+        self.day_start = None
+        self.day_sum = 0.0
+        self.day_count = 0
+
+    def seed(self, dbmanager):
+        """Add the archive records needed for the totals at the time of the
+        last one."""
+        last_ts = dbmanager.lastGoodStamp()
+        if last_ts is None:
+            return
+        start_ts = min(last_ts - 24 * 3600, weeutil.weeutil.startOfDay(last_ts) - 1)
+        for row in dbmanager.genSql("SELECT dateTime, usUnits, rain FROM %s "
+                                    "WHERE dateTime>? AND dateTime<=? ORDER BY dateTime ASC" %
+                                    dbmanager.table_name, (start_ts, last_ts)):
+            self.addRecord(weewx.units.to_US({'dateTime' : row[0], 'usUnits' : row[1], 'rain' : row[2]}))
+
+    def addRecord(self, record):
+        """Add an archive record, in US units. Records no later than the last
+        one added are ignored."""
+        ts = record['dateTime']
+        if self.last_ts is not None and ts <= self.last_ts:
+            return
+        self.last_ts = ts
+        for window in self.windows.values():
+            window.expire(ts)
+        sod = weeutil.weeutil.startOfDay(ts)
+        if sod != self.day_start:
+            self.day_start = sod
+            self.day_sum = 0.0
+            self.day_count = 0
+        rain = record.get('rain')
+        if rain is not None:
+            for window in self.windows.values():
+                window.add(ts, rain)
+            self.day_sum += rain
+            self.day_count += 1
+
+    def get(self, obs, ts):
+        """Return a total ('hourRain', 'rain24' or 'dayRain') at a time no
+        earlier than the last record added."""
+        if obs == 'dayRain':
+            if self.day_count and weeutil.weeutil.startOfDay(ts) == self.day_start:
+                return self.day_sum
+            return None
+        return self.windows[obs].total(ts)
+
+
+class SlidingSum(object):
+    """The sum of values over a sliding window of time, exclusive on the
+    left and inclusive on the right. Each value is added, and expires, once."""
+
+    def __init__(self, length):
+        self.length = length
+        self.entries = collections.deque()
+        self.sum = 0.0
+        # the number of non-zero values, so a window of zeroes sums to exactly zero
+        self.nonzero = 0
+
+    def add(self, ts, value):
+        self.entries.append((ts, value))
+        self.sum += value
+        if value:
+            self.nonzero += 1
+
+    def expire(self, ts):
+        """Drop the values that have left the window ending at ts."""
+        while self.entries and self.entries[0][0] <= ts - self.length:
+            (_, value) = self.entries.popleft()
+            self.sum -= value
+            if value:
+                self.nonzero -= 1
+        if not self.nonzero:
+            self.sum = 0.0
+
+    def total(self, ts):
+        """Return the sum over the window ending at ts, or None if it holds no
+        values. Values that have left the window since the last expire() are
+        left out, without dropping them."""
+        _sum, _count, _nonzero = self.sum, len(self.entries), self.nonzero
+        for (entry_ts, value) in self.entries:
+            if entry_ts > ts - self.length:
+                break
+            _sum -= value
+            _count -= 1
+            if value:
+                _nonzero -= 1
+        if not _count:
+            return None
+        return _sum if _nonzero else 0.0
+
+
+class ArchiveStats(object):
+    """Running statistics of the archive records, in US units, from which
+    windrun and ET are calculated without going back to the database: the
+    wind run since midnight, and the extremes and averages over the last
+    et_period seconds. They are brought up to date as each record is added,
+    at a cost that does not depend on how many records there are."""
+
+    def __init__(self, et_period):
+        self.et_period = et_period
+        self.reset()
+
+    def reset(self):
+        self.last_ts = None
+        self.day_start = None
+        self.windrun = 0.0
+        self.outTemp = SlidingStats(self.et_period)
+        self.radiation = SlidingStats(self.et_period)
+        self.windSpeed = SlidingStats(self.et_period)
+
+    def seed(self, dbmanager):
+        """Start over from the archive records of the day, and of the last
+        et_period, up to the last one."""
+        self.reset()
+        last_ts = dbmanager.lastGoodStamp()
+        if last_ts is None:
+            return
+        start_ts = min(last_ts - self.et_period, weeutil.weeutil.startOfDay(last_ts))
+        keys = ('dateTime', 'usUnits', 'interval', 'outTemp', 'radiation', 'windSpeed')
+        for row in dbmanager.genSql("SELECT dateTime, usUnits, `interval`, outTemp, radiation, windSpeed "
+                                    "FROM %s WHERE dateTime>? AND dateTime<=? ORDER BY dateTime ASC" %
+                                    dbmanager.table_name, (start_ts, last_ts)):
+            self.addRecord(dict(zip(keys, row)))
+
+    def addRecord(self, record):
+        """Add an archive record. Returns False, without adding it, if it is
+        no later than the last one added."""
+        ts = record['dateTime']
+        if self.last_ts is not None and ts <= self.last_ts:
+            return False
+        self.last_ts = ts
+        std_unit = record.get('usUnits')
+        (out_temp, wind_speed) = (record.get('outTemp'), record.get('windSpeed'))
+        if std_unit == weewx.METRIC or std_unit == weewx.METRICWX:
+            if out_temp is not None:
+                out_temp = weewx.wxformulas.CtoF(out_temp)
+            if wind_speed is not None:
+                if std_unit == weewx.METRICWX:
+                    wind_speed = weewx.wxformulas.mps_to_mph(wind_speed)
+                else:
+                    wind_speed = weewx.wxformulas.kph_to_mph(wind_speed)
+
+        # the wind run is of the records after midnight
+        sod = weeutil.weeutil.startOfDay(ts)
+        if sod != self.day_start:
+            self.day_start = sod
+            self.windrun = 0.0
+        if ts > sod and wind_speed and std_unit is not None and record.get('interval') is not None:
+            self.windrun += wind_speed * record['interval'] / 60.0
+
+        for (stats, value) in [(self.outTemp, out_temp), (self.radiation, record.get('radiation')),
+                               (self.windSpeed, wind_speed)]:
+            stats.expire(ts)
+            stats.add(ts, value)
+        return True
+
+    def get_windrun(self, ts):
+        """Return the wind run of the records added since midnight, for a
+        record at ts."""
+        return self.windrun if weeutil.weeutil.startOfDay(ts) == self.day_start else 0.0
+
+    def get_ET_stats(self, ts):
+        """Return the maximum and minimum temperature, and the average
+        radiation and wind speed, over the et_period before ts."""
+        for stats in (self.outTemp, self.radiation, self.windSpeed):
+            stats.expire(ts)
+        return (self.outTemp.max, self.outTemp.min, self.radiation.avg, self.windSpeed.avg)
+
+
+class SlidingStats(object):
+    """The maximum, minimum and average of values over a sliding window of
+    time, exclusive on the left and inclusive on the right. Missing values
+    are ignored. The extremes are kept in monotonic queues, so each value is
+    added, and expires, once."""
+
+    def __init__(self, length):
+        self.length = length
+        self.entries = collections.deque()
+        self.maxima = collections.deque()
+        self.minima = collections.deque()
+        self.sum = 0.0
+
+    def add(self, ts, value):
+        if value is None:
+            return
+        self.entries.append((ts, value))
+        self.sum += value
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((ts, value))
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((ts, value))
+
+    def expire(self, ts):
+        """Drop the values that have left the window ending at ts."""
+        cutoff = ts - self.length
+        while self.entries and self.entries[0][0] <= cutoff:
+            self.sum -= self.entries.popleft()[1]
+        while self.maxima and self.maxima[0][0] <= cutoff:
+            self.maxima.popleft()
+        while self.minima and self.minima[0][0] <= cutoff:
+            self.minima.popleft()
+        if not self.entries:
+            self.sum = 0.0
+
+    @property
+    def max(self):
+        return self.maxima[0][1] if self.maxima else None
+
+    @property
+    def min(self):
+        return self.minima[0][1] if self.minima else None
+
+    @property
+    def avg(self):
+        return self.sum / len(self.entries) if self.entries else None
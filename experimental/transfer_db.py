@@ -21,5 +21,5 @@ new_archive_dict = {'driver'        : 'weedb.mysql',
 with Manager.open(old_archive_dict) as old_archive:
     with Manager.open_with_create(new_archive_dict, schema=schemas.wview.schema) as new_archive:
 
-        # This is very fast because it is done in a single transaction context:
-        new_archive.addRecord(old_archive.genBatchRecords())
+        # This is very fast because it is done in a single transaction context, in batches:
+        new_archive.addRecord(old_archive.genBatchRecords(), quiet=True)